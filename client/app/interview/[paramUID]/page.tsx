@@ -37,6 +37,16 @@ interface Answer {
   // timestamp: Date
 }
 
+// Longest time to keep waiting for questions generated after upload (the server gives up after 5 minutes)
+const QUESTION_WAIT_BUDGET_MS = 6 * 60 * 1000
+// Consecutive network failures tolerated while waiting for questions
+const QUESTION_MAX_NETWORK_RETRIES = 3
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// Ask the server for a follow-up after each answer (adaptive mode)
+const ADAPTIVE_INTERVIEW = process.env.NEXT_PUBLIC_ADAPTIVE_INTERVIEW === "true"
+
 // Declare SpeechRecognition interface
 declare global {
   interface Window {
@@ -96,20 +106,45 @@ export default function InterviewPage({ params }: { params: Promise<{ paramUID:
         throw new Error("Missing user or session information")
       }
 
-      const response = await fetch(
-        `${process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000"}/question/${userId}/${paramUID}`,
-        {
-          method: "GET",
-          headers: {
-            "Content-Type": "application/json",
-          },
-        },
-      )
+      // Questions are generated in the background after upload; the server holds each
+      // request until they are ready and answers 202 if they are still pending. Waiting
+      // is bounded so a generation that never finishes surfaces as an error.
+      const deadline = Date.now() + QUESTION_WAIT_BUDGET_MS
+      let networkFailures = 0
+      let response: Response
+      while (true) {
+        try {
+          response = await fetch(
+            `${process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000"}/question/${userId}/${paramUID}`,
+            {
+              method: "GET",
+              headers: {
+                "Content-Type": "application/json",
+              },
+            },
+          )
+          networkFailures = 0
+        } catch (networkError) {
+          networkFailures += 1
+          if (networkFailures > QUESTION_MAX_NETWORK_RETRIES || Date.now() > deadline) {
+            throw new Error("Could not reach the server to load your interview questions")
+          }
+          await sleep(Math.min(1000 * 2 ** networkFailures, 10000))
+          continue
+        }
+
+        if (response.status !== 202) break
+        if (Date.now() > deadline) {
+          throw new Error("Your interview questions are taking too long to prepare. Please upload your resume again.")
+        }
+        const retryAfter = Number(response.headers.get("Retry-After"))
+        await sleep((retryAfter > 0 ? retryAfter : 1) * 1000)
+      }
 
       // Check for HTTP errors
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}))
-        throw new Error(errorData.message || `Request failed with status ${response.status}`)
+        throw new Error(errorData.detail || errorData.message || `Request failed with status ${response.status}`)
       }
 
       const data = await response.json()
@@ -558,6 +593,30 @@ export default function InterviewPage({ params }: { params: Promise<{ paramUID:
     }
   }
 
+  // Follow-up to a final answer, or null when none was ready in time (or adaptive mode is off)
+  const requestFollowup = async (questionId: string, answer: string): Promise<Question | null> => {
+    if (!ADAPTIVE_INTERVIEW || !user) return null
+    try {
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000"}/followup/${user.uid}/${paramUID}`,
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({ questionId, answer }),
+        },
+      )
+      if (!response.ok) return null
+      const data = await response.json()
+      return data.followup ? { id: data.followup.id, text: data.followup.text } : null
+    } catch (error) {
+      // Follow-ups are optional; carry on with the planned questions
+      console.error("Error requesting follow-up:", error)
+      return null
+    }
+  }
+
   const handleSendMessage = () => {
     if (!messageInput.trim()) return
 
@@ -571,10 +630,13 @@ export default function InterviewPage({ params }: { params: Promise<{ paramUID:
     setMessages((prev) => [...prev, userMessage])
 
     // Store the response if not already stored
+    let followupRequest: Promise<Question | null> = Promise.resolve(null)
     if (currentQuestion) {
       const hasAnswered = answers.some((a) => a.questionId === currentQuestion.id)
       if (!hasAnswered) {
         storeInterviewResponse(currentQuestion.text, messageInput)
+        // Runs while the AI is "typing", within the server's latency budget
+        followupRequest = requestFollowup(currentQuestion.id, messageInput)
       }
     }
 
@@ -582,13 +644,19 @@ export default function InterviewPage({ params }: { params: Promise<{ paramUID:
 
     // Simulate AI response
     setIsAiTyping(true)
-    setTimeout(() => {
+    setTimeout(async () => {
+      const followup = await followupRequest
       let aiResponse = ""
       let nextQuestion: Question | null = null
 
       if (currentQuestion) {
         const currentIndex = questions.findIndex((q) => q.id === currentQuestion.id)
-        if (currentIndex < questions.length - 1) {
+        if (followup) {
+          // Asked right after the answer it follows up on; answered under its own id
+          nextQuestion = followup
+          setQuestions((prev) => [...prev.slice(0, currentIndex + 1), followup, ...prev.slice(currentIndex + 1)])
+          aiResponse = `Thank you for your response. ${followup.text}`
+        } else if (currentIndex < questions.length - 1) {
           nextQuestion = questions[currentIndex + 1]
           aiResponse = `Thank you for your response. ${nextQuestion.text}`
         } else {
@@ -666,6 +734,7 @@ export default function InterviewPage({ params }: { params: Promise<{ paramUID:
           method: "POST",
           headers: {
             "Content-Type": "application/json",
+            "Idempotency-Key": paramUID,
           },
           body: JSON.stringify(interviewData),
         },
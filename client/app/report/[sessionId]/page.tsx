@@ -80,25 +80,20 @@ export default function InterviewReportPage() {
       }
 
       try {
-        // Fetch all interviews for the user
+        // Fetch only this session's report
         const response = await fetch(
-          `${process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000"}/get_mock_interview/${user.uid}`
+          `${process.env.NEXT_PUBLIC_FASTAPI_URL || "http://127.0.0.1:8000"}/interview_report/${user.uid}/${sessionId}`
         )
 
+        if (response.status === 404) {
+          throw new Error("Interview session not found")
+        }
+
         if (!response.ok) {
           throw new Error(`Error fetching interview data: ${response.statusText}`)
         }
 
-        const data = await response.json()
-        
-        // Find the specific interview by sessionId
-        const interview = data.mock_interviews.find(
-          (interview: InterviewSession) => interview.session_id === sessionId
-        )
-
-        if (!interview) {
-          throw new Error("Interview session not found")
-        }
+        const interview: InterviewSession = await response.json()
 
         setInterviewData(interview)
         setLoading(false)
@@ -17,6 +17,8 @@ export default function UploadPage() {
   const [user, setUser] = useState<any>(null)
   const [loading, setLoading] = useState(true)
   const [file, setFile] = useState<File | null>(null)
+  // One idempotency key per selected file: retries of that upload reuse its session
+  const [uploadKey, setUploadKey] = useState("")
   const [isDragging, setIsDragging] = useState(false)
   const [isUploading, setIsUploading] = useState(false)
   const [uploadProgress, setUploadProgress] = useState(0)
@@ -83,6 +85,7 @@ export default function UploadPage() {
     }
 
     setFile(file)
+    setUploadKey(crypto.randomUUID())
   }
 
   const removeFile = () => {
@@ -114,6 +117,7 @@ export default function UploadPage() {
 
       const response = await fetch(`${FASTAPI_URL}/upload_resume`, {
         method: "POST",
+        headers: { "Idempotency-Key": uploadKey },
         body: formData,
       })
 
@@ -125,21 +129,9 @@ export default function UploadPage() {
       }
 
       const data = await response.json()
-      setProcessingStatus("processing")
 
-      const processingInterval = setInterval(() => {
-        setUploadProgress((prev) => {
-          if (prev >= 90) {
-            clearInterval(processingInterval)
-            return 90
-          }
-          return prev + 5
-        })
-      }, 300)
-
-      await new Promise((resolve) => setTimeout(resolve, 6000))
-
-      clearInterval(processingInterval)
+      // Questions are still being generated; the interview page waits for them
+      // while the candidate sets up their microphone and camera
       setUploadProgress(100)
       setProcessingStatus("complete")
 
@@ -0,0 +1,30 @@
+# Shared-secret protection for operator endpoints (bulk export, profiling)
+import hmac
+import logging
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Header, HTTPException
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """True if token matches the configured admin token (always False when none is set)."""
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token, ADMIN_TOKEN))
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """Dependency rejecting requests without the configured X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not is_admin_token(x_admin_token):
+        logger.warning("Rejected admin request with a missing or invalid token")
+        raise HTTPException(status_code=401, detail="Invalid admin token")
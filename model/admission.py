@@ -0,0 +1,169 @@
+# Admission control for LLM-bound endpoints.
+#
+# Heavy requests (resume upload, interview evaluation) take a slot from a fixed
+# pool before doing any LLM work. When the pool is full they queue, but only if
+# the predicted queue wait plus their own service time fits the latency SLO;
+# otherwise they are turned away immediately with Retry-After. Capping heavy
+# work also caps the threadpool tokens it can hold, so light endpoints
+# (question fetch, analytics, health) always find a free thread.
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from metrics import Counter, Gauge, registry, stage_duration
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Heavy requests processed concurrently per worker (keep well below the 40-thread default pool)
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+# Heavy requests allowed to wait for a slot per worker
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Heavy requests one user may have in flight or queued at once
+ADMISSION_PER_USER = int(os.getenv("ADMISSION_PER_USER", "2"))
+# Target end-to-end latency for heavy requests
+ADMISSION_SLO_SECONDS = float(os.getenv("ADMISSION_SLO_SECONDS", "90"))
+# Service time assumed for an endpoint before any request has completed
+ADMISSION_INITIAL_ESTIMATE_SECONDS = float(os.getenv("ADMISSION_INITIAL_ESTIMATE_SECONDS", "20"))
+
+admission_rejections = registry.register(Counter(
+    "mockly_admission_rejections_total", "Heavy requests turned away by admission control", ("name", "reason")))
+admission_in_flight = registry.register(Gauge(
+    "mockly_admission_in_flight", "Heavy requests holding an admission slot"))
+admission_queued = registry.register(Gauge(
+    "mockly_admission_queued", "Heavy requests waiting for an admission slot"))
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE,
+                 per_user: int = ADMISSION_PER_USER, slo_seconds: float = ADMISSION_SLO_SECONDS,
+                 initial_estimate: float = ADMISSION_INITIAL_ESTIMATE_SECONDS):
+        """Bounded slot pool with SLO-aware queueing for expensive requests
+
+        Args:
+            max_concurrency: Requests allowed to run at once
+            max_queue: Requests allowed to wait for a slot
+            per_user: Requests one user may have admitted or waiting at once
+            slo_seconds: Latency target used to decide whether queueing is worthwhile
+            initial_estimate: Service time assumed until real durations are observed
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.slo_seconds = slo_seconds
+        self.initial_estimate = initial_estimate
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._per_user: Dict[str, int] = {}
+        # Exponentially weighted service time per endpoint
+        self._service_time: Dict[str, float] = {}
+
+    def estimate(self, name: str) -> float:
+        return self._service_time.get(name, self.initial_estimate)
+
+    def predicted_wait(self) -> float:
+        """Expected time until a newly queued request gets a slot."""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            return 0.0
+        mean_service = (sum(self._service_time.values()) / len(self._service_time)
+                        if self._service_time else self.initial_estimate)
+        rounds = math.ceil((len(self._waiters) + 1) / self.max_concurrency)
+        return rounds * mean_service
+
+    def _reject(self, name: str, reason: str, status_code: int, retry_after: float, detail: str):
+        retry_after = max(1, math.ceil(retry_after))
+        admission_rejections.inc(name=name, reason=reason)
+        logger.warning(f"Admission rejected {name}: {reason} (retry after {retry_after}s)")
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    async def run(self, name: str, user_id: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run func once a slot is free, or raise 429/503 with Retry-After.
+
+        Args:
+            name: Endpoint name, used for service time estimates and metrics
+            user_id: Caller, for the per-user limit
+            func: Coroutine function doing the heavy work
+
+        Returns:
+            The result of func
+        """
+        if self._per_user.get(user_id, 0) >= self.per_user:
+            self._reject(name, "per_user", 429, self.estimate(name),
+                         "Too many requests in progress for this user")
+
+        wait_budget = self.slo_seconds - self.estimate(name)
+        predicted_wait = self.predicted_wait()
+        if predicted_wait > 0:
+            if len(self._waiters) >= self.max_queue:
+                self._reject(name, "queue_full", 503, predicted_wait, "Server is busy, please retry shortly")
+            if predicted_wait > wait_budget:
+                self._reject(name, "slo", 503, predicted_wait, "Server is busy, please retry shortly")
+
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        try:
+            await self._acquire(name, max(wait_budget, 0.0))
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            finally:
+                self._observe(name, time.perf_counter() - start)
+                self._release()
+            return result
+        finally:
+            self._per_user[user_id] -= 1
+            if not self._per_user[user_id]:
+                del self._per_user[user_id]
+
+    async def _acquire(self, name: str, timeout: float) -> None:
+        start = time.perf_counter()
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            admission_queued.set(len(self._waiters))
+            try:
+                # _release hands its slot over by resolving the future
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot arrived as we gave up; pass it on
+                    self._release()
+                else:
+                    waiter.cancel()
+                    self._waiters.remove(waiter)
+                admission_queued.set(len(self._waiters))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self._reject(name, "queue_timeout", 503, self.predicted_wait(),
+                             "Server is busy, please retry shortly")
+            admission_queued.set(len(self._waiters))
+        admission_in_flight.set(self.in_flight)
+        stage_duration.observe(time.perf_counter() - start, stage="admission_wait")
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter; in_flight is unchanged
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+        admission_in_flight.set(self.in_flight)
+
+    def _observe(self, name: str, duration: float) -> None:
+        previous = self._service_time.get(name)
+        self._service_time[name] = duration if previous is None else 0.8 * previous + 0.2 * duration
+
+
+# Global instance shared by all heavy routes in this worker
+admission = AdmissionController()
@@ -1,51 +1,42 @@
-from crewai import Crew, Task, Agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
+# Agent and task definitions for the interview crews. Heavy imports (crewai,
+# langchain) and the Gemini client are deferred until the first kickoff or
+# warmup() so importing this module is cheap.
+import json
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    verbose=False,
-    temperature=0.7,
-    google_api_key=os.getenv("GOOGLE_API_KEY")
-)
-
 # Agent for generating structured interview questions
-question_generator = Agent(
+QUESTION_GENERATOR = dict(
     role="Senior Technical Recruiter",
     goal="Generate concise, relevant technical interview questions based on the candidate's background",
     backstory="An experienced recruiter who knows how to ask precise questions that effectively evaluate technical skills without being verbose.",
-    llm=llm
 )
 
 # Agent for analyzing responses and providing structured feedback
-response_analyzer = Agent(
+RESPONSE_ANALYZER = dict(
     role="Seasoned Hiring Manager",
     goal="Evaluate candidate responses with detailed feedback on technical accuracy, problem-solving approach, and communication skills.",
     backstory="As an experienced hiring manager, you have assessed numerous candidates across various technical domains. You provide constructive and professional feedback, highlighting strengths and areas for improvement, ensuring a fair and comprehensive evaluation.",
-    llm=llm
 )
 
 # Agent for computing the final score based on all feedback
-score_evaluator = Agent(
+SCORE_EVALUATOR = dict(
     role="Panel Lead Interviewer",
     goal="Calculate final interview scores and provide comprehensive evaluation with improvement areas.",
     backstory="As a lead interviewer in a panel setting, you have extensive experience evaluating candidates holistically.",
-    llm=llm,
     # format="json"
 )
 
 # Task to generate structured interview questions
-prepare_questions = Task(
+PREPARE_QUESTIONS = dict(
     description="Review the candidate's resume {data} and generate a set of 5 well-structured, job-relevant interview questions, each with a unique identifier.",
     expected_output="A JSON list of insightful and relevant interview questions with unique IDs.",
-    agent=question_generator,
 )
 
 # Task to analyze each response and provide feedback
-analyze_response = Task(
+ANALYZE_RESPONSE = dict(
     description="""Evaluate the candidate's response to a specific interview question.
     Question: {question}
     Response: {response}
@@ -63,11 +54,21 @@ analyze_response = Task(
     - problem_solving_feedback: Evaluation of problem-solving approach
     - communication_feedback: Evaluation of communication skills
     - overall_feedback: Summary evaluation with suggestions for improvement""",
-    agent=response_analyzer,
+)
+
+# Task to ask one follow-up question based on the candidate's (possibly partial) answer
+GENERATE_FOLLOWUP = dict(
+    description="""An interviewer asked: {question}
+    The candidate answered: {answer}
+
+    Ask ONE short follow-up question that probes the most interesting or weakest
+    part of this answer, the way a human interviewer would. Do not repeat the
+    original question and do not give feedback.""",
+    expected_output="The follow-up question text only, on a single line.",
 )
 
 # Task to evaluate the final score based on all responses and feedback
-evaluate_interview = Task(
+EVALUATE_INTERVIEW = dict(
     description="""Calculate final interview scores based on interview responses.
     
     You will receive interview data in JSON format containing question-response pairs.
@@ -96,21 +97,81 @@ evaluate_interview = Task(
         "improvement_areas": ["Problem-solving structure", "Depth of examples"]
     }}""",
     expected_output="A JSON object with overall_score, score_breakdown, strengths, and improvement_areas",
-    agent=score_evaluator
 )
 
-# Crews to handle question generation, response analysis, and final evaluation
-question_crew = Crew(
-    agents=[question_generator],
-    tasks=[prepare_questions],
-)
+# Crew name -> (agent definition, task definition)
+CREW_DEFINITIONS = {
+    "question": (QUESTION_GENERATOR, PREPARE_QUESTIONS),
+    "response": (RESPONSE_ANALYZER, ANALYZE_RESPONSE),
+    "score": (SCORE_EVALUATOR, EVALUATE_INTERVIEW),
+    "followup": (QUESTION_GENERATOR, GENERATE_FOLLOWUP),
+}
 
-response_crew = Crew(
-    agents=[response_analyzer],
-    tasks=[analyze_response],
-)
+# Gemini clients by API key
+_llms = {}
+_llm_lock = threading.Lock()
+
+
+def get_llm(api_key: str = None):
+    """Build the Gemini client for an API key on first use (default: the pool's first key)."""
+    from key_pool import key_pool
+
+    if api_key is None and key_pool.keys:
+        api_key = key_pool.keys[0].secret
+    if api_key not in _llms:
+        with _llm_lock:
+            if api_key not in _llms:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+
+                _llms[api_key] = ChatGoogleGenerativeAI(
+                    model="gemini-2.0-flash",
+                    verbose=False,
+                    temperature=0.7,
+                    google_api_key=api_key
+                )
+    return _llms[api_key]
+
+
+def build_crew(name: str, api_key: str = None):
+    """Build a single-agent crew. Crews hold per-run task state, so each kickoff gets its own."""
+    from crewai import Agent, Crew, Task
+
+    agent_definition, task_definition = CREW_DEFINITIONS[name]
+    agent = Agent(llm=get_llm(api_key), **agent_definition)
+    task = Task(agent=agent, **task_definition)
+    return Crew(agents=[agent], tasks=[task])
+
+
+class LazyCrew:
+    def __init__(self, name: str):
+        """Crew handle that builds the underlying crew at kickoff time."""
+        self.name = name
+
+    def kickoff(self, inputs: dict):
+        """Run the crew on a key leased from the pool, charging its estimated usage."""
+        from key_pool import key_pool
+        from resume_condenser import count_tokens
+
+        with key_pool.lease(count_tokens(json.dumps(inputs, default=str))) as key:
+            result = build_crew(self.name, key.secret).kickoff(inputs=inputs)
+            key_pool.charge(key, count_tokens(str(result)))
+        return result
+
+
+def warmup() -> None:
+    """Import crewai/langchain and create the LLM clients ahead of the first request."""
+    from key_pool import key_pool
+
+    build_crew("question")
+    for key in key_pool.keys:
+        get_llm(key.secret)
+
+
+# Crews by name, used by crew_runner.run_crew
+CREWS = {name: LazyCrew(name) for name in CREW_DEFINITIONS}
 
-score_crew = Crew(
-    agents=[score_evaluator],
-    tasks=[evaluate_interview],
-)
\ No newline at end of file
+# Crews to handle question generation, response analysis, final evaluation and follow-ups
+question_crew = CREWS["question"]
+response_crew = CREWS["response"]
+score_crew = CREWS["score"]
+followup_crew = CREWS["followup"]
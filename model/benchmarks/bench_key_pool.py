@@ -0,0 +1,88 @@
+# API key pool benchmark: simulated LLM throughput with one key versus a pool,
+# against the local stub provider enforcing per-key quotas. Runs on a virtual
+# clock, so a ten-minute simulation finishes instantly. --actual-rpm below
+# --rpm simulates a pool configured with more quota than the keys really have.
+#
+#   cd model
+#   python -m benchmarks.bench_key_pool --keys 1 2 4 --rate 1.0 --minutes 10
+import argparse
+import json
+import logging
+
+from benchmarks.fakes import StubProvider
+from benchmarks.stats import summarize
+from key_pool import KeyPool
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def simulate(keys: int, args: argparse.Namespace) -> dict:
+    """Feed requests at args.rate per second through a pool of keys, FIFO, until args.minutes pass."""
+    clock = VirtualClock()
+    secrets = [f"stub-key-{i}" for i in range(keys)]
+    # The provider's real quota can be lower than the pool believes, to exercise cooldowns
+    provider = StubProvider({secret: args.actual_rpm for secret in secrets}, clock)
+    pool = KeyPool(secrets, requests_per_minute=args.rpm, tokens_per_minute=0,
+                   cooldown=args.cooldown, clock=clock)
+
+    duration = args.minutes * 60
+    arrivals = [i / args.rate for i in range(int(duration * args.rate))]
+    waits, served, quota_errors = [], 0, 0
+    for arrival in arrivals:
+        clock.now = max(clock.now, arrival)
+        while clock.now < duration:
+            key, wait = pool.try_acquire()
+            if key is None:
+                clock.now += wait
+                continue
+            try:
+                provider.call(key.secret)
+            except Exception as e:
+                pool.release(key, error=e)
+                quota_errors += 1
+                continue
+            pool.release(key)
+            served += 1
+            waits.append(clock.now - arrival)
+            break
+        if clock.now >= duration:
+            break
+
+    return {
+        "offered_per_minute": round(args.rate * 60, 1),
+        "served_per_minute": round(served / args.minutes, 1),
+        "quota_errors": quota_errors,
+        "wait": summarize(waits),
+        "keys": pool.status(),
+    }
+
+
+def main(args: argparse.Namespace) -> dict:
+    return {f"{keys}_keys": simulate(keys, args) for keys in args.keys}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API key pool throughput against a stub provider")
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to compare")
+    parser.add_argument("--rate", type=float, default=1.0, help="Offered LLM calls per second")
+    parser.add_argument("--minutes", type=float, default=10, help="Simulated duration")
+    parser.add_argument("--rpm", type=float, default=15, help="Per-key request quota the pool is configured with")
+    parser.add_argument("--actual-rpm", type=float, default=15, help="Per-key quota the stub provider enforces")
+    parser.add_argument("--cooldown", type=float, default=30, help="Cooldown after a quota error")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Cooldown warnings would drown the report
+    logging.getLogger("key_pool").setLevel(logging.ERROR)
+    report = main(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
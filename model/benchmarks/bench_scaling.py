@@ -0,0 +1,90 @@
+# Multi-worker scaling benchmark: runs the faked app under uvicorn with an
+# increasing number of worker processes and reports throughput per worker count.
+#
+# Workers only share state through MongoDB, so this needs a real MongoDB
+# (MONGO_URI); mongomock would give every worker its own database.
+#
+#   cd model
+#   python -m benchmarks.bench_scaling --workers 1 2 4 --users 32 --llm-latency 0.05
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_startup import MODEL_DIR, _free_port, _status
+from benchmarks.fakes import make_resume_pdf
+from benchmarks.loadtest import run_load
+
+
+def start_server(workers: int, args):
+    """Start the faked app with `workers` processes; returns (process, base_url) once ready."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "API_WORKERS": str(workers),
+        "BENCH_MOCK_MONGO": "false",
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_JITTER": str(args.llm_jitter),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.fake_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=MODEL_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + args.timeout
+    while _status(base_url + "/readyz") != 200:
+        if time.time() > deadline or server.poll() is not None:
+            server.terminate()
+            raise SystemExit(f"Server with {workers} workers did not become ready")
+        time.sleep(0.1)
+    return server, base_url
+
+
+async def measure(base_url: str, args) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        return await run_load(client, make_resume_pdf(), args.users, args.iterations)
+
+
+def main(args):
+    results = {}
+    for workers in args.workers:
+        server, base_url = start_server(workers, args)
+        try:
+            results[workers] = asyncio.run(measure(base_url, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    baseline = results[args.workers[0]]["flows_per_second"] / args.workers[0]
+    print(json.dumps({
+        "config": vars(args),
+        "scaling": [
+            {
+                "workers": workers,
+                "flows_per_second": report["flows_per_second"],
+                "requests_per_second": report["requests_per_second"],
+                # 1.0 means perfectly linear scaling relative to the first run
+                "efficiency": round(report["flows_per_second"] / (baseline * workers), 2),
+                "submit_p95_ms": report["endpoints"].get("process_interview_responses", {}).get("p95_ms"),
+            }
+            for workers, report in results.items()
+        ],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark throughput scaling across API workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to test")
+    parser.add_argument("--users", type=int, default=32, help="Concurrent simulated candidates")
+    parser.add_argument("--iterations", type=int, default=2, help="Flows per candidate")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM base latency (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.01, help="Fake LLM max extra latency (s)")
+    parser.add_argument("--timeout", type=float, default=60, help="Readiness timeout per server (s)")
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+# Serialization and bytes-on-wire benchmark for the heaviest responses:
+# /get_mock_interview (a user's full interview history) and the interview
+# submission result. Compares stdlib JSON against orjson rendering and the
+# body size uncompressed, gzip and brotli at the middleware's settings.
+#
+#   cd model
+#   python -m benchmarks.bench_serialization --interviews 50 --runs 200
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from benchmarks.fakes import FakeCrew
+from benchmarks.stats import summarize
+from compression import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL
+
+
+def make_submission_result(seed: int) -> dict:
+    """Build a submission response with realistic LLM feedback text."""
+    response_crew = FakeCrew("response", latency=0, jitter=0)
+    score_crew = FakeCrew("score", latency=0, jitter=0)
+    feedback = [
+        {"question_id": f"q{seed}-{i}",
+         "text": response_crew.kickoff({"question": f"Question {i}", "response": f"Answer {seed}-{i}"})}
+        for i in range(5)
+    ]
+    evaluation = json.loads(score_crew.kickoff({"interview_data": str(seed)}))
+    return {
+        "status": "completed",
+        "feedback": feedback,
+        "score": evaluation["overall_score"],
+        "evaluation": {
+            "score": evaluation["overall_score"],
+            "breakdown": evaluation["score_breakdown"],
+            "strengths": evaluation["strengths"],
+            "improvement_areas": evaluation["improvement_areas"]
+        }
+    }
+
+
+def make_mock_interviews(count: int) -> dict:
+    """Build a /get_mock_interview payload for a user with count completed interviews."""
+    start = datetime(2025, 1, 1)
+    interviews = []
+    for seed in range(count):
+        result = make_submission_result(seed)
+        interviews.append({
+            "user_id": "bench-user",
+            "session_id": f"session-{seed}",
+            "questions": [{"id": f"q{seed}-{i}", "text": f"Question {i}: describe a project where you used "
+                                                          f"this skill and the trade-offs you made."}
+                          for i in range(5)],
+            "responses": [{"question_id": f"q{seed}-{i}", "text": "I designed and shipped a service that " * 12}
+                          for i in range(5)],
+            "feedback": result["feedback"],
+            "score": result["score"],
+            "evaluation": result["evaluation"],
+            "completed": True,
+            "timestamp": (start + timedelta(days=seed)).isoformat(),
+            "last_updated": start + timedelta(days=seed, minutes=30),
+        })
+    return {"mock_interviews": interviews}
+
+
+def measure(payload: dict, runs: int) -> dict:
+    """Time response rendering (including FastAPI's jsonable_encoder pass) and measure body sizes."""
+    report = {}
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            body = response_class(jsonable_encoder(payload)).body
+            samples.append(time.perf_counter() - start)
+        report[name] = summarize(samples)
+
+    body = ORJSONResponse(jsonable_encoder(payload)).body
+    sizes = {"identity": len(body)}
+    for name, compress in (
+        ("gzip", lambda data: gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL)),
+        ("br", lambda data: brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY, mode=brotli.MODE_TEXT)),
+    ):
+        samples = []
+        for _ in range(max(runs // 10, 1)):
+            start = time.perf_counter()
+            compressed = compress(body)
+            samples.append(time.perf_counter() - start)
+        sizes[name] = len(compressed)
+        report[f"{name}_compress"] = summarize(samples)
+    report["bytes"] = sizes
+    report["ratio"] = {name: round(size / sizes["identity"], 3) for name, size in sizes.items()}
+    return report
+
+
+def main(args: argparse.Namespace) -> dict:
+    payloads = {
+        "get_mock_interview": make_mock_interviews(args.interviews),
+        "process_interview_responses": make_submission_result(0),
+    }
+    return {name: measure(payload, args.runs) for name, payload in payloads.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serialization and compression benchmark")
+    parser.add_argument("--interviews", type=int, default=50, help="Interviews in the history payload")
+    parser.add_argument("--runs", type=int, default=200, help="Render iterations per payload")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = main(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
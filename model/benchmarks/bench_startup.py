@@ -0,0 +1,96 @@
+# Cold start benchmark: module import time, time until the server answers
+# /healthz (liveness) and /readyz (readiness), and first-request latency.
+#
+#   cd model
+#   python -m benchmarks.bench_startup --runs 3
+#   python -m benchmarks.bench_startup --app benchmarks.fake_app:app   # without Gemini
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.stats import summarize
+
+MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> float:
+    """Import the app module in a fresh interpreter and return the import time."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=MODEL_DIR, capture_output=True,
+                            text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def measure_server(app: str, first_path: str, timeout: float) -> dict:
+    """Start uvicorn and time liveness, readiness and the first real request."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+                              cwd=MODEL_DIR)
+    result = {"live": None, "ready": None, "first_request": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if result["live"] is None and _status(base + "/healthz") == 200:
+                result["live"] = time.perf_counter() - start
+            if result["live"] is not None and _status(base + "/readyz") == 200:
+                result["ready"] = time.perf_counter() - start
+                break
+            time.sleep(0.05)
+
+        request_start = time.perf_counter()
+        _status(base + first_path)
+        result["first_request"] = time.perf_counter() - request_start
+    finally:
+        server.terminate()
+        server.wait()
+    return result
+
+
+def main(args):
+    module = args.app.split(":")[0]
+    imports = [measure_import(module) for _ in range(args.runs)]
+    servers = [measure_server(args.app, args.first_path, args.timeout) for _ in range(args.runs)]
+
+    def collect(key):
+        return [run[key] for run in servers if run[key] is not None]
+
+    print(json.dumps({
+        "config": vars(args),
+        "import": summarize(imports),
+        "time_to_live": summarize(collect("live")),
+        "time_to_ready": summarize(collect("ready")),
+        "first_request": summarize(collect("first_request")),
+        "never_ready": sum(1 for run in servers if run["ready"] is None),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API cold start")
+    parser.add_argument("--app", default="main:app", help="ASGI app to start")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts")
+    parser.add_argument("--first-path", default="/user_stats/bench-user", help="Path of the first request")
+    parser.add_argument("--timeout", type=float, default=60, help="Give up waiting for readiness after (s)")
+    main(parser.parse_args())
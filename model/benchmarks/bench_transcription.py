@@ -0,0 +1,99 @@
+# CPU benchmark for the streaming Whisper transcriber.
+#
+# Simulates concurrent interview sessions streaming PCM audio in real time and
+# reports partial/final transcript latency and audio throughput.
+#
+#   cd model
+#   python -m benchmarks.bench_transcription --sessions 8 --workers 2 --batch-size 8
+import argparse
+import asyncio
+import json
+import time
+import wave
+
+import numpy as np
+
+from benchmarks.stats import summarize
+from transcription import SAMPLE_RATE, StreamingTranscriber, TranscriptStream
+
+
+def load_audio(path: str, seconds: float) -> bytes:
+    """Load 16kHz mono 16-bit PCM from a wav file, or synthesize noise if no file is given."""
+    if path:
+        with wave.open(path, "rb") as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise SystemExit("Benchmark audio must be 16kHz mono 16-bit PCM wav")
+            frames = wav.readframes(wav.getnframes())
+        samples = int(seconds * SAMPLE_RATE) * 2
+        return (frames * (samples // max(len(frames), 1) + 1))[:samples]
+
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 2000).astype(np.int16)
+    return noise.tobytes()
+
+
+async def run_session(transcriber, audio: bytes, chunk_ms: int, realtime: bool, partial_latencies, final_latencies):
+    """Stream one session's audio and record transcript latencies."""
+    stream = TranscriptStream(transcriber, audio_format="pcm16")
+    chunk_bytes = int(SAMPLE_RATE * chunk_ms / 1000) * 2
+    pending = []
+
+    async def timed_partial():
+        start = time.perf_counter()
+        await stream.transcribe()
+        partial_latencies.append(time.perf_counter() - start)
+
+    for offset in range(0, len(audio), chunk_bytes):
+        stream.feed(audio[offset:offset + chunk_bytes])
+        if stream.partial_due() and all(task.done() for task in pending):
+            pending.append(asyncio.create_task(timed_partial()))
+        if realtime:
+            await asyncio.sleep(chunk_ms / 1000)
+
+    await asyncio.gather(*pending)
+    start = time.perf_counter()
+    await stream.transcribe()
+    final_latencies.append(time.perf_counter() - start)
+
+
+async def main(args):
+    transcriber = StreamingTranscriber(workers=args.workers, batch_size=args.batch_size,
+                                       batch_window_ms=args.batch_window_ms, model_name=args.model)
+    start = time.perf_counter()
+    await transcriber.start()
+    warmup_seconds = time.perf_counter() - start
+
+    audio = load_audio(args.wav, args.seconds)
+    partial_latencies, final_latencies = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_session(transcriber, audio, args.chunk_ms, args.realtime, partial_latencies, final_latencies)
+        for _ in range(args.sessions)
+    ])
+    elapsed = time.perf_counter() - start
+    await transcriber.stop()
+
+    audio_seconds = args.sessions * args.seconds
+    print(json.dumps({
+        "config": vars(args),
+        "warmup_seconds": round(warmup_seconds, 2),
+        "wall_seconds": round(elapsed, 2),
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2),
+        "partial": summarize(partial_latencies),
+        "final": summarize(final_latencies),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark streaming Whisper transcription on CPU")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent streaming sessions")
+    parser.add_argument("--seconds", type=float, default=20, help="Audio length per session")
+    parser.add_argument("--chunk-ms", type=int, default=250, help="Audio chunk size sent per frame")
+    parser.add_argument("--workers", type=int, default=2, help="Whisper worker processes")
+    parser.add_argument("--batch-size", type=int, default=8, help="Maximum windows per decode batch")
+    parser.add_argument("--batch-window-ms", type=int, default=50, help="Batch collection window")
+    parser.add_argument("--model", default="base.en", help="Whisper model name")
+    parser.add_argument("--wav", default="", help="16kHz mono wav file to stream (default: noise)")
+    parser.add_argument("--realtime", action="store_true", help="Pace chunks at real-time speed")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,16 @@
+# ASGI app with fake LLM crews for benchmarking a real server process:
+#
+#   cd model
+#   BENCH_LLM_LATENCY=0.3 BENCH_MOCK_MONGO=false uvicorn benchmarks.fake_app:app
+import os
+
+from benchmarks.fakes import install_fakes
+
+install_fakes(
+    latency=float(os.getenv("BENCH_LLM_LATENCY", "0.3")),
+    jitter=float(os.getenv("BENCH_LLM_JITTER", "0.1")),
+    error_rate=float(os.getenv("BENCH_LLM_ERROR_RATE", "0")),
+    mock_mongo=os.getenv("BENCH_MOCK_MONGO", "true").lower() == "true",
+)
+
+from main import app  # noqa: E402
@@ -0,0 +1,176 @@
+# Offline stand-ins for the LLM crews and MongoDB used by the benchmarks.
+#
+# install_fakes() must run before any application module is imported: it
+# replaces the agents module with deterministic fake crews and (optionally)
+# pymongo.MongoClient with an in-memory mongomock client.
+import hashlib
+import json
+import random
+import sys
+import time
+import types
+from typing import Dict, List
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+class FakeCrew:
+    def __init__(self, name: str, latency: float = 0.5, jitter: float = 0.2,
+                 error_rate: float = 0.0, seed: int = 0):
+        """Deterministic crew stand-in with configurable latency, jitter and error rate
+
+        Args:
+            name: Crew name ("question", "response", "score" or "followup")
+            latency: Base latency per kickoff in seconds
+            jitter: Maximum extra latency in seconds, uniformly distributed
+            error_rate: Probability that a kickoff raises FakeLLMError
+            seed: Seed for the latency/error random stream
+        """
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def kickoff(self, inputs: Dict) -> str:
+        time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.error_rate:
+            raise FakeLLMError(f"Simulated {self.name} crew failure")
+
+        # Outputs depend only on the inputs so runs are reproducible
+        digest = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).digest()
+        if self.name == "question":
+            return "```json\n" + json.dumps([
+                {"id": i + 1, "question": f"Question {i + 1} ({digest[i]:02x}): describe a project where you used this skill."}
+                for i in range(5)
+            ]) + "\n```"
+        if self.name == "followup":
+            return f"Can you walk me through the trade-offs you considered there ({digest[0]:02x})?"
+        if self.name == "response":
+            return ("Technical accuracy: solid. Problem solving: structured. "
+                    "Communication: clear. Overall: good answer with room for more depth. " * (1 + digest[0] % 4))
+        scores = [round(5 + (byte % 50) / 10, 1) for byte in digest[:4]]
+        return json.dumps({
+            "overall_score": round(sum(scores) / 4, 1),
+            "score_breakdown": {
+                "technical skill": scores[0],
+                "problem solving": scores[1],
+                "communication": scores[2],
+                "knowledge": scores[3]
+            },
+            "strengths": ["Clear communication"],
+            "improvement_areas": ["More concrete examples"]
+        })
+
+
+class StubQuotaError(RuntimeError):
+    status_code = 429
+
+
+class StubProvider:
+    def __init__(self, requests_per_minute: Dict[str, float], clock=time.monotonic):
+        """Local LLM provider stand-in enforcing a request quota per API key
+
+        Each key gets a one-minute sliding window; calls beyond its quota fail
+        the way Gemini does (429 RESOURCE_EXHAUSTED with a retry hint).
+
+        Args:
+            requests_per_minute: Actual quota per key secret
+            clock: Time source, shared with the key pool in simulations
+        """
+        self.requests_per_minute = requests_per_minute
+        self.clock = clock
+        self.calls: Dict[str, List[float]] = {key: [] for key in requests_per_minute}
+
+    def call(self, api_key: str) -> str:
+        now = self.clock()
+        window = [t for t in self.calls[api_key] if now - t < 60]
+        if len(window) >= self.requests_per_minute[api_key]:
+            self.calls[api_key] = window
+            retry = 60 - (now - window[0])
+            raise StubQuotaError(f"429 RESOURCE_EXHAUSTED: quota exceeded, retry in {retry:.0f}s")
+        window.append(now)
+        self.calls[api_key] = window
+        return "ok"
+
+
+def _apply_one_by_one(collection, requests, ordered: bool = True, **kwargs):
+    """bulk_write for mongomock collections, applying each operation with its single-document call.
+
+    mongomock's own bulk_write passes pymongo >= 4.9 operations a sort argument
+    it does not accept. Like an ordered bulk write, the first failure stops the
+    batch; the result is not used by the application.
+    """
+    for request in requests:
+        kind = type(request).__name__
+        if kind in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+            method = {"UpdateOne": "update_one", "UpdateMany": "update_many", "ReplaceOne": "replace_one"}[kind]
+            getattr(collection, method)(request._filter, request._doc, upsert=request._upsert)
+        elif kind in ("DeleteOne", "DeleteMany"):
+            getattr(collection, "delete_one" if kind == "DeleteOne" else "delete_many")(request._filter)
+        elif kind == "InsertOne":
+            collection.insert_one(request._doc)
+        else:
+            raise TypeError(f"Unsupported bulk operation: {kind}")
+
+
+def install_fakes(latency: float = 0.5, jitter: float = 0.2, error_rate: float = 0.0,
+                  mock_mongo: bool = True, seed: int = 0) -> Dict[str, FakeCrew]:
+    """Swap the LLM crews (and optionally MongoDB) for local stand-ins.
+
+    Returns:
+        The fake crews by name, so callers can adjust latency between runs
+    """
+    crews = {
+        name: FakeCrew(name, latency, jitter, error_rate, seed + i)
+        for i, name in enumerate(["question", "response", "score", "followup"])
+    }
+    fake_agents = types.ModuleType("agents")
+    fake_agents.CREWS = crews
+    fake_agents.warmup = lambda: None
+    fake_agents.question_crew = crews["question"]
+    fake_agents.response_crew = crews["response"]
+    fake_agents.score_crew = crews["score"]
+    fake_agents.followup_crew = crews["followup"]
+    sys.modules["agents"] = fake_agents
+
+    if mock_mongo:
+        import mongomock
+        import pymongo
+
+        class MockClient(mongomock.MongoClient):
+            def __init__(self, *args, event_listeners=None, **kwargs):
+                super().__init__(*args, **kwargs)
+
+        pymongo.MongoClient = MockClient
+        mongomock.Collection.bulk_write = _apply_one_by_one
+
+    return crews
+
+
+def make_resume_pdf(seed: int = 0) -> bytes:
+    """Build a small but realistic resume PDF in memory."""
+    import fitz
+
+    rng = random.Random(seed)
+    skills = rng.sample(["Python", "FastAPI", "MongoDB", "React", "Docker", "AWS", "Kubernetes",
+                         "TypeScript", "PostgreSQL", "Redis", "Machine Learning", "Java"], 6)
+    lines = [
+        f"Candidate {seed}", "candidate@example.com | github.com/candidate",
+        "SUMMARY", f"Software engineer with {rng.randint(1, 9)} years of experience building web services.",
+        "SKILLS", ", ".join(skills),
+        "EXPERIENCE",
+        f"Backend Engineer, Acme Corp 2020-2024: built {skills[0]} services handling 2M requests per day.",
+        f"Reduced latency by {rng.randint(10, 60)} percent by introducing caching with {skills[1]}.",
+        "PROJECTS", f"Interview platform using {skills[2]} and {skills[3]}.",
+        "EDUCATION", "BSc Computer Science, 2019",
+    ]
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((50, 60 + 18 * i), line, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
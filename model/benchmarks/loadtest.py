@@ -0,0 +1,178 @@
+# Offline load test: drives upload -> question fetch -> submit -> dashboard flows
+# against the API with fake LLM crews and an in-memory MongoDB, and reports
+# throughput and p50/p95/p99 latency per endpoint.
+#
+#   cd model
+#   python -m benchmarks.loadtest --users 20 --iterations 3 --llm-latency 0.3
+#   python -m benchmarks.loadtest --output run.json
+#   python -m benchmarks.loadtest --baseline run.json --max-regression 0.2   # exits 1 on regression
+#
+# With --target the flows run against an already running server instead
+# (e.g. uvicorn benchmarks.fake_app:app) over real HTTP. With --replay the
+# crews answer from a store recorded with LLM_REPLAY_MODE=record, using the
+# recorded latencies, so orchestration is measured against real traffic shapes.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.stats import summarize
+
+
+class FlowRunner:
+    def __init__(self, client, resume_pdf: bytes):
+        self.client = client
+        self.resume_pdf = resume_pdf
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        """Issue one request and record its latency under the endpoint name."""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+    async def run_flow(self, user_id: str) -> None:
+        """One candidate: upload a resume, answer the questions, open the dashboard."""
+        response = await self.call(
+            "upload_resume", "POST", "/upload_resume",
+            files={"file": ("resume.pdf", self.resume_pdf, "application/pdf")},
+            data={"user_id": user_id}
+        )
+        if response is None:
+            return
+        session_id = response.json()["session_id"]
+
+        response = await self.call("question", "GET", f"/question/{user_id}/{session_id}")
+        if response is None:
+            return
+        questions = response.json()["questions"]
+
+        await self.call(
+            "process_interview_responses", "POST", f"/process_interview_responses/{user_id}/{session_id}",
+            json={
+                "userId": user_id,
+                "sessionId": session_id,
+                "responses": [
+                    {"questionId": q["id"], "answer": f"My answer to {q['text']} involves careful trade-offs."}
+                    for q in questions
+                ]
+            }
+        )
+
+        await asyncio.gather(
+            self.call("user_stats", "GET", f"/user_stats/{user_id}"),
+            self.call("performance_evaluations", "GET", f"/performance_evaluations/{user_id}"),
+            self.call("monthly_scores", "GET", f"/monthly_scores/{user_id}"),
+            self.call("test_scores", "GET", f"/test_scores/{user_id}"),
+            self.call("get_mock_interview", "GET", f"/get_mock_interview/{user_id}"),
+        )
+
+
+async def run_load(client, resume_pdf: bytes, users: int, iterations: int) -> dict:
+    """Run `users` concurrent candidates, each completing `iterations` flows."""
+    runner = FlowRunner(client, resume_pdf)
+
+    async def user_loop(index: int):
+        for _ in range(iterations):
+            await runner.run_flow(f"bench-user-{index}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[user_loop(i) for i in range(users)])
+    elapsed = time.perf_counter() - start
+
+    total_requests = sum(len(samples) for samples in runner.latencies.values())
+    return {
+        "wall_seconds": round(elapsed, 2),
+        "flows_per_second": round(users * iterations / elapsed, 2),
+        "requests_per_second": round(total_requests / elapsed, 2),
+        "endpoints": {
+            endpoint: {**summarize(samples), "errors": runner.errors.get(endpoint, 0)}
+            for endpoint, samples in sorted(runner.latencies.items())
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list:
+    """Return the endpoints whose p95 latency regressed beyond max_regression."""
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"]
+        if change > max_regression:
+            regressions.append(f"{endpoint}: p95 {previous['p95_ms']}ms -> {stats['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+async def main(args) -> int:
+    import contextlib
+
+    import httpx
+
+    from benchmarks.fakes import make_resume_pdf
+
+    lifespan = contextlib.nullcontext()
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+    else:
+        if args.replay:
+            os.environ.update({
+                "LLM_REPLAY_MODE": "replay",
+                "LLM_REPLAY_PATH": args.replay,
+                "LLM_REPLAY_TIME_SCALE": str(args.replay_scale),
+            })
+        from benchmarks.fakes import install_fakes
+        install_fakes(args.llm_latency, args.llm_jitter, args.llm_error_rate, mock_mongo=not args.real_mongo)
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                   timeout=args.timeout)
+        # ASGITransport does not run startup/shutdown, so drive the lifespan explicitly
+        lifespan = app.router.lifespan_context(app)
+
+    async with lifespan, client:
+        report = await run_load(client, make_resume_pdf(), args.users, args.iterations)
+    report["config"] = vars(args)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test for the interview API")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated candidates")
+    parser.add_argument("--iterations", type=int, default=2, help="Flows per candidate")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM base latency (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Fake LLM max extra latency (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fake LLM failure probability")
+    parser.add_argument("--replay", default="", help="Serve crew outputs from this recorded fixture store")
+    parser.add_argument("--replay-scale", type=float, default=1.0, help="Multiplier for recorded latencies")
+    parser.add_argument("--real-mongo", action="store_true", help="Use MONGO_URI instead of mongomock")
+    parser.add_argument("--target", default="", help="Base URL of a running server to test instead")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout (s)")
+    parser.add_argument("--output", default="", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", default="", help="Baseline report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 increase (0.2 = 20%%)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,24 @@
+# Helpers for summarising benchmark latency samples
+from typing import Dict, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return the pct-th percentile of samples using linear interpolation."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Summarise latency samples (seconds) as count, mean and p50/p95/p99 in milliseconds."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(1000 * sum(samples) / len(samples), 2) if samples else 0.0,
+        "p50_ms": round(1000 * percentile(samples, 50), 2),
+        "p95_ms": round(1000 * percentile(samples, 95), 2),
+        "p99_ms": round(1000 * percentile(samples, 99), 2),
+    }
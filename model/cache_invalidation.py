@@ -0,0 +1,75 @@
+# Cross-worker invalidation for in-process caches.
+#
+# Each cache namespace has a version counter in the cache_versions collection.
+# Writers bump the version; every worker compares the version its cache was
+# built from and rebuilds when it changed. Version reads are memoised for
+# CACHE_VERSION_POLL_SECONDS so the check stays off the hot path.
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from mongo_connect import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+CACHE_VERSION_POLL_SECONDS = float(os.getenv("CACHE_VERSION_POLL_SECONDS", "5"))
+
+
+class CacheVersions:
+    def __init__(self, collection=None, poll_seconds: float = CACHE_VERSION_POLL_SECONDS):
+        """Version counters shared by all workers through MongoDB
+
+        Args:
+            collection: MongoDB collection holding one counter document per namespace
+            poll_seconds: How long a version read is reused before asking MongoDB again
+        """
+        self.collection = collection
+        self.poll_seconds = poll_seconds
+        self._seen: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def current(self, namespace: str) -> int:
+        """Return the namespace version, re-reading it at most every poll_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._seen.get(namespace)
+        if cached and now - cached[1] < self.poll_seconds:
+            return cached[0]
+
+        try:
+            document = self.collection.find_one({"_id": namespace}, {"version": 1})
+            version = document["version"] if document else 0
+        except Exception as e:
+            logger.error(f"Failed to read cache version for {namespace}: {str(e)}")
+            # Keep serving the last known version rather than thrashing caches
+            version = cached[0] if cached else 0
+
+        with self._lock:
+            self._seen[namespace] = (version, now)
+        return version
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate a namespace in every worker; returns the new version."""
+        document = self.collection.find_one_and_update(
+            {"_id": namespace},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        version = document["version"]
+        # The writing worker sees its own invalidation immediately
+        with self._lock:
+            self._seen[namespace] = (version, time.monotonic())
+        return version
+
+
+# Global instance shared by all in-process caches
+cache_versions = CacheVersions(collection=db["cache_versions"])
@@ -0,0 +1,221 @@
+# Cohort analytics: materialized score distributions across all candidates.
+#
+# Every completed interview adds its scores to fixed-bin histograms (0-10 in
+# steps of 0.1) stored in cohort_stats: one document for all time and one per
+# month. Histograms are mergeable sketches - updates are plain $inc, months
+# can be summed - and since scores have one decimal they are exact. A
+# percentile rank is then one document read and a prefix sum over 101 bins,
+# independent of how many interviews exist.
+#
+# Usage (recompute everything from mock_interviews):
+#   python cohort_analytics.py --rebuild
+import argparse
+import logging
+import math
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from mongo_connect import collection, db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BINS = 101  # scores 0.0 .. 10.0
+CATEGORIES = ("overall", "technical_skill", "problem_solving", "communication", "knowledge")
+ALL_TIME = "all"
+
+cohort_collection = db["cohort_stats"]
+
+# Leading number of an LLM-produced score such as "8/10" or "7.5 (good)"
+_LEADING_NUMBER = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+
+
+def as_score(value: Any) -> float:
+    """Numeric score from an LLM-produced value (8, "8", "8/10"); NaN if there is none."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _LEADING_NUMBER.match(value)
+        if match:
+            return float(match.group(1))
+    return float("nan")
+
+
+def score_bin(score: float) -> int:
+    return min(max(int(round(float(score) * 10)), 0), BINS - 1)
+
+
+def contribution(evaluation: Dict[str, Any]) -> Dict[str, int]:
+    """Map an evaluation to the histogram bin it adds to in each category that has a numeric score."""
+    scores = {"overall": as_score(evaluation.get("score", 0))}
+    for category, value in (evaluation.get("breakdown") or {}).items():
+        key = category.replace(" ", "_")
+        if key in CATEGORIES:
+            scores[key] = as_score(value)
+    return {key: score_bin(score) for key, score in scores.items() if not math.isnan(score)}
+
+
+def period_of(timestamp: Any) -> Optional[str]:
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return timestamp.strftime("%Y-%m") if isinstance(timestamp, datetime) else None
+
+
+def _increments(bins: Dict[str, int], sign: int) -> Dict[str, int]:
+    update = {f"hist.{category}.{index}": sign for category, index in bins.items()}
+    update["count"] = sign
+    return update
+
+
+def _merge(target: Dict[str, int], source: Dict[str, int]) -> None:
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+
+def record_completion(user_id: str, session_id: str, evaluation: Dict[str, Any], timestamp: Any) -> None:
+    """Add a completed interview to the cohort histograms.
+
+    The interview remembers the bins it contributed, so re-evaluating it moves
+    its counts instead of adding them twice. If the histograms cannot be
+    updated the previous marker is put back, so a retry counts it again.
+    """
+    bins = contribution(evaluation)
+    previous = collection.find_one_and_update(
+        {"user_id": user_id, "session_id": session_id},
+        {"$set": {"cohort_contribution": bins}},
+        projection={"cohort_contribution": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        return
+    old_bins = previous.get("cohort_contribution")
+    if old_bins == bins:
+        return
+
+    increments = _increments(bins, 1)
+    if old_bins:
+        _merge(increments, _increments(old_bins, -1))
+    increments = {key: value for key, value in increments.items() if value}
+
+    periods = [ALL_TIME] + [p for p in [period_of(timestamp)] if p]
+    try:
+        cohort_collection.bulk_write([
+            UpdateOne({"_id": period}, {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}}, upsert=True)
+            for period in periods
+        ], ordered=False)
+    except Exception:
+        # Only if no later evaluation has replaced the marker meanwhile
+        collection.update_one(
+            {"user_id": user_id, "session_id": session_id, "cohort_contribution": bins},
+            {"$set": {"cohort_contribution": old_bins}} if old_bins else {"$unset": {"cohort_contribution": ""}}
+        )
+        raise
+
+
+def _histogram(document: Optional[Dict[str, Any]], category: str) -> List[int]:
+    counts = [0] * BINS
+    for index, count in ((document or {}).get("hist", {}).get(category) or {}).items():
+        counts[int(index)] = count
+    return counts
+
+
+def percentile_rank(score: float, category: str = "overall", period: str = ALL_TIME) -> Optional[float]:
+    """Percentage of the cohort scoring below score (ties count half); None without a numeric score."""
+    score = as_score(score)
+    if math.isnan(score):
+        return None
+    counts = _histogram(cohort_collection.find_one({"_id": period}, {f"hist.{category}": 1}), category)
+    total = sum(counts)
+    if not total:
+        return None
+    index = score_bin(score)
+    return round(100 * (sum(counts[:index]) + counts[index] / 2) / total, 1)
+
+
+def quantile(counts: List[int], fraction: float) -> float:
+    total = sum(counts)
+    target = fraction * total
+    running = 0
+    for index, count in enumerate(counts):
+        running += count
+        if running >= target and count:
+            return index / 10
+    return 0.0
+
+
+def summarize_period(period: str = ALL_TIME) -> Dict[str, Any]:
+    """Count, mean and quartiles per category for one period."""
+    document = cohort_collection.find_one({"_id": period})
+    summary = {"period": period, "interviews": (document or {}).get("count", 0), "categories": {}}
+    for category in CATEGORIES:
+        counts = _histogram(document, category)
+        total = sum(counts)
+        summary["categories"][category] = {
+            "count": total,
+            "mean": round(sum(i / 10 * c for i, c in enumerate(counts)) / total, 2) if total else 0,
+            "p25": quantile(counts, 0.25) if total else 0,
+            "p50": quantile(counts, 0.5) if total else 0,
+            "p75": quantile(counts, 0.75) if total else 0,
+            "p90": quantile(counts, 0.9) if total else 0,
+        }
+    return summary
+
+
+def monthly_volumes(months: int = 12) -> List[Dict[str, Any]]:
+    """Completed interview counts for the most recent months with data."""
+    cursor = cohort_collection.find({"_id": {"$ne": ALL_TIME}}, {"count": 1}).sort("_id", -1).limit(months)
+    return [{"period": document["_id"], "interviews": document.get("count", 0)} for document in reversed(list(cursor))]
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Recompute all cohort histograms from mock_interviews.
+
+    Run during low traffic: completions recorded while the rebuild scans are
+    overwritten by the rebuilt totals.
+    """
+    totals: Dict[str, Dict[str, int]] = {}
+    pending, processed = [], 0
+    cursor = collection.find(
+        {"completed": True, "evaluation.score": {"$exists": True}},
+        {"user_id": 1, "session_id": 1, "evaluation.score": 1, "evaluation.breakdown": 1, "timestamp": 1},
+        batch_size=batch_size
+    )
+    for document in cursor:
+        bins = contribution(document["evaluation"])
+        for period in [ALL_TIME] + [p for p in [period_of(document.get("timestamp"))] if p]:
+            _merge(totals.setdefault(period, {}), _increments(bins, 1))
+        pending.append(UpdateOne({"_id": document["_id"]}, {"$set": {"cohort_contribution": bins}}))
+        processed += 1
+        if len(pending) >= batch_size:
+            collection.bulk_write(pending, ordered=False)
+            pending = []
+    if pending:
+        collection.bulk_write(pending, ordered=False)
+
+    now = datetime.utcnow()
+    for period, increments in totals.items():
+        document = {"count": increments.pop("count", 0), "hist": {}, "updated_at": now}
+        for key, count in increments.items():
+            _, category, index = key.split(".")
+            document["hist"].setdefault(category, {})[index] = count
+        cohort_collection.replace_one({"_id": period}, document, upsert=True)
+    cohort_collection.delete_many({"_id": {"$nin": list(totals)}})
+    logger.info(f"Rebuilt cohort stats for {len(totals)} periods from {processed} interviews")
+    return processed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cohort score distributions")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all histograms from mock_interviews")
+    parser.add_argument("--period", default=ALL_TIME, help="Period to summarise (all or YYYY-MM)")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        rebuild()
+    print(summarize_period(args.period))
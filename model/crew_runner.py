@@ -0,0 +1,73 @@
+# Single entry point for LLM crew kickoffs, so every call is timed and metered
+import json
+import logging
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+
+import agents
+from key_pool import KeyPoolExhausted
+from llm_replay import llm_replay
+from metrics import llm_calls, llm_tokens, timed
+from profiling import profiler
+from request_context import get_request_context
+from resume_condenser import count_tokens
+from usage import usage_tracker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def run_crew(name: str, inputs: dict, user_id: Optional[str] = None) -> str:
+    """Kick off the named crew ("question", "response", "score" or "followup") and return its raw output.
+
+    Args:
+        name: Key of the crew in agents.CREWS
+        inputs: Template inputs for the crew's task
+        user_id: User the call is made for (default: the request's user); counted against their quota
+
+    Returns:
+        The crew output as a string
+
+    Raises:
+        HTTPException: 429 if the user's LLM usage quota is exhausted, 503 if no API key
+            became available in time
+    """
+    user_id = user_id or get_request_context().get("user_id")
+    input_tokens = count_tokens(json.dumps(inputs, default=str))
+    # Joins the request's profile, if it is being profiled
+    with timed(f"crew.{name}"), profiler.profile(f"crew.{name}"):
+        result = llm_replay.lookup(name, inputs) if llm_replay.mode == "replay" else None
+        # Replayed calls cost nothing and are not counted against the user
+        metered = result is None and user_id is not None
+        if result is None:
+            if metered:
+                usage_tracker.check(user_id)
+            start = time.perf_counter()
+            try:
+                result = agents.CREWS[name].kickoff(inputs=inputs)
+            except KeyPoolExhausted as e:
+                # No LLM call was made, so nothing is charged to the user
+                llm_calls.inc(crew=name, outcome="exhausted")
+                logger.warning(f"No LLM API key available for crew {name}: {str(e)}")
+                raise HTTPException(status_code=503, detail="AI service is busy, please retry shortly",
+                                    headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}) from e
+            except Exception:
+                llm_calls.inc(crew=name, outcome="error")
+                if metered:
+                    usage_tracker.record(user_id, name, input_tokens, 0, time.perf_counter() - start, ok=False)
+                raise
+            latency = time.perf_counter() - start
+            if llm_replay.mode == "record":
+                llm_replay.record(name, inputs, str(result), latency)
+
+    result = str(result)
+    output_tokens = count_tokens(result)
+    if metered:
+        usage_tracker.record(user_id, name, input_tokens, output_tokens, latency)
+    llm_calls.inc(crew=name, outcome="ok")
+    llm_tokens.inc(input_tokens, crew=name, direction="input")
+    llm_tokens.inc(output_tokens, crew=name, direction="output")
+    return result
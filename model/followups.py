@@ -0,0 +1,233 @@
+# Adaptive follow-up questions with speculative prefetch.
+#
+# While the candidate is still answering, each new partial transcript can start
+# generating a follow-up from the answer so far. When the answer ends, a
+# speculative result whose basis covers most of the final answer is used as is;
+# otherwise a fresh follow-up is generated. Either way the wait is capped by
+# FOLLOWUP_LATENCY_BUDGET_SECONDS: if no follow-up is ready in time the
+# interview simply moves on to the next planned question. Superseded and unused
+# branches are cancelled.
+#
+# LLM calls run in the threadpool and cannot be interrupted, so "cancelled"
+# means the result is discarded; speculation is rate-limited to bound the waste.
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from crew_runner import run_crew
+from metrics import Counter, registry, stage_duration
+from mongo_connect import collection
+from shared_state import interview_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Longest gap allowed between the end of an answer and the next question
+FOLLOWUP_LATENCY_BUDGET_SECONDS = float(os.getenv("FOLLOWUP_LATENCY_BUDGET_SECONDS", "1.5"))
+# Answers shorter than this are not worth speculating on
+FOLLOWUP_MIN_WORDS = int(os.getenv("FOLLOWUP_MIN_WORDS", "20"))
+# Minimum time between speculative generations for the same question
+FOLLOWUP_SPECULATE_INTERVAL_SECONDS = float(os.getenv("FOLLOWUP_SPECULATE_INTERVAL_SECONDS", "4"))
+# A speculative follow-up is reused if its basis covers this share of the final answer
+FOLLOWUP_MIN_COVERAGE = float(os.getenv("FOLLOWUP_MIN_COVERAGE", "0.7"))
+# Follow-ups asked per interview at most (enforced by the routes from the stored questions)
+FOLLOWUP_MAX_PER_INTERVIEW = int(os.getenv("FOLLOWUP_MAX_PER_INTERVIEW", "3"))
+
+followup_outcomes = registry.register(Counter(
+    "mockly_followup_outcomes_total", "Follow-up generation outcomes", ("outcome",)))
+
+
+def parse_followup(output: str) -> Optional[str]:
+    """Take the first non-empty line of the crew output as the follow-up question."""
+    for line in output.strip().strip("`").splitlines():
+        line = line.strip().strip('"').strip()
+        if line and line.lower() not in ("json", "none"):
+            return line
+    return None
+
+
+def generate_followup(question: str, answer: str) -> Optional[str]:
+    return parse_followup(run_crew("followup", {"question": question, "answer": answer}))
+
+
+def covers(basis: str, answer: str) -> bool:
+    """Whether a follow-up generated from basis is still valid for the final answer.
+
+    Partial transcripts get revised near their end, so the last few words of
+    the basis are not required to match.
+    """
+    basis_words, answer_words = basis.split(), answer.split()
+    stable = max(len(basis_words) - 3, 0)
+    return (basis_words[:stable] == answer_words[:stable]
+            and len(basis_words) >= FOLLOWUP_MIN_COVERAGE * len(answer_words))
+
+
+def _start(question: str, answer: str) -> asyncio.Task:
+    task = asyncio.create_task(run_in_threadpool(generate_followup, question, answer))
+    # Discarded branches may fail unobserved; retrieve their exception to keep the loop quiet
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+
+class _Branch:
+    def __init__(self, basis: str, task: asyncio.Task):
+        self.basis = basis
+        self.task = task
+        self.started = time.monotonic()
+
+
+class FollowupPlanner:
+    def __init__(self, latency_budget: float = FOLLOWUP_LATENCY_BUDGET_SECONDS):
+        """Per-worker speculative follow-up generation, keyed by (session_id, question_id)
+
+        Args:
+            latency_budget: Longest time resolve() waits for a follow-up
+        """
+        self.latency_budget = latency_budget
+        self._branches: Dict[Tuple[str, str], _Branch] = {}
+        # Question text by (session_id, question_id), so partials do not hit MongoDB
+        self._questions: Dict[Tuple[str, str], str] = {}
+        # The event loop owning the branches; they are only touched from it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _cancel(self, key: Tuple[str, str]) -> None:
+        branch = self._branches.pop(key, None)
+        if branch and not branch.task.done():
+            branch.task.cancel()
+            followup_outcomes.inc(outcome="cancelled")
+
+    def speculate(self, session_id: str, question_id: str, question: str, partial_answer: str) -> None:
+        """Start (or restart) generating a follow-up from the answer so far."""
+        words = len(partial_answer.split())
+        if words < FOLLOWUP_MIN_WORDS:
+            return
+
+        key = (session_id, question_id)
+        branch = self._branches.get(key)
+        if branch:
+            if time.monotonic() - branch.started < FOLLOWUP_SPECULATE_INTERVAL_SECONDS:
+                return
+            if covers(branch.basis, partial_answer):
+                # The running branch is still valid for the answer so far
+                return
+            # The answer moved on; the older branch would no longer be used
+            self._cancel(key)
+
+        self._loop = asyncio.get_running_loop()
+        self._branches[key] = _Branch(partial_answer, _start(question, partial_answer))
+
+    async def resolve(self, session_id: str, question_id: str, question: str, answer: str) -> Dict:
+        """Return a follow-up for the final answer within the latency budget.
+
+        Returns:
+            Dict with "followup" (question text or None), "source" and "latency_ms"
+        """
+        start = time.perf_counter()
+        key = (session_id, question_id)
+        branch = self._branches.get(key)
+
+        if len(answer.split()) < FOLLOWUP_MIN_WORDS:
+            self._cancel(key)
+            return {"followup": None, "source": "skipped", "latency_ms": 0.0}
+
+        if branch and covers(branch.basis, answer):
+            self._branches.pop(key)
+            task, source = branch.task, "speculative"
+        else:
+            self._cancel(key)
+            task, source = _start(question, answer), "fresh"
+
+        remaining = self.latency_budget - (time.perf_counter() - start)
+        try:
+            followup = await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+        except asyncio.TimeoutError:
+            task.cancel()
+            followup, source = None, "budget_exceeded"
+        except Exception as e:
+            logger.error(f"Follow-up generation failed for session {session_id}: {str(e)}")
+            followup, source = None, "error"
+
+        latency = time.perf_counter() - start
+        stage_duration.observe(latency, stage="followup_gap")
+        followup_outcomes.inc(outcome=source)
+        return {"followup": followup, "source": source, "latency_ms": round(1000 * latency, 1)}
+
+    def discard(self, session_id: str) -> None:
+        """Cancel every branch of a session (interview finished or abandoned)."""
+        for key in [key for key in self._branches if key[0] == session_id]:
+            self._cancel(key)
+        for key in [key for key in self._questions if key[0] == session_id]:
+            del self._questions[key]
+
+    def discard_threadsafe(self, session_id: str) -> None:
+        """discard() for callers outside the event loop, such as threadpool handlers."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.discard, session_id)
+
+    async def question_text(self, user_id: str, session_id: str, question_id: str) -> Optional[str]:
+        key = (session_id, question_id)
+        self._loop = asyncio.get_running_loop()
+        if key not in self._questions:
+            data = await run_in_threadpool(
+                collection.find_one, {"user_id": user_id, "session_id": session_id}, {"questions": 1}
+            )
+            for question in (data or {}).get("questions") or []:
+                self._questions[(session_id, question["id"])] = question["text"]
+        return self._questions.get(key)
+
+
+# Global instance; speculation state lives in the worker handling the session's connection
+followup_planner = FollowupPlanner()
+
+
+def new_followup_question(parent_id: str, text: str) -> Dict:
+    """Question entry stored in the interview for an asked follow-up."""
+    return {"id": str(uuid.uuid4()), "text": text, "parent_id": parent_id}
+
+
+async def speculate_followup(user_id: str, session_id: str, question_id: str, partial_answer: str) -> None:
+    """Feed a partial answer to the planner; unknown questions are ignored."""
+    question = await followup_planner.question_text(user_id, session_id, question_id)
+    if question:
+        followup_planner.speculate(session_id, question_id, question, partial_answer)
+
+
+async def ask_followup(user_id: str, session_id: str, question_id: str, answer: str) -> Dict:
+    """Resolve the follow-up to a final answer and add it to the interview's questions.
+
+    Returns:
+        Dict with "followup" (the stored question entry or None), "source" and "latency_ms"
+    """
+    data = await run_in_threadpool(
+        collection.find_one, {"user_id": user_id, "session_id": session_id}, {"questions": 1, "completed": 1}
+    )
+    if not data:
+        raise KeyError(f"Interview session {session_id} not found")
+    # Before the question lookup: archived interviews no longer carry their questions
+    if data.get("completed"):
+        followup_planner.discard(session_id)
+        return {"followup": None, "source": "skipped", "latency_ms": 0.0}
+    questions = data.get("questions") or []
+    question = next((q for q in questions if q["id"] == question_id), None)
+    if question is None:
+        raise KeyError(f"Question {question_id} not found")
+
+    if sum(1 for q in questions if q.get("parent_id")) >= FOLLOWUP_MAX_PER_INTERVIEW:
+        followup_planner.discard(session_id)
+        return {"followup": None, "source": "skipped", "latency_ms": 0.0}
+
+    result = await followup_planner.resolve(session_id, question_id, question["text"], answer)
+    if result["followup"]:
+        entry = new_followup_question(question_id, result["followup"])
+        await run_in_threadpool(interview_store.upsert_item, user_id, session_id, "questions", entry, "id")
+        result["followup"] = entry
+    return result
@@ -0,0 +1,164 @@
+# Idempotency keys for expensive endpoints, backed by a MongoDB record of
+# in-progress and completed requests so retries are answered from the stored
+# result instead of re-running the LLM pipeline, across all workers.
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pymongo import errors as mongo_errors
+
+from metrics import Counter, fallbacks, registry
+from mongo_connect import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# How long completed results are kept for replay
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# An in-progress record older than this is assumed abandoned (e.g. crashed worker)
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "300"))
+# How long a duplicate request waits for the original to finish before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+
+idempotency_collection = db["idempotency_keys"]
+
+idempotent_replays = registry.register(Counter(
+    "mockly_idempotent_replays_total", "Requests answered from a stored idempotent result", ("scope",)))
+
+
+def fingerprint(*parts: Any) -> str:
+    """Hash request contents so a key reused for a different request can be rejected."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _record_id(scope: str, user_id: str, key: str) -> str:
+    return f"{scope}:{user_id}:{key}"
+
+
+def forget_result(scope: str, user_id: str, key: Optional[str]) -> None:
+    """Drop the stored result of a key whose outcome turned out unusable later.
+
+    For responses acknowledging background work (an upload whose question
+    generation then failed), so a retry with the same key runs again instead
+    of replaying a dead session.
+    """
+    if key:
+        idempotency_collection.delete_one({"_id": _record_id(scope, user_id, key)})
+
+
+async def run_idempotent(scope: str, user_id: str, key: Optional[str], request_fingerprint: str,
+                         func: Callable[[], Awaitable[dict]]) -> dict:
+    """Run func at most once per (scope, user_id, key) and replay its stored result.
+
+    Args:
+        scope: Endpoint name the key belongs to
+        user_id: Owner of the key
+        key: Client supplied Idempotency-Key header (None runs func unconditionally)
+        request_fingerprint: Hash of the request contents
+        func: Coroutine function producing the JSON-serializable response
+
+    Returns:
+        The response of the first successful run for this key
+    """
+    if not key:
+        return await func()
+
+    record_id = _record_id(scope, user_id, key)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.2
+    while True:
+        now = datetime.utcnow()
+        try:
+            await asyncio.to_thread(idempotency_collection.insert_one, {
+                "_id": record_id,
+                "status": "in_progress",
+                "fingerprint": request_fingerprint,
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+                "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            })
+            claimed = True
+        except mongo_errors.DuplicateKeyError:
+            claimed = False
+        except mongo_errors.PyMongoError as e:
+            return await _run_unguarded(record_id, func, e)
+        if claimed:
+            return await _run_and_store(record_id, func)
+
+        try:
+            existing = await asyncio.to_thread(idempotency_collection.find_one, {"_id": record_id})
+        except mongo_errors.PyMongoError as e:
+            return await _run_unguarded(record_id, func, e)
+        if existing is None:
+            # The original failed and released the key; claim it for this request
+            continue
+
+        if existing["fingerprint"] != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+        if existing["status"] == "completed":
+            idempotent_replays.inc(scope=scope)
+            return existing["response"]
+
+        # Take over a record whose owner died without finishing
+        if existing["locked_until"] < now:
+            try:
+                claimed = await asyncio.to_thread(
+                    idempotency_collection.find_one_and_update,
+                    {"_id": record_id, "status": "in_progress", "locked_until": existing["locked_until"]},
+                    {"$set": {"locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}}
+                )
+            except mongo_errors.PyMongoError as e:
+                return await _run_unguarded(record_id, func, e)
+            if claimed:
+                return await _run_and_store(record_id, func)
+
+        if loop.time() > deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+async def _run_unguarded(record_id: str, func: Callable[[], Awaitable[dict]], error: Exception) -> dict:
+    """Run func without idempotency while the key store is unreachable.
+
+    Requests ran unguarded before clients sent keys, so an outage of the key
+    store degrades to that rather than failing every upload and submission.
+    """
+    fallbacks.inc(reason="idempotency_unavailable")
+    logger.error(f"Idempotency store unavailable for {record_id}, running without it: {str(error)}")
+    return await func()
+
+
+async def _run_and_store(record_id: str, func: Callable[[], Awaitable[dict]]) -> dict:
+    """Run func for a claimed key and store its response for replay."""
+    try:
+        result = await func()
+    except BaseException:
+        # Release the key so the client can retry a failed request
+        try:
+            await asyncio.to_thread(idempotency_collection.delete_one, {"_id": record_id, "status": "in_progress"})
+        except mongo_errors.PyMongoError as e:
+            logger.error(f"Failed to release idempotency key {record_id}: {str(e)}")
+        raise
+
+    try:
+        await asyncio.to_thread(
+            idempotency_collection.update_one,
+            {"_id": record_id},
+            {"$set": {"status": "completed", "response": result, "completed_at": datetime.utcnow()}}
+        )
+    except Exception as e:
+        logger.error(f"Failed to store idempotent result for {record_id}: {str(e)}")
+    return result
@@ -0,0 +1,227 @@
+# Hot/cold tiering for interview documents.
+#
+# Analytics only read the score, breakdown and timestamps of an interview, but
+# the full question text, answers and LLM feedback make up most of each
+# mock_interviews document. Once an interview is completed those bulky fields
+# are moved into mock_interviews_archive as one brotli-compressed blob, leaving
+# a slim summary in the hot collection so its working set stays in RAM.
+# Readers that need the full document call rehydrate().
+#
+# Usage (backfill existing interviews):
+#   python interview_archive.py --older-than-hours 24
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import brotli
+import orjson
+from bson import Binary
+from dotenv import load_dotenv
+
+from metrics import Counter, registry, timed
+from mongo_connect import collection, db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Archive interviews as soon as they are evaluated (the backfill CLI covers the rest)
+ARCHIVE_ON_COMPLETE = os.getenv("ARCHIVE_ON_COMPLETE", "true").lower() == "true"
+# Brotli quality 0-11; archiving happens off the request path, so favour ratio
+ARCHIVE_BROTLI_QUALITY = int(os.getenv("ARCHIVE_BROTLI_QUALITY", "9"))
+
+# Fields moved to the archive; everything else stays hot
+COLD_FIELDS = ("questions", "responses", "feedback")
+
+archive_collection = db["mock_interviews_archive"]
+
+archived_bytes = registry.register(Counter(
+    "mockly_archived_bytes_total", "Bytes of interview text moved to the archive", ("kind",)))
+
+
+def compress_fields(fields: Dict[str, Any]) -> bytes:
+    return brotli.compress(orjson.dumps(fields, default=str), quality=ARCHIVE_BROTLI_QUALITY,
+                           mode=brotli.MODE_TEXT)
+
+
+def decompress_fields(payload: bytes) -> Dict[str, Any]:
+    return orjson.loads(brotli.decompress(payload))
+
+
+def archive_interview(user_id: str, session_id: str) -> bool:
+    """Move the bulky fields of one completed interview to the archive.
+
+    The archive copy is written before the hot fields are removed, and the
+    removal only applies if the interview has not changed in between, so a
+    crash or a concurrent write never loses data.
+
+    Returns:
+        True if the interview was archived
+    """
+    query = {"user_id": user_id, "session_id": session_id, "completed": True, "archived": {"$ne": True}}
+    document = collection.find_one(query, {field: 1 for field in COLD_FIELDS + ("version",)})
+    if not document:
+        return False
+
+    cold = {field: document[field] for field in COLD_FIELDS if field in document}
+    with timed("archive_compress"):
+        raw = orjson.dumps(cold, default=str)
+        payload = compress_fields(cold)
+
+    archive_collection.update_one(
+        {"user_id": user_id, "session_id": session_id},
+        {"$set": {
+            "codec": "brotli",
+            "payload": Binary(payload),
+            "raw_bytes": len(raw),
+            "archived_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+    result = collection.update_one(
+        {**query, "version": document.get("version")},
+        {"$unset": {field: "" for field in COLD_FIELDS},
+         "$set": {"archived": True, "question_count": len(cold.get("questions", [])),
+                  "response_count": len(cold.get("responses", []))}}
+    )
+    if not result.modified_count:
+        logger.info(f"Interview {session_id} changed while archiving; leaving it hot")
+        return False
+
+    archived_bytes.inc(len(raw), kind="raw")
+    archived_bytes.inc(len(payload), kind="compressed")
+    logger.info(f"Archived interview {session_id}: {len(raw)} -> {len(payload)} bytes")
+    return True
+
+
+def merge_cold_fields(document: Dict[str, Any], cold: Dict[str, Any]) -> None:
+    """Merge archived fields into a document; array elements also on the hot document win by key."""
+    for field, value in cold.items():
+        hot = document.get(field)
+        if not isinstance(hot, list) or not isinstance(value, list):
+            document.setdefault(field, value)
+            continue
+        key = "id" if field == "questions" else "question_id"
+        hot_by_key = {item[key]: item for item in hot if isinstance(item, dict) and key in item}
+        merged = [hot_by_key.pop(item[key], item) if isinstance(item, dict) and key in item else item
+                  for item in value]
+        # Elements only the hot document has (e.g. answers to questions skipped before archiving)
+        merged += [item for item in hot if not isinstance(item, dict) or item.get(key) in hot_by_key]
+        document[field] = merged
+
+
+def restore_interview(user_id: str, session_id: str) -> bool:
+    """Move an archived interview's fields back into the hot document before it is rewritten.
+
+    Re-submitting an archived interview writes single answers and feedback
+    elements, which would otherwise land in arrays missing every archived
+    element. The restore only applies if the interview has not changed since
+    it was read; the archive copy is left for the next archive_interview to
+    overwrite.
+
+    Returns:
+        True if the interview was restored
+    """
+    query = {"user_id": user_id, "session_id": session_id, "archived": True}
+    for _ in range(2):
+        document = collection.find_one(query, {field: 1 for field in COLD_FIELDS + ("version",)})
+        if not document:
+            return False
+        entry = archive_collection.find_one({"user_id": user_id, "session_id": session_id}, {"payload": 1})
+        if entry is None:
+            logger.error(f"Archive entry missing for interview {session_id}")
+            return False
+
+        restored = {field: document[field] for field in COLD_FIELDS if field in document}
+        merge_cold_fields(restored, decompress_fields(entry["payload"]))
+        result = collection.update_one(
+            {**query, "version": document.get("version")},
+            {"$set": restored, "$unset": {"archived": "", "question_count": "", "response_count": ""},
+             "$inc": {"version": 1}}
+        )
+        if result.modified_count:
+            logger.info(f"Restored archived interview {session_id} for re-submission")
+            return True
+    logger.warning(f"Interview {session_id} kept changing while restoring it from the archive")
+    return False
+
+
+def rehydrate(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Restore archived fields into interview documents (one archive query for the batch).
+
+    Array elements written to the hot document after archiving replace the
+    archived elements with the same key, so the latest answers are shown.
+    """
+    archived = [doc for doc in documents if doc.get("archived")]
+    if not archived:
+        return documents
+
+    with timed("archive_rehydrate"):
+        keys = {(doc["user_id"], doc["session_id"]) for doc in archived}
+        cursor = archive_collection.find(
+            {"$or": [{"user_id": user_id, "session_id": session_id} for user_id, session_id in keys]},
+            {"_id": 0, "user_id": 1, "session_id": 1, "payload": 1}
+        )
+        cold_by_key = {(entry["user_id"], entry["session_id"]): decompress_fields(entry["payload"])
+                       for entry in cursor}
+
+    for doc in archived:
+        cold = cold_by_key.get((doc["user_id"], doc["session_id"]))
+        if cold is None:
+            logger.error(f"Archive entry missing for interview {doc['session_id']}")
+            continue
+        merge_cold_fields(doc, cold)
+        doc.pop("archived", None)
+        doc.pop("question_count", None)
+        doc.pop("response_count", None)
+    return documents
+
+
+def archive_completed(older_than: timedelta, limit: int = 0) -> int:
+    """Archive every completed interview last updated before now - older_than."""
+    cursor = collection.find(
+        {"completed": True, "archived": {"$ne": True}, "last_updated": {"$lt": datetime.now() - older_than}},
+        {"_id": 0, "user_id": 1, "session_id": 1},
+        limit=limit
+    )
+    archived = 0
+    for document in cursor:
+        try:
+            archived += archive_interview(document["user_id"], document["session_id"])
+        except Exception as e:
+            logger.error(f"Failed to archive interview {document.get('session_id')}: {str(e)}")
+    return archived
+
+
+def backfill_response_counts() -> int:
+    """Store response_count on interviews archived before it was kept in the hot summary."""
+    cursor = collection.find({"archived": True, "response_count": {"$exists": False}},
+                             {"_id": 0, "user_id": 1, "session_id": 1})
+    updated = 0
+    for document in cursor:
+        key = {"user_id": document["user_id"], "session_id": document["session_id"]}
+        entry = archive_collection.find_one(key, {"payload": 1})
+        if entry is None:
+            continue
+        responses = decompress_fields(entry["payload"]).get("responses", [])
+        updated += collection.update_one({**key, "archived": True},
+                                         {"$set": {"response_count": len(responses)}}).modified_count
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move completed interviews to the compressed archive")
+    parser.add_argument("--older-than-hours", type=float, default=24,
+                        help="Only archive interviews completed at least this long ago")
+    parser.add_argument("--limit", type=int, default=0, help="Maximum interviews to archive (0 = all)")
+    parser.add_argument("--backfill-counts", action="store_true",
+                        help="Also store response counts on interviews archived without them")
+    args = parser.parse_args()
+
+    count = archive_completed(timedelta(hours=args.older_than_hours), args.limit)
+    logger.info(f"Archived {count} interviews")
+    if args.backfill_counts:
+        logger.info(f"Stored response counts on {backfill_response_counts()} archived interviews")
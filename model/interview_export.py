@@ -0,0 +1,189 @@
+# Bulk export of interview history as NDJSON or Parquet.
+#
+# Interviews are read through a server-side cursor in EXPORT_BATCH_SIZE
+# batches, flattened to one row per interview (evaluation breakdown as
+# columns) and written out batch by batch, so memory stays bounded no matter
+# how large mock_interviews grows. The admin export endpoint streams the same
+# output over HTTP.
+#
+# Usage:
+#   python interview_export.py --format parquet --output interviews.parquet --start 2025-01-01
+import argparse
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import orjson
+from dotenv import load_dotenv
+
+from mongo_connect import collection
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+BREAKDOWN_CATEGORIES = ("technical skill", "problem solving", "communication", "knowledge")
+
+# Counts are computed server side so question and answer text never leaves MongoDB;
+# archived interviews keep only the counts in the hot document
+EXPORT_PROJECTION = {
+    "_id": 0, "user_id": 1, "session_id": 1, "timestamp": 1, "last_updated": 1, "completed": 1,
+    "evaluation": 1,
+    "question_count": {"$ifNull": ["$question_count", {"$size": {"$ifNull": ["$questions", []]}}]},
+    "response_count": {"$ifNull": ["$response_count", {"$size": {"$ifNull": ["$responses", []]}}]},
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+
+def build_query(user_id: Optional[str] = None, start: Optional[datetime] = None,
+                end: Optional[datetime] = None, completed_only: bool = True) -> Dict[str, Any]:
+    """Build the mock_interviews filter for an export."""
+    query: Dict[str, Any] = {"session_id": {"$exists": True}}
+    if user_id:
+        query["user_id"] = user_id
+    if completed_only:
+        query["completed"] = True
+    if start or end:
+        query["timestamp"] = {}
+        if start:
+            query["timestamp"]["$gte"] = start
+        if end:
+            query["timestamp"]["$lt"] = end
+    return query
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+
+def flatten(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn one interview document into a flat export row."""
+    evaluation = document.get("evaluation") or {}
+    breakdown = evaluation.get("breakdown") or {}
+    row = {
+        "user_id": document.get("user_id"),
+        "session_id": document.get("session_id"),
+        "timestamp": _as_datetime(document.get("timestamp")),
+        "last_updated": _as_datetime(document.get("last_updated")),
+        "completed": bool(document.get("completed")),
+        "score": evaluation.get("score"),
+        # Archived interviews keep only the counts in the hot document
+        "question_count": document.get("question_count", len(document.get("questions") or [])),
+        "response_count": document.get("response_count", len(document.get("responses") or [])),
+        "strengths": evaluation.get("strengths") or [],
+        "improvement_areas": evaluation.get("improvement_areas") or [],
+    }
+    for category in BREAKDOWN_CATEGORIES:
+        row["breakdown_" + category.replace(" ", "_")] = breakdown.get(category)
+    return row
+
+
+def iter_row_batches(query: Dict[str, Any], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of flattened rows, reading the collection one cursor batch at a time."""
+    cursor = collection.aggregate([{"$match": query}, {"$project": EXPORT_PROJECTION}], batchSize=batch_size)
+    try:
+        batch = []
+        for document in cursor:
+            batch.append(flatten(document))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def iter_ndjson(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """Encode row batches as newline-delimited JSON, one chunk per batch."""
+    for batch in batches:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller chunk by chunk."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """Encode row batches as one Parquet file, one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [("user_id", pa.string()), ("session_id", pa.string()),
+         ("timestamp", pa.timestamp("ms")), ("last_updated", pa.timestamp("ms")),
+         ("completed", pa.bool_()), ("score", pa.float64()),
+         ("question_count", pa.int32()), ("response_count", pa.int32()),
+         ("strengths", pa.list_(pa.string())), ("improvement_areas", pa.list_(pa.string()))]
+        + [("breakdown_" + category.replace(" ", "_"), pa.float64()) for category in BREAKDOWN_CATEGORIES]
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    # Closing the writer emits the footer
+    yield sink.drain()
+
+
+def export(query: Dict[str, Any], export_format: str = "ndjson",
+           batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """Stream the interviews matching query in the requested format."""
+    if export_format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    batches = iter_row_batches(query, batch_size)
+    return iter_parquet(batches) if export_format == "parquet" else iter_ndjson(batches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export interview history as NDJSON or Parquet")
+    parser.add_argument("--format", choices=sorted(MEDIA_TYPES), default="ndjson")
+    parser.add_argument("--output", required=True, help="File to write")
+    parser.add_argument("--user-id", help="Only export this user's interviews")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Interviews started on or after (ISO date)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Interviews started before (ISO date)")
+    parser.add_argument("--include-incomplete", action="store_true", help="Also export unfinished interviews")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    query = build_query(args.user_id, args.start, args.end, completed_only=not args.include_incomplete)
+    written = 0
+    with open(args.output, "wb") as f:
+        for chunk in export(query, args.format, args.batch_size):
+            f.write(chunk)
+            written += len(chunk)
+    logger.info(f"Wrote {written} bytes to {args.output}")
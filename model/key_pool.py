@@ -0,0 +1,255 @@
+# Pool of LLM API keys with per-key rate accounting.
+#
+# GOOGLE_API_KEYS lists several keys (from separate projects, so each has its
+# own quota). Every crew kickoff leases one key. A key is eligible when its
+# request and token windows allow the call, and the one with the most headroom
+# is chosen, so load spreads across the pool. A key that answers with a quota
+# error is put in cooldown for KEY_COOLDOWN_SECONDS, doubled on consecutive
+# quota errors. When no key is available the caller waits up to
+# KEY_ACQUIRE_TIMEOUT_SECONDS and then gets KeyPoolExhausted.
+#
+# Windows are kept per process. With API_WORKERS > 1 each worker is held to
+# 1/API_WORKERS of every key's quota, so the workers together stay within it
+# (an idle worker's share is not lent to busy ones).
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import Counter, Gauge, registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Comma-separated keys; GOOGLE_API_KEY alone still works
+GOOGLE_API_KEYS = [key.strip() for key in
+                   (os.getenv("GOOGLE_API_KEYS") or os.getenv("GOOGLE_API_KEY") or "").split(",") if key.strip()]
+# Per-key quota, as granted by the provider (0 disables the limit)
+KEY_REQUESTS_PER_MINUTE = float(os.getenv("KEY_REQUESTS_PER_MINUTE", "15"))
+KEY_TOKENS_PER_MINUTE = float(os.getenv("KEY_TOKENS_PER_MINUTE", "1000000"))
+# Every worker process keeps its own windows, so each gets an equal share of every key's quota
+API_WORKERS = max(int(os.getenv("API_WORKERS", "1")), 1)
+# First cooldown after a quota error; doubles on consecutive errors up to KEY_MAX_COOLDOWN_SECONDS
+KEY_COOLDOWN_SECONDS = float(os.getenv("KEY_COOLDOWN_SECONDS", "30"))
+KEY_MAX_COOLDOWN_SECONDS = float(os.getenv("KEY_MAX_COOLDOWN_SECONDS", "600"))
+# Longest a kickoff waits for a key before failing
+KEY_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("KEY_ACQUIRE_TIMEOUT_SECONDS", "30"))
+
+key_calls = registry.register(Counter(
+    "mockly_llm_key_calls_total", "LLM calls per API key", ("key", "outcome")))
+key_tokens = registry.register(Counter(
+    "mockly_llm_key_tokens_total", "Estimated LLM tokens charged per API key", ("key",)))
+key_cooling = registry.register(Gauge(
+    "mockly_llm_key_cooling_down", "1 while an API key is in quota cooldown", ("key",)))
+
+_QUOTA_ERROR = re.compile(r"\b429\b|resource.?exhausted|quota|rate.?limit", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry.{0,20}?(\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+class KeyPoolExhausted(RuntimeError):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_quota_error(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or bool(_QUOTA_ERROR.search(str(error)))
+
+
+class RateWindow:
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        """Usage over the last 60 seconds against a per-minute limit (0 = unlimited).
+
+        A sliding window rather than a refilling bucket: a bucket holding a
+        minute of allowance lets up to twice the limit through within one
+        minute, which providers counting per minute reject.
+        """
+        self.limit = per_minute
+        self.clock = clock
+        self.entries: Deque[Tuple[float, float]] = deque()
+        self.used = 0.0
+
+    def _expire(self, now: float) -> None:
+        while self.entries and now - self.entries[0][0] >= 60:
+            self.used -= self.entries.popleft()[1]
+
+    @property
+    def remaining(self) -> float:
+        self._expire(self.clock())
+        return self.limit - self.used
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount fits in the window (0 if it fits now)."""
+        if not self.limit:
+            return 0.0
+        now = self.clock()
+        self._expire(now)
+        # More than the whole limit waits for an empty window
+        excess = self.used + min(amount, self.limit) - self.limit
+        if excess <= 0:
+            return 0.0
+        for timestamp, used in self.entries:
+            excess -= used
+            if excess <= 0:
+                return max(timestamp + 60 - now, 0.0)
+        return 60.0
+
+    def take(self, amount: float) -> None:
+        """Record usage; may exceed the limit for usage known only afterwards."""
+        if self.limit:
+            self.entries.append((self.clock(), amount))
+            self.used += amount
+
+
+class ApiKey:
+    def __init__(self, label: str, secret: str, requests_per_minute: float, tokens_per_minute: float,
+                 clock: Callable[[], float] = time.monotonic):
+        """One credential with its request and token windows and cooldown state."""
+        self.label = label
+        self.secret = secret
+        self.requests = RateWindow(requests_per_minute, clock)
+        self.tokens = RateWindow(tokens_per_minute, clock)
+        self.cooldown_until = 0.0
+        self.quota_errors = 0
+        self.in_flight = 0
+
+
+class KeyPool:
+    def __init__(self, secrets: List[str], requests_per_minute: float = KEY_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = KEY_TOKENS_PER_MINUTE, cooldown: float = KEY_COOLDOWN_SECONDS,
+                 max_cooldown: float = KEY_MAX_COOLDOWN_SECONDS, acquire_timeout: float = KEY_ACQUIRE_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """Distribute LLM calls over several API keys
+
+        Args:
+            secrets: API keys; metrics and logs only ever show their position (key0, key1, ...)
+            requests_per_minute: Request quota of each key
+            tokens_per_minute: Token quota of each key
+            cooldown: First cooldown after a quota error, in seconds
+            max_cooldown: Upper bound for the doubled cooldown
+            acquire_timeout: Longest acquire() waits for a key
+            clock: Time source (monotonic seconds), replaceable for simulations
+        """
+        self.keys = [ApiKey(f"key{i}", secret, requests_per_minute, tokens_per_minute, clock)
+                     for i, secret in enumerate(secrets)]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.acquire_timeout = acquire_timeout
+        self.clock = clock
+        self._condition = threading.Condition()
+
+    def _wait_time(self, key: ApiKey, tokens: int, now: float) -> float:
+        return max(key.cooldown_until - now, key.requests.wait_time(1), key.tokens.wait_time(tokens))
+
+    def try_acquire(self, tokens: int = 1) -> Tuple[Optional[ApiKey], float]:
+        """Take a key if one can serve the call now.
+
+        Returns:
+            (key or None, seconds until the earliest key frees up)
+        """
+        with self._condition:
+            now = self.clock()
+            best, soonest = None, float("inf")
+            for key in self.keys:
+                wait = self._wait_time(key, tokens, now)
+                if wait > 0:
+                    soonest = min(soonest, wait)
+                    continue
+                # Most remaining request allowance first, then the least busy key
+                rank = (key.requests.remaining if key.requests.limit else float("inf"), -key.in_flight)
+                if best is None or rank > best[0]:
+                    best = (rank, key)
+            if best is None:
+                return None, soonest
+            key = best[1]
+            key.requests.take(1)
+            key.tokens.take(tokens)
+            key.in_flight += 1
+            key_tokens.inc(tokens, key=key.label)
+            return key, 0.0
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> ApiKey:
+        """Block until a key can serve a call of about tokens input tokens.
+
+        Raises:
+            KeyPoolExhausted: If no key frees up within the timeout
+        """
+        if not self.keys:
+            raise KeyPoolExhausted("No LLM API keys configured (set GOOGLE_API_KEYS)", retry_after=0)
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            key, wait = self.try_acquire(tokens)
+            if key is not None:
+                return key
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                key_calls.inc(key="none", outcome="exhausted")
+                raise KeyPoolExhausted(f"All {len(self.keys)} LLM API keys are rate limited", retry_after=wait)
+            with self._condition:
+                # Woken early when a key is released or recovers
+                self._condition.wait(min(wait, remaining))
+
+    def release(self, key: ApiKey, error: Optional[Exception] = None) -> None:
+        """Return a key after a call; a quota error puts it in cooldown."""
+        with self._condition:
+            key.in_flight -= 1
+            if error is not None and is_quota_error(error):
+                key.quota_errors += 1
+                delay = min(self.cooldown * 2 ** (key.quota_errors - 1), self.max_cooldown)
+                # Honour the provider's retry hint when it asks for longer
+                hint = _RETRY_DELAY.search(str(error))
+                if hint:
+                    delay = min(max(delay, float(hint.group(1))), self.max_cooldown)
+                key.cooldown_until = self.clock() + delay
+                key_cooling.set(1, key=key.label)
+                key_calls.inc(key=key.label, outcome="quota_error")
+                logger.warning(f"LLM API {key.label} hit its quota; cooling down for {delay:.0f}s")
+            else:
+                if error is None:
+                    key.quota_errors = 0
+                key_cooling.set(0, key=key.label)
+                key_calls.inc(key=key.label, outcome="error" if error else "ok")
+            self._condition.notify_all()
+
+    def charge(self, key: ApiKey, output_tokens: int) -> None:
+        """Charge tokens known only after the call (the output) to a key."""
+        with self._condition:
+            key.tokens.take(output_tokens)
+        key_tokens.inc(output_tokens, key=key.label)
+
+    @contextmanager
+    def lease(self, tokens: int = 1) -> Iterator[ApiKey]:
+        """Hold a key for one call; quota errors raised inside the block cool the key down."""
+        key = self.acquire(tokens)
+        try:
+            yield key
+        except Exception as e:
+            self.release(key, error=e)
+            raise
+        self.release(key)
+
+    def status(self) -> List[dict]:
+        """Per-key state for diagnostics (no secrets)."""
+        with self._condition:
+            now = self.clock()
+            return [{
+                "key": key.label,
+                "in_flight": key.in_flight,
+                "requests_available": round(key.requests.remaining, 1) if key.requests.limit else None,
+                "cooldown_seconds": round(max(key.cooldown_until - now, 0), 1),
+                "quota_errors": key.quota_errors,
+            } for key in self.keys]
+
+
+# Global pool used by agents for every crew kickoff, holding this worker's share of each key
+key_pool = KeyPool(GOOGLE_API_KEYS, requests_per_minute=KEY_REQUESTS_PER_MINUTE / API_WORKERS,
+                   tokens_per_minute=KEY_TOKENS_PER_MINUTE / API_WORKERS)
@@ -0,0 +1,171 @@
+# Record/replay of LLM crew calls for reproducible performance runs.
+#
+# In record mode every crew kickoff is appended to an NDJSON store (gzip if
+# the path ends in .gz) with its inputs, output and latency. In replay mode
+# outputs are served from the store, keyed by a hash of crew name + inputs,
+# after sleeping the recorded latency multiplied by LLM_REPLAY_TIME_SCALE.
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "off")  # off | record | replay
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", "llm_fixtures.ndjson.gz")
+LLM_REPLAY_TIME_SCALE = float(os.getenv("LLM_REPLAY_TIME_SCALE", "1.0"))
+# What to do when replay finds no recording for the exact inputs:
+# "crew" serves another recording of the same crew, "live" calls the model, "error" raises
+LLM_REPLAY_ON_MISS = os.getenv("LLM_REPLAY_ON_MISS", "crew")
+
+
+class ReplayMissError(LookupError):
+    pass
+
+
+# Per-interview identifiers in the score crew's metadata; they do not change the output
+_UNKEYED_METADATA = ("user_id", "session_id")
+
+
+def _keyed_inputs(crew: str, inputs: dict) -> dict:
+    """Inputs without the identifiers that would make every recording unique."""
+    data = inputs.get("interview_data")
+    if crew != "score" or not isinstance(data, str):
+        return inputs
+    try:
+        interview = json.loads(data)
+    except ValueError:
+        return inputs
+    metadata = interview.get("metadata") if isinstance(interview, dict) else None
+    if not isinstance(metadata, dict):
+        return inputs
+    metadata = {k: v for k, v in metadata.items() if k not in _UNKEYED_METADATA}
+    interview = {**interview, "metadata": metadata}
+    return {**inputs, "interview_data": json.dumps(interview, sort_keys=True, default=str)}
+
+
+def fixture_key(crew: str, inputs: dict) -> str:
+    """Stable key for a crew call: sha256 of the crew name and canonical JSON inputs."""
+    payload = json.dumps({"crew": crew, "inputs": _keyed_inputs(crew, inputs)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_records(path: str) -> List[Dict]:
+    """Read all recorded calls from an NDJSON fixture store."""
+    if not os.path.exists(path):
+        return []
+    with _open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LLMReplay:
+    def __init__(self, mode: str = LLM_REPLAY_MODE, path: str = LLM_REPLAY_PATH,
+                 time_scale: float = LLM_REPLAY_TIME_SCALE, on_miss: str = LLM_REPLAY_ON_MISS):
+        """Record/replay store for crew calls
+
+        Args:
+            mode: "off", "record" or "replay"
+            path: NDJSON fixture file (gzip compressed if it ends in .gz)
+            time_scale: Multiplier for recorded latencies in replay (0 = instant)
+            on_miss: Replay behaviour for unknown inputs: "crew", "live" or "error"
+        """
+        self.mode = mode
+        self.path = path
+        self.time_scale = time_scale
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[Dict]] = {}
+        self._by_crew: Dict[str, itertools.cycle] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            by_crew: Dict[str, List[Dict]] = {}
+            for record in load_records(self.path):
+                # Recompute rather than trust the stored key, so older recordings match too
+                self._by_key.setdefault(fixture_key(record["crew"], record["inputs"]), []).append(record)
+                by_crew.setdefault(record["crew"], []).append(record)
+            self._by_crew = {crew: itertools.cycle(records) for crew, records in by_crew.items()}
+            self._loaded = True
+            logger.info(f"Loaded {sum(len(r) for r in self._by_key.values())} LLM recordings from {self.path}")
+
+    def lookup(self, crew: str, inputs: dict) -> Optional[str]:
+        """Serve a recorded output, sleeping its scaled latency.
+
+        Returns:
+            The recorded output, or None if the call should go to the live model
+
+        Raises:
+            ReplayMissError: No recording matches and on_miss is "error"
+        """
+        self._load()
+        records = self._by_key.get(fixture_key(crew, inputs))
+        with self._lock:
+            if records:
+                # Rotate so repeated calls with the same inputs cycle through recordings
+                record = records.pop(0)
+                records.append(record)
+            elif self.on_miss == "crew" and crew in self._by_crew:
+                record = next(self._by_crew[crew])
+            elif self.on_miss == "live":
+                return None
+            else:
+                raise ReplayMissError(f"No recorded {crew} crew call for these inputs")
+
+        if self.time_scale > 0:
+            time.sleep(record["latency"] * self.time_scale)
+        return record["output"]
+
+    def record(self, crew: str, inputs: dict, output: str, latency: float) -> None:
+        """Append a live crew call to the fixture store."""
+        record = {
+            "key": fixture_key(crew, inputs),
+            "crew": crew,
+            "inputs": inputs,
+            "output": output,
+            "latency": round(latency, 4),
+            "recorded_at": datetime.utcnow().isoformat()
+        }
+        line = json.dumps(record, default=str) + "\n"
+        try:
+            with self._lock, _open(self.path, "a") as f:
+                f.write(line)
+        except OSError as e:
+            logger.error(f"Failed to record LLM call: {str(e)}")
+
+
+# Global instance used by crew_runner
+llm_replay = LLMReplay()
+
+
+if __name__ == "__main__":
+    from benchmarks.stats import summarize
+
+    parser = argparse.ArgumentParser(description="Summarise a recorded LLM fixture store")
+    parser.add_argument("path", nargs="?", default=LLM_REPLAY_PATH)
+    args = parser.parse_args()
+
+    latencies: Dict[str, List[float]] = {}
+    for record in load_records(args.path):
+        latencies.setdefault(record["crew"], []).append(record["latency"])
+    print(json.dumps({crew: summarize(samples) for crew, samples in latencies.items()}, indent=2))
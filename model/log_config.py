@@ -0,0 +1,210 @@
+# Logging pipeline: queue-based handler, JSON output, per-route sampling and redaction.
+#
+# Request threads only filter a record and put it on a bounded queue; a
+# QueueListener thread redacts, formats and writes it. Records below WARNING
+# can be sampled per route (a whole request is kept or dropped, decided from
+# its request id) and routes can raise their minimum level. Candidate answers,
+# transcripts and resume text are redacted from messages and long messages are
+# truncated, so logs neither leak interview content nor cost hot-path I/O.
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from dotenv import load_dotenv
+
+from metrics import Counter, registry
+from request_context import get_request_context
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json for log shippers, text for local development
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the writer thread; beyond this they are dropped rather than blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Longer messages are truncated
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+# Fraction of requests whose sub-WARNING records are kept, per route template (e.g. "/healthz=0,/user_stats/{user_id}=0.1")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "/healthz=0,/readyz=0,/metrics=0")
+# Minimum level per route template (e.g. "/question/{user_id}/{session_id}=WARNING")
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "")
+
+log_records_dropped = registry.register(Counter(
+    "mockly_log_records_dropped_total", "Log records not written", ("reason",)))
+
+# Dict/JSON keys whose values are candidate content
+REDACTED_KEYS = ("answer", "partialAnswer", "text", "response", "responses", "resume", "resume_text", "transcript")
+_REDACT_PATTERN = re.compile(
+    r"""(?P<key>['"](?:%s)['"]\s*:\s*)(?P<quote>['"])(?P<value>(?:\\.|(?!(?P=quote)).)*)(?P=quote)"""
+    % "|".join(REDACTED_KEYS),
+    re.DOTALL
+)
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    mapping = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, _, setting = item.rpartition("=")
+            mapping[key.strip()] = setting.strip()
+    return mapping
+
+
+def _parse_levels(value: str) -> Tuple[Dict[str, int], List[str]]:
+    """Route -> numeric level; returns the entries with unknown levels separately."""
+    levels, invalid = {}, []
+    for route, name in _parse_mapping(value).items():
+        level = int(name) if name.isdigit() else logging.getLevelName(name.upper())
+        if isinstance(level, int):
+            levels[route] = level
+        else:
+            invalid.append(f"{route}={name}")
+    return levels, invalid
+
+
+def redact(message: str, max_chars: int = LOG_MAX_MESSAGE_CHARS) -> str:
+    """Replace candidate content in a message with its length and cap the message size."""
+    message = _REDACT_PATTERN.sub(
+        lambda match: f'{match.group("key")}"[redacted {len(match.group("value"))} chars]"', message
+    )
+    if len(message) > max_chars:
+        message = f"{message[:max_chars]}... [truncated {len(message) - max_chars} chars]"
+    return message
+
+
+class RouteFilter(logging.Filter):
+    def __init__(self, sample_rates: Dict[str, float], route_levels: Dict[str, int]):
+        """Per-route minimum levels and request sampling, applied before a record is queued."""
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.route_levels = route_levels
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = get_request_context()
+        route = context.get("route")
+        if not route:
+            return True
+        if record.levelno < self.route_levels.get(route, logging.NOTSET):
+            log_records_dropped.inc(reason="route_level")
+            return False
+        rate = self.sample_rates.get(route)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        # Same decision for every record of a request, so sampled requests stay complete
+        request_id = context.get("request_id") or ""
+        if (zlib.crc32(request_id.encode()) % 10000) / 10000 < rate:
+            return True
+        log_records_dropped.inc(reason="sampled")
+        return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the writer falls behind instead of raising."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Keep the request context of the emitting thread; the writer thread has none
+        context = get_request_context()
+        record.request_id = context.get("request_id")
+        record.user_id = context.get("user_id")
+        record.session_id = context.get("session_id")
+        record.route = context.get("route")
+        # Merge the message arguments here so the writer never touches live objects
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(reason="queue_full")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request context and redacted message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        for field in ("request_id", "user_id", "session_id", "route"):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text, LOG_MAX_MESSAGE_CHARS * 4)
+        return orjson.dumps(entry).decode()
+
+
+class RedactingFormatter(logging.Formatter):
+    """Plain text formatter with the same redaction as the JSON output."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record), LOG_MAX_MESSAGE_CHARS * 4)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all logging through the background writer (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(RedactingFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    route_levels, invalid_levels = _parse_levels(LOG_ROUTE_LEVELS)
+    queue_handler.addFilter(RouteFilter(
+        {route: float(rate) for route, rate in _parse_mapping(LOG_SAMPLE_RATES).items()},
+        route_levels
+    ))
+
+    root = logging.getLogger()
+    # Replace handlers installed by basicConfig in imported modules
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    # uvicorn's default log config (applied before the app is imported by `uvicorn main:app`)
+    # gives its loggers synchronous handlers; send their records through the queue instead
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    if invalid_levels:
+        logger.warning(f"Ignoring LOG_ROUTE_LEVELS entries with unknown levels: {', '.join(invalid_levels)}")
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,29 +1,59 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import asyncio
 import logging
+import os
 import uvicorn
 from dotenv import load_dotenv
 
 # Import route modules
-from routes.resume_routes import router as resume_router
+from routes.resume_routes import cancel_question_generations, router as resume_router
 from routes.interview_routes import router as interview_router
 from routes.analytics_routes import router as analytics_router
 from routes.health_routes import router as health_router
+from routes.transcription_routes import router as transcription_router, transcriber
+from routes.metrics_routes import router as metrics_router
+from routes.admin_routes import router as admin_router
 
-# Import MongoDB connection
-from mongo_connect import client, db, collection
-
-# Import shared state
-from shared_state import user_sessions
+from compression import CompressionMiddleware
+from log_config import configure_logging, shutdown_logging
+from metrics import MetricsMiddleware, TimedORJSONResponse, bind_path_params
+from profiling import request_profiling
+from shared_state import session_touches
+from startup import replay_session_log, warm_up
+from usage import usage_tracker
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server binds and answers /healthz immediately
+    warm_up_task = asyncio.create_task(warm_up(transcriber))
+    replay_task = asyncio.create_task(replay_session_log())
+    session_touches.start()
+    usage_tracker.writes.start()
+    yield
+    warm_up_task.cancel()
+    replay_task.cancel()
+    # Sessions still waiting for questions are marked failed so clients stop polling and can retry
+    await cancel_question_generations()
+    # Write buffered session touches and usage counts before the process exits
+    await asyncio.to_thread(session_touches.stop)
+    await asyncio.to_thread(usage_tracker.writes.stop)
+    await transcriber.stop()
+    # Last, so records logged during teardown are still written
+    shutdown_logging()
+
 app = FastAPI(title="AI Interview System",
-              description="API for conducting mock interviews with AI feedback")
+              description="API for conducting mock interviews with AI feedback",
+              lifespan=lifespan,
+              default_response_class=TimedORJSONResponse,
+              dependencies=[Depends(bind_path_params), Depends(request_profiling)])
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,17 +62,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Include routers with proper prefixes
 app.include_router(health_router, tags=["Health"])
+app.include_router(metrics_router, tags=["Health"])
 app.include_router(resume_router, tags=["Resume"])
 app.include_router(interview_router, tags=["Interview"])
 app.include_router(analytics_router, tags=["Analytics"])
+app.include_router(transcription_router, tags=["Transcription"])
+app.include_router(admin_router, tags=["Admin"])
 
-# Run the application
+# Run the application. API_WORKERS > 1 runs uvicorn's process manager with one
+# event loop per worker; all shared state then lives in MongoDB.
 if __name__ == "__main__":
     try:
-        logger.info("Starting AI Interview System API")
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+        workers = int(os.getenv("API_WORKERS", "1"))
+        logger.info(f"Starting AI Interview System API with {workers} worker(s)")
+        uvicorn.run(
+            "main:app" if workers > 1 else app,
+            host=os.getenv("API_HOST", "0.0.0.0"),
+            port=int(os.getenv("API_PORT", "8000")),
+            workers=workers,
+            # Keep uvicorn's access and error logs on the queued JSON pipeline from log_config
+            log_config=None
+        )
     except Exception as e:
         logger.error(f"Failed to start server: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,254 @@
+# Metrics and tracing: Prometheus-style counters/histograms rendered on /metrics,
+# and OpenTelemetry spans for each pipeline stage tied to the request context
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+from starlette.requests import HTTPConnection
+from fastapi.responses import ORJSONResponse
+
+from request_context import bind_request_context, get_request_context, new_request_context
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("mockly")
+except ImportError:  # Tracing is optional; metrics work without it
+    trace = None
+    tracer = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_label(value) -> str:
+    # Text exposition format: backslash, double quote and newline must be escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """Monotonic counter with optional labels."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """Value that can go up and down, with optional labels."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Cumulative histogram with optional labels."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames + ("le",), key + (str(bound),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_duration = registry.register(Histogram(
+    "mockly_stage_duration_seconds", "Duration of pipeline stages", ("stage",)))
+request_duration = registry.register(Histogram(
+    "mockly_http_request_duration_seconds", "HTTP request duration", ("method", "route", "status")))
+mongo_duration = registry.register(Histogram(
+    "mockly_mongo_command_duration_seconds", "MongoDB command duration", ("command", "outcome")))
+llm_calls = registry.register(Counter(
+    "mockly_llm_calls_total", "LLM crew kickoffs", ("crew", "outcome")))
+llm_tokens = registry.register(Counter(
+    "mockly_llm_tokens_total", "Estimated LLM tokens", ("crew", "direction")))
+fallbacks = registry.register(Counter(
+    "mockly_fallbacks_total", "Degraded code paths taken", ("reason",)))
+
+
+@contextmanager
+def timed(stage: str, **attributes):
+    """Time a pipeline stage into stage_duration and wrap it in a tracing span."""
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            stage_duration.observe(time.perf_counter() - start, stage=stage)
+        return
+
+    with tracer.start_as_current_span(stage) as span:
+        for key, value in {**_context_attributes(), **attributes}.items():
+            span.set_attribute(key, value)
+        try:
+            yield
+        finally:
+            stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+def _context_attributes() -> Dict[str, str]:
+    context = get_request_context()
+    return {f"mockly.{key}": value for key, value in context.items() if value is not None}
+
+
+def annotate_span(**attributes) -> None:
+    """Add attributes to the active span, if tracing is enabled."""
+    if trace is None:
+        return
+    span = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(f"mockly.{key}", value)
+
+
+async def bind_path_params(request: HTTPConnection) -> None:
+    """App-wide dependency tying the request span to the user_id/session_id path params."""
+    user_id = request.path_params.get("user_id")
+    session_id = request.path_params.get("session_id")
+    route = getattr(request.scope.get("route"), "path", None)
+    bind_request_context(user_id=user_id, session_id=session_id, route=route)
+    annotate_span(user_id=user_id, session_id=session_id)
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """Records the duration of every MongoDB command."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_duration.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        mongo_duration.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """orjson-backed JSON response that records serialization as a pipeline stage."""
+
+    def render(self, content) -> bytes:
+        with timed("serialization"):
+            return super().render(content)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        """ASGI middleware recording request latency and opening the request span."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode() or None
+        context = new_request_context(request_id)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", context["request_id"].encode())
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            if tracer is None:
+                await self.app(scope, receive, send_wrapper)
+            else:
+                with tracer.start_as_current_span(f"{scope['method']} {scope['path']}") as span:
+                    span.set_attribute("mockly.request_id", context["request_id"])
+                    await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by route template rather than raw path to keep cardinality bounded
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            request_duration.observe(time.perf_counter() - start, method=scope["method"],
+                                     route=route_label, status=str(status["code"]))
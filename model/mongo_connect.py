@@ -3,21 +3,55 @@ from pymongo import MongoClient, errors as mongo_errors
 import logging
 import os
 
+from metrics import MongoMetricsListener
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI") or "mongodb://127.0.0.1:27017"
+
 try:
-    MONGO_URI ="mongodb://127.0.0.1:27017" or os.getenv("MONGO_URI") 
-    if not MONGO_URI:
-        raise ValueError("MONGO_URI environment variable not set")
-        
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    # MongoClient connects in the background; nothing here waits for the server,
+    # so importing this module does not block startup. Use check_connection().
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000,
+                         event_listeners=[MongoMetricsListener()])
     db = client.ai_interview
     collection = db.mock_interviews
-    
-    # Test the connection
-    client.server_info()
-except (mongo_errors.ServerSelectionTimeoutError, ValueError) as e:
-    logger.error(f"Failed to connect to MongoDB: {str(e)}")
-    raise RuntimeError("Database connection failed") from e
\ No newline at end of file
+except (mongo_errors.ConfigurationError, ValueError) as e:
+    logger.error(f"Invalid MongoDB configuration: {str(e)}")
+    raise RuntimeError("Database configuration failed") from e
+
+
+def check_connection() -> bool:
+    """Ping MongoDB; returns False instead of raising when it is unreachable."""
+    try:
+        client.admin.command("ping")
+        return True
+    except mongo_errors.PyMongoError as e:
+        logger.error(f"Failed to connect to MongoDB: {str(e)}")
+        return False
+
+
+def ensure_indexes() -> None:
+    """Create the indexes the application relies on (no-op if they already exist)."""
+    # Expire old sessions automatically
+    db["sessions"].create_index("expiry", expireAfterSeconds=0, name="expiry_ttl")
+    db["sessions"].create_index([("user_id", 1), ("session_id", 1)], name="user_session")
+    # Every interview lookup is by user, most by (user, session) or sorted by time
+    collection.create_index([("user_id", 1), ("session_id", 1)], name="user_session")
+    collection.create_index([("user_id", 1), ("timestamp", -1)], name="user_timestamp")
+    # Archived interview text is fetched by (user, session)
+    db["mock_interviews_archive"].create_index([("user_id", 1), ("session_id", 1)], unique=True,
+                                               name="user_session")
+    # Stored idempotent responses expire after IDEMPOTENCY_TTL_SECONDS
+    db["idempotency_keys"].create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+    # One LLM usage document per user and UTC day, upserted by concurrent workers
+    db["llm_usage"].create_index([("user_id", 1), ("day", -1)], unique=True, name="user_day")
+    # Request profiles are listed newest first, fetched by request id and expire on their own
+    db["profiles"].create_index([("request_id", 1), ("started_at", -1)], name="request_started")
+    db["profiles"].create_index([("name", 1), ("started_at", -1)], name="name_started")
+    db["profiles"].create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
+    db["question_bank"].create_index([("skill", 1), ("seniority", 1)], unique=True, name="skill_seniority")
@@ -0,0 +1,317 @@
+# On-demand sampling profiler for production requests.
+#
+# Handlers decorated with @profiled(name) can be profiled per request: either
+# an admin sends X-Profile: 1 with a valid X-Admin-Token, or an admin arms the
+# endpoint for its next N calls (POST /admin/profiles/arm;
+# arms live in MongoDB so every worker honours them). While a profile is
+# active, a sampler thread records the stacks of the threads working on that
+# request every PROFILE_INTERVAL_SECONDS; the result is stored as collapsed
+# stacks (one "frame;frame;frame count" line per unique stack, ready for
+# flamegraph.pl or speedscope) under the request id. When nothing is being
+# profiled there is no sampler thread and a decorated call only does a dict
+# lookup and a memoised version check.
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import brotli
+from bson import Binary
+from dotenv import load_dotenv
+from starlette.requests import HTTPConnection
+
+from admin_auth import is_admin_token
+from cache_invalidation import cache_versions
+from metrics import Counter, registry
+from mongo_connect import db
+from request_context import get_request_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Time between stack samples (5 ms = 200 Hz)
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+# Sampling of a single request stops after this long
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+# Requests profiled at once per worker; further requests run unprofiled
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "4"))
+# Stored profiles expire after this many hours
+PROFILE_RETENTION_HOURS = float(os.getenv("PROFILE_RETENTION_HOURS", "72"))
+
+profiles_collection = db["profiles"]
+arms_collection = db["profiling_arms"]
+ARMS_NAMESPACE = "profiling_arms"
+
+profiles_recorded = registry.register(Counter(
+    "mockly_profiles_total", "Request profiles started, stored or skipped", ("name", "outcome")))
+
+
+def _frame_label(code) -> str:
+    # Keep the package-relative tail of the path so labels stay short but unambiguous
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    def __init__(self, name: str, request_id: str, user_id: Optional[str], trigger: str):
+        """Samples collected for one profiled request."""
+        self.name = name
+        self.request_id = request_id
+        self.user_id = user_id
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.threads: Set[int] = set()
+        self.stacks: StackCounter = StackCounter()
+        self.samples = 0
+        self.truncated = False
+        self.finished = False
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS, max_seconds: float = PROFILE_MAX_SECONDS,
+                 max_active: int = PROFILE_MAX_ACTIVE, retention_hours: float = PROFILE_RETENTION_HOURS):
+        """Profile selected requests by sampling the stacks of their threads
+
+        Args:
+            interval: Seconds between samples
+            max_seconds: Longest a single request is sampled
+            max_active: Requests profiled at once in this process
+            retention_hours: Lifetime of stored profiles
+        """
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_active = max_active
+        self.retention_hours = retention_hours
+        # Names of decorated handlers, i.e. what can be armed
+        self.endpoints: Set[str] = set()
+        self._active: List[ProfileSession] = []
+        self._finished: List[ProfileSession] = []
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        # name -> expiry of the arms last read from MongoDB, and the version they were read at
+        self._arms: Dict[str, datetime] = {}
+        self._arms_version = -1
+
+    def _armed(self, name: str) -> bool:
+        """Consume one armed call of name, if any (shared by all workers)."""
+        version = cache_versions.current(ARMS_NAMESPACE)
+        if version != self._arms_version:
+            try:
+                self._arms = {arm["_id"]: arm["expires_at"]
+                              for arm in arms_collection.find({"remaining": {"$gt": 0}}, {"expires_at": 1})}
+            except Exception as e:
+                logger.error(f"Failed to read profiling arms: {str(e)}")
+                self._arms = {}
+            self._arms_version = version
+        expires_at = self._arms.get(name)
+        if expires_at is None or expires_at <= datetime.utcnow():
+            return False
+
+        try:
+            arm = arms_collection.find_one_and_update(
+                {"_id": name, "remaining": {"$gt": 0}, "expires_at": {"$gt": datetime.utcnow()}},
+                {"$inc": {"remaining": -1}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to consume profiling arm for {name}: {str(e)}")
+            return False
+        if arm is None or arm["remaining"] <= 1:
+            # Used up (here or by another worker): let every worker drop it from its copy
+            self._arms.pop(name, None)
+            cache_versions.bump(ARMS_NAMESPACE)
+        return arm is not None
+
+    def arm(self, name: str, count: int, ttl_minutes: float) -> Dict[str, Any]:
+        """Profile the next count calls of name in any worker, within ttl_minutes (count 0 disarms)."""
+        expires_at = datetime.utcnow() + timedelta(minutes=ttl_minutes)
+        arms_collection.update_one({"_id": name}, {"$set": {"remaining": count, "expires_at": expires_at}},
+                                   upsert=True)
+        cache_versions.bump(ARMS_NAMESPACE)
+        logger.info(f"Armed profiling of {name} for {count} calls until {expires_at:%Y-%m-%d %H:%M:%S}")
+        return {"name": name, "remaining": count, "expires_at": expires_at}
+
+    def _begin(self, name: str, context: Dict[str, Any]) -> Optional[ProfileSession]:
+        if context.get("profile_requested"):
+            trigger = "header"
+        elif self._armed(name):
+            trigger = "armed"
+        else:
+            return None
+
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                profiles_recorded.inc(name=name, outcome="skipped")
+                logger.warning(f"Not profiling {name}: {self.max_active} profiles already running")
+                return None
+            session = ProfileSession(name, context["request_id"], context.get("user_id"), trigger)
+            self._active.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        context["profile"] = session
+        profiles_recorded.inc(name=name, outcome="started")
+        return session
+
+    def _end(self, session: ProfileSession) -> None:
+        session.duration = time.perf_counter() - session.started
+        with self._lock:
+            session.finished = True
+            self._active.remove(session)
+            self._finished.append(session)
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        """Sample the current thread while the block runs, if this request is profiled.
+
+        The request's profile is started by the first decorated call that sees
+        it requested; nested calls (e.g. crew kickoffs) add their thread to
+        the same profile.
+        """
+        context = get_request_context()
+        session = context.get("profile")
+        owner = False
+        if session is None and context:
+            session = self._begin(name, context)
+            owner = session is not None
+        if session is None or session.finished:
+            yield
+            return
+
+        ident = threading.get_ident()
+        with self._lock:
+            joined = ident not in session.threads
+            session.threads.add(ident)
+        try:
+            yield
+        finally:
+            if joined:
+                with self._lock:
+                    session.threads.discard(ident)
+            if owner:
+                context.pop("profile", None)
+                self._end(session)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = _frame_label(code)
+        return label
+
+    def _sample(self) -> None:
+        with self._lock:
+            # Snapshot under the lock so no thread joins or leaves between snapshot and walk
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for session in self._active:
+                if session.truncated:
+                    continue
+                if now - session.started > self.max_seconds:
+                    session.truncated = True
+                    continue
+                for ident in session.threads:
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        session.stacks[";".join(reversed(stack))] += 1
+                session.samples += 1
+
+    def _run(self) -> None:
+        while True:
+            self._sample()
+            with self._lock:
+                finished, self._finished = self._finished, []
+                if not self._active and not finished:
+                    # Nothing left to profile; the next profiled request starts a new thread
+                    self._thread = None
+                    return
+            for session in finished:
+                self._save(session)
+            time.sleep(self.interval)
+
+    def _save(self, session: ProfileSession) -> None:
+        collapsed = session.collapsed()
+        try:
+            profiles_collection.insert_one({
+                "request_id": session.request_id,
+                "name": session.name,
+                "user_id": session.user_id,
+                "trigger": session.trigger,
+                "started_at": session.started_at,
+                "duration_seconds": round(session.duration, 3),
+                "interval_seconds": self.interval,
+                "samples": session.samples,
+                "unique_stacks": len(session.stacks),
+                "truncated": session.truncated,
+                "codec": "brotli",
+                "stacks": Binary(brotli.compress(collapsed.encode(), mode=brotli.MODE_TEXT)),
+                "expires_at": datetime.utcnow() + timedelta(hours=self.retention_hours),
+            })
+            profiles_recorded.inc(name=session.name, outcome="stored")
+            logger.info(f"Stored profile of {session.name} ({session.samples} samples, "
+                        f"{session.duration:.2f}s)")
+        except Exception as e:
+            profiles_recorded.inc(name=session.name, outcome="failed")
+            logger.error(f"Failed to store profile of {session.name}: {str(e)}")
+
+
+def list_profiles(name: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Stored profiles, most recent first, without their stacks."""
+    query = {"name": name} if name else {}
+    return list(profiles_collection.find(query, {"_id": 0, "stacks": 0, "codec": 0})
+                .sort("started_at", -1).limit(limit))
+
+
+def load_collapsed_stacks(request_id: str) -> Optional[str]:
+    """Collapsed stacks of the latest profile of request_id, or None if there is none."""
+    document = profiles_collection.find_one({"request_id": request_id}, {"stacks": 1},
+                                            sort=[("started_at", -1)])
+    if document is None:
+        return None
+    return brotli.decompress(document["stacks"]).decode()
+
+
+async def request_profiling(request: HTTPConnection) -> None:
+    """App-wide dependency marking requests sent with X-Profile (admins only) for profiling."""
+    if request.headers.get("x-profile", "").lower() in ("1", "true"):
+        if is_admin_token(request.headers.get("x-admin-token")):
+            get_request_context()["profile_requested"] = True
+        else:
+            logger.warning("Ignored X-Profile header without a valid admin token")
+
+
+# Global profiler shared by all decorated handlers
+profiler = SamplingProfiler()
+
+
+def profiled(name: str):
+    """Decorate a synchronous handler (or the threadpool half of an async one) so requests
+    selected for profiling are sampled while it runs.
+
+    The arm check may read MongoDB, so this is kept off the event loop.
+    """
+    profiler.endpoints.add(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,270 @@
+# Precomputed question bank: questions generated offline per skill and seniority,
+# served from an in-memory inverted index so most uploads skip the LLM entirely
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from cache_invalidation import cache_versions
+from mongo_connect import db, ensure_indexes
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+QUESTIONS_PER_INTERVIEW = 5
+# Only the most prominent skills of a resume are used to pick questions
+TOP_SKILLS = int(os.getenv("QUESTION_BANK_TOP_SKILLS", "5"))
+
+SENIORITY_LEVELS = ["junior", "mid", "senior"]
+
+bank_collection = db["question_bank"]
+
+# Canonical skill name -> aliases as they appear in resumes
+SKILL_TAXONOMY = {
+    "python": ["python", "python3"],
+    "java": ["java"],
+    "javascript": ["javascript", "es6"],
+    "typescript": ["typescript"],
+    "c++": ["c++", "cpp"],
+    "c#": ["c#", "csharp", ".net", "dotnet"],
+    "go": ["golang"],
+    "rust": ["rust"],
+    "sql": ["sql", "mysql", "postgresql", "postgres", "sqlite"],
+    "mongodb": ["mongodb", "mongo", "mongoose"],
+    "redis": ["redis"],
+    "react": ["react", "reactjs", "react.js"],
+    "next.js": ["next.js", "nextjs"],
+    "angular": ["angular"],
+    "vue": ["vue", "vuejs", "vue.js"],
+    "node.js": ["node.js", "nodejs", "node", "express", "express.js"],
+    "django": ["django"],
+    "flask": ["flask"],
+    "fastapi": ["fastapi"],
+    "spring": ["spring boot", "springboot", "spring framework"],
+    "html/css": ["html", "css", "tailwind", "sass"],
+    "rest apis": ["restful", "rest api", "rest apis"],
+    "graphql": ["graphql"],
+    "docker": ["docker", "containers"],
+    "kubernetes": ["kubernetes", "k8s"],
+    "aws": ["aws", "amazon web services", "ec2", "s3", "lambda"],
+    "gcp": ["gcp", "google cloud"],
+    "azure": ["azure"],
+    "ci/cd": ["ci/cd", "jenkins", "github actions", "gitlab ci"],
+    "git": ["git", "github", "gitlab"],
+    "linux": ["linux", "bash", "shell scripting"],
+    "machine learning": ["machine learning", "ml", "scikit-learn", "sklearn"],
+    "deep learning": ["deep learning", "tensorflow", "pytorch", "keras", "neural networks"],
+    "nlp": ["nlp", "natural language processing", "llm", "llms", "transformers"],
+    "data analysis": ["pandas", "numpy", "data analysis", "matplotlib", "power bi", "tableau"],
+    "data structures": ["data structures", "algorithms", "dsa"],
+    "system design": ["system design", "microservices", "distributed systems", "scalability"],
+    "android": ["android", "kotlin"],
+    "ios": ["ios", "swift"],
+    "flutter": ["flutter", "dart"],
+}
+
+_ALIAS_PATTERNS = [
+    (skill, re.compile(r"(?<![\w.+#])" + re.escape(alias) + r"(?![\w+#])", re.IGNORECASE))
+    for skill, aliases in SKILL_TAXONOMY.items()
+    for alias in aliases
+]
+
+
+def extract_skills(text: str) -> List[str]:
+    """Extract canonical skills from resume text, most frequently mentioned first."""
+    counts: Dict[str, int] = {}
+    for skill, pattern in _ALIAS_PATTERNS:
+        hits = len(pattern.findall(text))
+        if hits:
+            counts[skill] = counts.get(skill, 0) + hits
+    return [skill for skill, _ in sorted(counts.items(), key=lambda item: item[1], reverse=True)]
+
+
+def detect_seniority(text: str) -> str:
+    """Estimate candidate seniority from titles and stated years of experience."""
+    lowered = text.lower()
+    years = [int(y) for y in re.findall(r"(\d{1,2})\+?\s*(?:years|yrs)", lowered)]
+    max_years = max(years) if years else 0
+    if max_years >= 6 or re.search(r"\b(senior|lead|principal|staff|architect)\b", lowered):
+        return "senior"
+    if max_years >= 2:
+        return "mid"
+    if re.search(r"\b(intern|internship|student|graduate|fresher|b\.?tech|bsc)\b", lowered):
+        return "junior"
+    return "mid"
+
+
+def parse_question_texts(result: str) -> List[str]:
+    """Parse the question crew output (a JSON list) into question texts."""
+    result = str(result).strip()
+    if result.startswith("```json"):
+        result = result[7:]
+    if result.endswith("```"):
+        result = result[:-3]
+
+    questions_data = json.loads(result.strip())
+    if not isinstance(questions_data, list):
+        raise ValueError("Unexpected AI response format - expected list")
+
+    texts = []
+    for q in questions_data:
+        text = q.get("question") if isinstance(q, dict) else q
+        texts.append(text or "No question generated")
+    return texts
+
+
+class QuestionBank:
+    def __init__(self, collection=None):
+        """Initialize the question bank
+
+        Args:
+            collection: MongoDB collection holding the precomputed questions
+        """
+        self.collection = collection
+        self.index: Dict[Tuple[str, str], List[str]] = {}
+        self.loaded = False
+        self.version = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Build the inverted index (skill, seniority) -> questions from MongoDB."""
+        version = cache_versions.current("question_bank")
+        index: Dict[Tuple[str, str], List[str]] = {}
+        try:
+            for entry in self.collection.find({}, {"_id": 0, "skill": 1, "seniority": 1, "questions": 1}):
+                index[(entry["skill"], entry["seniority"])] = list(entry.get("questions", []))
+        except Exception as e:
+            logger.error(f"Failed to load question bank: {str(e)}")
+        with self._lock:
+            self.index = index
+            self.loaded = True
+            self.version = version
+        logger.info(f"Loaded question bank with {len(index)} skill/seniority entries")
+
+    def lookup(self, skill: str, seniority: str) -> List[str]:
+        """Return bank questions for a skill, falling back to other seniority levels."""
+        if not self.loaded:
+            self.load()
+        questions = self.index.get((skill, seniority))
+        if questions:
+            return questions
+        for level in ["mid"] + SENIORITY_LEVELS:
+            questions = self.index.get((skill, level))
+            if questions:
+                return questions
+        return []
+
+    def select_questions(self, resume_text: str,
+                         count: int = QUESTIONS_PER_INTERVIEW) -> Tuple[List[str], List[str]]:
+        """Assemble interview questions for a resume from the bank.
+
+        Question slots are assigned round-robin across the resume's top skills.
+        Slots belonging to skills the bank cannot cover are left for the LLM.
+
+        Args:
+            resume_text: Resume text to extract skills from
+            count: Number of questions in the interview
+
+        Returns:
+            Tuple of (bank question texts, uncovered skills). The caller has to
+            generate count - len(questions) questions for the uncovered skills.
+        """
+        skills = extract_skills(resume_text)[:TOP_SKILLS]
+        if not skills:
+            return [], []
+
+        # Pick up bank rebuilds made by other processes
+        if not self.loaded or cache_versions.current("question_bank") != self.version:
+            self.load()
+
+        seniority = detect_seniority(resume_text)
+        pools = {}
+        for skill in skills:
+            questions = self.lookup(skill, seniority)
+            pools[skill] = random.sample(questions, len(questions))
+
+        selected: List[str] = []
+        uncovered: List[str] = []
+        for slot in range(count):
+            skill = skills[slot % len(skills)]
+            if pools[skill]:
+                selected.append(pools[skill].pop())
+            elif skill not in uncovered:
+                uncovered.append(skill)
+        return selected, uncovered
+
+
+# Global instance used by the resume routes
+question_bank = QuestionBank(collection=bank_collection)
+
+
+def build_bank(skills: Optional[List[str]] = None, seniorities: Optional[List[str]] = None,
+               rounds: int = 2, overwrite: bool = False) -> int:
+    """Generate bank questions offline with the question crew.
+
+    Args:
+        skills: Canonical skills to generate for (default: whole taxonomy)
+        seniorities: Seniority levels to generate for (default: all)
+        rounds: Number of crew runs per entry (each yields about 5 questions)
+        overwrite: Regenerate entries that already exist
+
+    Returns:
+        Number of entries written
+    """
+    from crew_runner import run_crew
+
+    ensure_indexes()
+
+    written = 0
+    for skill in skills or list(SKILL_TAXONOMY):
+        for seniority in seniorities or SENIORITY_LEVELS:
+            if not overwrite and bank_collection.count_documents({"skill": skill, "seniority": seniority}):
+                continue
+
+            profile = f"{seniority.capitalize()} software engineer. SKILLS: {skill}. Experience focused on {skill}."
+            questions: List[str] = []
+            for _ in range(rounds):
+                try:
+                    questions.extend(parse_question_texts(run_crew("question", {"data": profile})))
+                except Exception as e:
+                    logger.error(f"Question generation failed for {skill}/{seniority}: {str(e)}")
+
+            questions = list(dict.fromkeys(q for q in questions if q != "No question generated"))
+            if not questions:
+                continue
+
+            bank_collection.update_one(
+                {"skill": skill, "seniority": seniority},
+                {"$set": {"questions": questions, "generated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            written += 1
+            logger.info(f"Stored {len(questions)} questions for {skill}/{seniority}")
+
+    if written:
+        # Running API workers reload their in-memory index
+        cache_versions.bump("question_bank")
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Generate the precomputed interview question bank")
+    parser.add_argument("--skills", nargs="*", help="Skills to generate (default: all known skills)")
+    parser.add_argument("--seniority", nargs="*", choices=SENIORITY_LEVELS, help="Seniority levels")
+    parser.add_argument("--rounds", type=int, default=2, help="Crew runs per skill/seniority")
+    parser.add_argument("--overwrite", action="store_true", help="Regenerate existing entries")
+    args = parser.parse_args()
+
+    count = build_bank(args.skills, args.seniority, args.rounds, args.overwrite)
+    logger.info(f"Question bank build finished, {count} entries written")
@@ -0,0 +1,26 @@
+# Per-request context (request id, user and session) shared by metrics and tracing
+import uuid
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+_request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+
+def new_request_context(request_id: Optional[str] = None) -> Dict[str, Any]:
+    """Start a fresh context for an incoming request and return it."""
+    context = {"request_id": request_id or uuid.uuid4().hex, "user_id": None, "session_id": None}
+    _request_context.set(context)
+    return context
+
+
+def get_request_context() -> Dict[str, Any]:
+    """Return the current request context (empty outside of a request)."""
+    return _request_context.get() or {}
+
+
+def bind_request_context(**values: Any) -> None:
+    """Attach values such as user_id/session_id to the current request context."""
+    context = _request_context.get()
+    if context is None:
+        context = new_request_context()
+    context.update({key: value for key, value in values.items() if value is not None})
@@ -0,0 +1,194 @@
+# Resume condensation: shrink extracted resume text to a token budget before
+# it is handed to the question generation crew
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Maximum number of tokens of resume text passed to the LLM (0 disables trimming)
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "1200"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# Heading keywords for each resume section, matched against short lines
+SECTION_HEADINGS = {
+    "summary": ["summary", "profile", "objective", "about me", "professional summary"],
+    "skills": ["skills", "technical skills", "core competencies", "technologies", "tech stack", "tools"],
+    "experience": ["experience", "work experience", "professional experience", "employment", "work history", "internships", "internship"],
+    "projects": ["projects", "personal projects", "academic projects", "key projects"],
+    "education": ["education", "academic background", "qualifications"],
+    "certifications": ["certifications", "certificates", "courses", "training"],
+    "achievements": ["achievements", "awards", "honors", "accomplishments"],
+    "publications": ["publications", "papers", "research"],
+    "other": ["interests", "hobbies", "languages", "references", "activities", "volunteering", "extracurricular"],
+}
+
+# Relative importance of each section when the budget forces content to be dropped
+SECTION_WEIGHTS = {
+    "skills": 1.0,
+    "experience": 0.9,
+    "projects": 0.85,
+    "summary": 0.6,
+    "education": 0.5,
+    "achievements": 0.45,
+    "certifications": 0.4,
+    "publications": 0.2,
+    "other": 0.1,
+}
+
+# Output order of sections in the condensed text
+SECTION_ORDER = ["summary", "skills", "experience", "projects", "education",
+                 "certifications", "achievements", "publications", "other"]
+
+_HEADING_LOOKUP = {
+    keyword: section
+    for section, keywords in SECTION_HEADINGS.items()
+    for keyword in keywords
+}
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """Load the tiktoken encoder once; returns None if tiktoken is unavailable."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, falling back to word estimate: {str(e)}")
+            _encoder = None
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text using the configured tokenizer."""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    # Rough estimate: words and punctuation marks are one token each
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def _match_heading(line: str) -> Optional[str]:
+    """Return the section name if the line looks like a section heading."""
+    normalized = re.sub(r"[^a-z ]", "", line.lower()).strip()
+    if not normalized or len(normalized.split()) > 4:
+        return None
+    return _HEADING_LOOKUP.get(normalized)
+
+
+def segment_sections(text: str) -> Dict[str, List[str]]:
+    """Split resume text into sections keyed by section name.
+
+    Lines before the first recognised heading (name, contact details,
+    summary) are grouped under "summary".
+    """
+    sections: Dict[str, List[str]] = {}
+    current = "summary"
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        heading = _match_heading(line)
+        if heading:
+            current = heading
+            continue
+        sections.setdefault(current, []).append(line)
+    return sections
+
+
+def _line_score(line: str) -> float:
+    """Score a line by how much signal it carries for question generation."""
+    words = line.split()
+    score = min(len(words), 25) / 25
+    # Quantified achievements and dates are usually worth keeping
+    if re.search(r"\d", line):
+        score += 0.3
+    # Comma separated lists are typically skills or technologies
+    if line.count(",") >= 2:
+        score += 0.2
+    if len(words) <= 2:
+        score -= 0.3
+    return score
+
+
+def condense_resume(text: str, token_budget: Optional[int] = None) -> Dict:
+    """Segment, deduplicate and trim resume text to a token budget.
+
+    Args:
+        text: Resume text with one logical line per line
+        token_budget: Maximum tokens to keep (defaults to RESUME_TOKEN_BUDGET, 0 disables)
+
+    Returns:
+        Dict with the condensed "text", "original_tokens", "condensed_tokens",
+        "tokens_saved" and the list of "sections" that were kept
+    """
+    if token_budget is None:
+        token_budget = RESUME_TOKEN_BUDGET
+
+    original_tokens = count_tokens(text)
+    sections = segment_sections(text)
+
+    # Deduplicate lines across the whole resume, keeping the first occurrence
+    seen = set()
+    candidates = []
+    for section in SECTION_ORDER:
+        for position, line in enumerate(sections.get(section, [])):
+            key = re.sub(r"\W+", " ", line.lower()).strip()
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            candidates.append({
+                "section": section,
+                "position": position,
+                "line": line,
+                "tokens": count_tokens(line) + 1,
+                "score": SECTION_WEIGHTS[section] * (1 + _line_score(line)),
+            })
+
+    # Greedily keep the highest scoring lines until the budget is spent
+    if token_budget and token_budget > 0:
+        kept = []
+        used = 0
+        for candidate in sorted(candidates, key=lambda c: c["score"], reverse=True):
+            heading_cost = 0 if any(k["section"] == candidate["section"] for k in kept) else 3
+            cost = candidate["tokens"] + heading_cost
+            if used + cost > token_budget:
+                continue
+            kept.append(candidate)
+            used += cost
+    else:
+        kept = candidates
+
+    # Re-emit kept lines in their original order, grouped under section headings
+    blocks = []
+    kept_sections = []
+    for section in SECTION_ORDER:
+        lines = sorted((c for c in kept if c["section"] == section), key=lambda c: c["position"])
+        if not lines:
+            continue
+        kept_sections.append(section)
+        blocks.append(f"{section.upper()}:\n" + "\n".join(c["line"] for c in lines))
+
+    condensed = "\n\n".join(blocks)
+    condensed_tokens = count_tokens(condensed)
+
+    return {
+        "text": condensed,
+        "original_tokens": original_tokens,
+        "condensed_tokens": condensed_tokens,
+        "tokens_saved": max(original_tokens - condensed_tokens, 0),
+        "sections": kept_sections,
+    }
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from datetime import datetime
+from typing import Optional
+import logging
+
+from admin_auth import require_admin
+from interview_export import MEDIA_TYPES, build_query, export
+from profiling import list_profiles, load_collapsed_stacks, profiler
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/export/interviews")
+def export_interviews(
+    format: str = Query("ndjson", pattern="^(ndjson|parquet)$"),
+    user_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_incomplete: bool = False
+):
+    """Stream interview history as NDJSON or Parquet for offline analysis."""
+    try:
+        query = build_query(user_id, start, end, completed_only=not include_incomplete)
+        logger.info(f"Exporting interviews as {format} with filter {query}")
+        filename = f"interviews-{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+        return StreamingResponse(
+            export(query, format),
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        logger.error(f"Error starting interview export: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export interviews")
+
+@router.post("/profiles/arm")
+def arm_profiling(
+    name: str,
+    count: int = Query(1, ge=0, le=100),
+    ttl_minutes: float = Query(10, gt=0, le=24 * 60)
+):
+    """Profile the next count requests of a handler in any worker (count=0 disarms)."""
+    if name not in profiler.endpoints:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown profiling target; choose from {sorted(profiler.endpoints)}")
+    try:
+        return profiler.arm(name, count, ttl_minutes)
+    except Exception as e:
+        logger.error(f"Error arming profiler: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to arm profiler")
+
+@router.get("/profiles")
+def get_profiles(name: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """List stored request profiles, most recent first."""
+    try:
+        return {"profiles": list_profiles(name, limit)}
+    except Exception as e:
+        logger.error(f"Error listing profiles: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to list profiles")
+
+@router.get("/profiles/{request_id}")
+def download_profile(request_id: str):
+    """Download a request's profile as collapsed stacks (for flamegraph.pl or speedscope)."""
+    try:
+        stacks = load_collapsed_stacks(request_id)
+    except Exception as e:
+        logger.error(f"Error loading profile: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to load profile")
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    filename = "".join(c if c.isalnum() or c in "-_" else "_" for c in request_id)
+    return PlainTextResponse(stacks, headers={"Content-Disposition": f'attachment; filename="{filename}.collapsed"'})
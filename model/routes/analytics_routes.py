@@ -1,8 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Response
 from datetime import datetime, timedelta
+from typing import Optional
 import logging
 
+from cohort_analytics import CATEGORIES, monthly_volumes, percentile_rank, summarize_period
+from interview_archive import COLD_FIELDS, rehydrate
 from mongo_connect import collection, mongo_errors
+from profiling import profiled
+from score_trends import trends_cache
+from singleflight import coalesce
+from usage import usage_tracker
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,7 +17,9 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.get("/user_stats/{user_id}")
-async def get_user_stats(user_id: str):
+@coalesce("get_user_stats")
+@profiled("get_user_stats")
+def get_user_stats(user_id: str):
     """Get basic statistics: average score, total interview time, and number of interviews"""
     try:
         # Get all sessions for the user with relevant timestamps
@@ -37,10 +46,6 @@ async def get_user_stats(user_id: str):
         
         for session in sessions:
             try:
-                # Debug: Print raw timestamp values
-                print(f"Raw timestamp: {session.get('timestamp')}")
-                print(f"Raw last_updated: {session.get('last_updated')}")
-                
                 # Parse timestamps
                 start_str = str(session.get("timestamp"))
                 end_str = str(session.get("last_updated"))
@@ -52,13 +57,8 @@ async def get_user_stats(user_id: str):
                 start_time = datetime.fromisoformat(start_str)
                 end_time = datetime.fromisoformat(end_str)
                 
-                # Debug: Print parsed datetimes
-                print(f"Parsed start: {start_time}")
-                print(f"Parsed end: {end_time}")
-                
                 # Calculate duration in minutes
                 duration = (end_time - start_time).total_seconds() / 60
-                print(f"Calculated duration: {duration} minutes")
                 
                 if duration > 0:  # Only add positive durations
                     total_time_minutes += duration
@@ -72,7 +72,7 @@ async def get_user_stats(user_id: str):
             "total_interviews": total_sessions
         }
     except Exception as e:
-        print(f"Error retrieving user stats: {str(e)}")  # Debug
+        logger.error(f"Error retrieving user stats: {str(e)}")
         return {
             "average_score": 0,
             "total_time_minutes": 0,
@@ -80,7 +80,9 @@ async def get_user_stats(user_id: str):
         }
 
 @router.get("/performance_evaluations/{user_id}")
-async def get_performance_evaluations(user_id: str):
+@coalesce("get_performance_evaluations")
+@profiled("get_performance_evaluations")
+def get_performance_evaluations(user_id: str):
     """Get all performance evaluation breakdowns for a user with average scores"""
     try:
         sessions = list(collection.find(
@@ -175,7 +177,9 @@ async def get_performance_evaluations(user_id: str):
         }
 
 @router.get("/monthly_scores/{user_id}")
-async def get_monthly_scores(user_id: str, months: int = 6):
+@coalesce("get_monthly_scores")
+@profiled("get_monthly_scores")
+def get_monthly_scores(user_id: str, months: int = 6):
     """Get monthly average scores for the last N months"""
     try:
         # Get current date in UTC
@@ -251,6 +255,7 @@ async def get_monthly_scores(user_id: str, months: int = 6):
             })
         
         # Fill in missing months with zero scores to ensure continuity
+        scores_by_month = {(score_data["year"], score_data["month"]): score_data for score_data in monthly_scores}
         filled_monthly_scores = []
         
         for m in range(months):
@@ -258,22 +263,13 @@ async def get_monthly_scores(user_id: str, months: int = 6):
             target_year = target_date.year
             target_month = target_date.month
             
-            # Check if we have data for this month
-            found = False
-            for score_data in monthly_scores:
-                if score_data["year"] == target_year and score_data["month"] == target_month:
-                    filled_monthly_scores.append(score_data)
-                    found = True
-                    break
-            
             # If no data, add a zero entry
-            if not found:
-                filled_monthly_scores.append({
-                    "year": target_year,
-                    "month": target_month,
-                    "average_score": 0,
-                    "session_count": 0
-                })
+            filled_monthly_scores.append(scores_by_month.get((target_year, target_month), {
+                "year": target_year,
+                "month": target_month,
+                "average_score": 0,
+                "session_count": 0
+            }))
         
         return {
             "user_id": user_id,
@@ -293,7 +289,9 @@ async def get_monthly_scores(user_id: str, months: int = 6):
         }
 
 @router.get("/test_scores/{user_id}")
-async def get_test_scores(user_id: str, limit: int = 10):
+@coalesce("get_test_scores")
+@profiled("get_test_scores")
+def get_test_scores(user_id: str, limit: int = 10):
     """Get individual test scores for a user, with most recent first"""
     try:
         # Verify the user exists
@@ -364,7 +362,8 @@ async def get_test_scores(user_id: str, limit: int = 10):
         }
 
 @router.get("/get_mock_interview/{user_id}")
-async def get_mock_interview(user_id: str):
+@coalesce("get_mock_interview")
+def get_mock_interview(user_id: str):
     """Get all mock interviews for a specific user with validated session IDs"""
     try:
         logger.info(f"Retrieving mock interviews for user {user_id}")
@@ -374,6 +373,8 @@ async def get_mock_interview(user_id: str):
             "user_id": user_id,
             "session_id": {"$exists": True}  # Ensure session_id field exists
         }, {"_id": 0}))
+        # Completed interviews keep their questions, answers and feedback in the archive
+        mock_interviews = rehydrate(mock_interviews)
         
         logger.info(f"Found {len(mock_interviews)} interviews for user {user_id}")
         
@@ -408,4 +409,128 @@ async def get_mock_interview(user_id: str):
         return {"mock_interviews": validated_interviews}
     except Exception as e:
         logger.error(f"Error retrieving mock interviews: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error retrieving mock interviews: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving mock interviews: {str(e)}")
+
+@router.get("/score_trends/{user_id}")
+@coalesce("get_score_trends")
+@profiled("get_score_trends")
+def get_score_trends(user_id: str, window: int = 3, horizon: int = 3):
+    """Moving averages, per-category trend slopes, volatility and projected scores"""
+    if not 1 <= window <= 20 or not 1 <= horizon <= 10:
+        raise HTTPException(status_code=400, detail="window must be 1-20 and horizon 1-10")
+    try:
+        trends = trends_cache.get(user_id, window, horizon)
+        if not trends["interviews"]:
+            raise HTTPException(status_code=404, detail="No completed interviews found")
+        return {"user_id": user_id, "window": window, "horizon": horizon, **trends}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing score trends: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error computing score trends")
+
+@router.get("/usage/{user_id}")
+def get_llm_usage(user_id: str, days: int = 7):
+    """LLM calls, tokens and latency per day, with the user's quotas and what is left today"""
+    if not 1 <= days <= 90:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 90")
+    try:
+        return usage_tracker.report(user_id, days)
+    except Exception as e:
+        logger.error(f"Error retrieving LLM usage: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error retrieving LLM usage")
+
+@router.get("/cohort/percentile/{user_id}")
+@coalesce("get_cohort_percentile")
+def get_cohort_percentile(user_id: str, session_id: str = None):
+    """Rank a user's latest (or given) interview against all candidates, per category"""
+    try:
+        query = {"user_id": user_id, "completed": True, "evaluation.score": {"$exists": True}}
+        if session_id:
+            query["session_id"] = session_id
+        interview = collection.find_one(
+            query, {"_id": 0, "session_id": 1, "evaluation.score": 1, "evaluation.breakdown": 1},
+            sort=[("timestamp", -1)]
+        )
+        if not interview:
+            raise HTTPException(status_code=404, detail="No completed interview found")
+
+        evaluation = interview["evaluation"]
+        scores = {"overall": evaluation.get("score", 0)}
+        for category, value in (evaluation.get("breakdown") or {}).items():
+            scores[category.replace(" ", "_")] = value
+
+        return {
+            "user_id": user_id,
+            "session_id": interview["session_id"],
+            "percentiles": {
+                category: {"score": scores[category], "percentile": percentile_rank(scores[category], category)}
+                for category in CATEGORIES if category in scores
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing cohort percentile: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error computing cohort percentile")
+
+@router.get("/cohort/summary")
+@coalesce("get_cohort_summary")
+def get_cohort_summary(period: str = "all", months: int = 12):
+    """Score distribution per category for a period (all or YYYY-MM), plus monthly volumes"""
+    try:
+        return {**summarize_period(period), "monthly_volumes": monthly_volumes(months)}
+    except Exception as e:
+        logger.error(f"Error retrieving cohort summary: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error retrieving cohort summary")
+
+REPORT_SECTIONS = ("questions", "responses", "feedback", "evaluation")
+
+@router.get("/interview_report/{user_id}/{session_id}")
+def get_interview_report(
+    user_id: str,
+    session_id: str,
+    response: Response,
+    sections: str = ",".join(REPORT_SECTIONS),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get one interview for the report page, limited to the requested sections"""
+    requested = [section.strip() for section in sections.split(",") if section.strip()]
+    unknown = set(requested) - set(REPORT_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    try:
+        projection = {"_id": 0, "user_id": 1, "session_id": 1, "completed": 1, "timestamp": 1,
+                      "score": 1, "archived": 1, "version": 1, **{section: 1 for section in requested}}
+        interview = collection.find_one({"user_id": user_id, "session_id": session_id}, projection)
+    except Exception as e:
+        logger.error(f"Error retrieving interview report: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error retrieving interview report")
+
+    if not interview:
+        raise HTTPException(status_code=404, detail="Interview session not found")
+
+    # Completed reports only change if the interview is re-submitted, which bumps its version;
+    # clients revalidate every time, and an unchanged report costs a 304 without a body
+    etag = f'"{session_id}-{interview.pop("version", 0)}-{"-".join(requested)}"'
+    if interview.get("completed"):
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.headers["ETag"] = etag
+        if if_none_match == etag:
+            return Response(status_code=304, headers=dict(response.headers))
+    else:
+        response.headers["Cache-Control"] = "no-store"
+
+    if interview.get("archived") and any(section in COLD_FIELDS for section in requested):
+        interview = rehydrate([interview])[0]
+        for field in COLD_FIELDS:
+            if field not in requested:
+                interview.pop(field, None)
+    interview.pop("archived", None)
+    interview.pop("question_count", None)
+    interview.pop("response_count", None)
+
+    if isinstance(interview.get("timestamp"), datetime):
+        interview["timestamp"] = interview["timestamp"].isoformat()
+    return interview
@@ -1,7 +1,21 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from startup import is_ready, readiness, startup_timings
 
 router = APIRouter()
 
 @router.get("/")
 def root():
     return {"message": "AI Interview System is running!"}
+
+@router.get("/healthz")
+def liveness():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@router.get("/readyz")
+def readiness_check():
+    """Readiness: MongoDB, the LLM client and the question bank are initialised."""
+    body = {"ready": is_ready(), "components": readiness, "startup_seconds": startup_timings}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
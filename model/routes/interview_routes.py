@@ -1,11 +1,23 @@
-from fastapi import APIRouter, HTTPException, Body
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Body, Header
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
 import json
 import logging
 
-from agents import response_crew, score_crew
+from admission import admission
+from cache_invalidation import cache_versions
+from cohort_analytics import record_completion
+from followups import ask_followup, followup_planner, speculate_followup
+from crew_runner import run_crew
+from idempotency import fingerprint, run_idempotent
+from interview_archive import ARCHIVE_ON_COMPLETE, archive_interview, rehydrate, restore_interview
+from metrics import fallbacks, timed
 from mongo_connect import collection, mongo_errors
-from shared_state import user_sessions
+from profiling import profiled
+from shared_state import API_WORKERS, interview_store, session_manager, SessionVersionConflict
+from score_trends import trends_namespace
+from singleflight import single_flight
+from usage import usage_tracker
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,7 +36,8 @@ def clean_json_output(json_str: str) -> dict:
         json_str = json_str.strip()
         
         # Parse the JSON
-        return json.loads(json_str)
+        with timed("json_parse"):
+            return json.loads(json_str)
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse JSON: {json_str}")
         return {"error": f"Invalid JSON format: {str(e)}"}
@@ -36,19 +49,40 @@ def clean_json_output(json_str: str) -> dict:
 async def process_interview_responses(
     user_id: str,
     session_id: str,
-    interview_data: dict = Body(...)
+    interview_data: dict = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """Process user responses and generate feedback."""
+    # Double submits share one evaluation: concurrently via single-flight, on retry via the idempotency key.
+    # Admission control bounds concurrent evaluations; each runs in the threadpool since
+    # its LLM and database calls block.
+    request_fingerprint = fingerprint(json.dumps(interview_data, sort_keys=True, default=str))
+    return await run_idempotent(
+        "process_interview_responses", user_id, idempotency_key, request_fingerprint,
+        lambda: single_flight.do(
+            f"process_interview_responses:{user_id}:{session_id}:{request_fingerprint}",
+            admission.run, "process_interview_responses", user_id,
+            run_in_threadpool, evaluate_interview_responses, user_id, session_id, interview_data
+        )
+    )
+
+@profiled("process_interview_responses")
+def evaluate_interview_responses(user_id: str, session_id: str, interview_data: dict) -> dict:
+    """Generate per-answer feedback and the overall evaluation, then store them."""
     try:
-        # Log the received data for debugging
         logger.info(f"Processing interview responses for user {user_id}, session {session_id}")
-        logger.info(f"Received interview data: {json.dumps(interview_data, default=str)}")
         
         # Get interview data
         try:
+            # A re-submitted interview may have been archived; its answers are rewritten one by
+            # one, so bring the archived fields back first (it is archived again once evaluated)
+            restore_interview(user_id, session_id)
             stored_interview_data = collection.find_one(
                 {"user_id": user_id, "session_id": session_id}
             )
+            if stored_interview_data:
+                # Archived concurrently between the restore and the read
+                stored_interview_data = rehydrate([stored_interview_data])[0]
         except Exception as e:
             logger.error(f"Database query failed: {str(e)}")
             raise HTTPException(status_code=500, detail="Database error")
@@ -65,8 +99,12 @@ async def process_interview_responses(
         if not responses_from_frontend:
             logger.warning("No responses provided in the request body")
             raise HTTPException(status_code=400, detail="No responses provided")
+
+        # One feedback call per answer plus the overall score; refuse up front rather than half-way
+        usage_tracker.check(user_id, calls=len(responses_from_frontend) + 1)
             
         # Process responses
+        version = stored_interview_data.get("version", 0)
         feedback_list = []
         responses_to_store = []
         question_response_pairs = []
@@ -75,10 +113,10 @@ async def process_interview_responses(
             question_id = response_item.get("questionId")
             answer_text = response_item.get("answer")
             
-            logger.info(f"Processing response {i+1}/{len(responses_from_frontend)}: questionId={question_id}")
+            logger.debug(f"Processing response {i+1}/{len(responses_from_frontend)}: questionId={question_id}")
             
             if not question_id or not answer_text:
-                logger.warning(f"Skipping response with missing questionId or answer: {response_item}")
+                logger.warning(f"Skipping response {i+1} with missing questionId or answer")
                 continue
                 
             question = next(
@@ -90,16 +128,39 @@ async def process_interview_responses(
                 continue
 
             try:
-                logger.info(f"Generating feedback for question: {question['text']}")
-                evaluation = response_crew.kickoff(inputs={
+                logger.debug(f"Generating feedback for question {question_id}")
+                evaluation = run_crew("response", {
                     "question": question["text"],
                     "response": answer_text
                 })
-                logger.info(f"Successfully generated feedback")
+                logger.debug(f"Successfully generated feedback")
+            except HTTPException:
+                # Usage quota exhausted: fail the submission instead of storing placeholder feedback
+                raise
             except Exception as e:
                 logger.error(f"Feedback generation failed: {str(e)}")
+                fallbacks.inc(reason="feedback_generation")
                 evaluation = "Could not generate feedback"
 
+            # Persist each answer and its feedback as soon as it is ready; only
+            # this question's array elements are written
+            try:
+                saved = interview_store.append_response(user_id, session_id, question_id, answer_text)
+                if saved is not None:
+                    saved = interview_store.attach_feedback(user_id, session_id, question_id, evaluation)
+            except SessionVersionConflict as e:
+                logger.warning(f"Response not saved: {str(e)}")
+                raise HTTPException(status_code=409, detail="Interview was modified concurrently, please resubmit")
+            except Exception as e:
+                logger.error(f"Failed to save response for question {question_id}: {str(e)}")
+                raise HTTPException(status_code=500, detail="Failed to save results")
+            # None means the write did not reach the interview (deleted, or not stored); passing
+            # it on as expected_version would silently skip the optimistic check below
+            if saved is None:
+                logger.error(f"Interview data not found while saving question {question_id}")
+                raise HTTPException(status_code=404, detail="Interview data not found")
+            version = saved
+
             responses_to_store.append({
                 "question_id": question_id,
                 "text": answer_text
@@ -146,7 +207,7 @@ async def process_interview_responses(
             }
             
             logger.info("Generating overall evaluation score")
-            evaluation_output = score_crew.kickoff(inputs=evaluation_input)
+            evaluation_output = run_crew("score", evaluation_input)
             logger.debug(f"Raw evaluation output: {evaluation_output}")
             
             # Handle case where output might be a string or dict
@@ -174,51 +235,59 @@ async def process_interview_responses(
                 "strengths": overall_evaluation.get("strengths", []),
                 "improvement_areas": overall_evaluation.get("improvement_areas", [])
             }
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Scoring failed: {str(e)}", exc_info=True)
+            fallbacks.inc(reason="evaluation_generation")
             overall_evaluation = {"error": f"Evaluation generation failed: {str(e)}"}
             score = 0
 
-        # Update database
+        # Store the evaluation, unless another writer changed the session after our last answer
         try:
             logger.info(f"Updating database with interview results")
-            update_result = collection.update_one(
-                {"user_id": user_id, "session_id": session_id},
-                {
-                    "$set": {
-                        "responses": responses_to_store,
-                        "feedback": feedback_list,
-                        "score": score,
-                        "evaluation": overall_evaluation,
-                        "completed": True,
-                        "last_updated": datetime.now()
-                    }
-                }
-            )
-            
-            if update_result.modified_count == 0:
-                logger.warning(f"No documents modified when updating interview data for user {user_id}, session {session_id}")
-                if collection.count_documents({"user_id": user_id, "session_id": session_id}) == 0:
-                    logger.error(f"Interview data not found for update")
-                    raise HTTPException(status_code=404, detail="Interview data not found for update")
-                else:
-                    logger.info("Document exists but no changes were made. Continuing normally.")
-            else:
-                logger.info(f"Successfully updated interview data in database")
+            if interview_store.set_evaluation(user_id, session_id, overall_evaluation, score,
+                                              expected_version=version) is None:
+                logger.error(f"Interview data not found for update")
+                raise HTTPException(status_code=404, detail="Interview data not found for update")
+        except HTTPException:
+            raise
+        except SessionVersionConflict as e:
+            logger.warning(f"Evaluation not saved: {str(e)}")
+            raise HTTPException(status_code=409, detail="Interview was modified concurrently, please resubmit")
         except Exception as e:
             logger.error(f"Database update failed: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to save results")
 
-        # Update in-memory session if exists
-        if user_id in user_sessions and session_id in user_sessions[user_id]:
-            user_sessions[user_id][session_id].update({
-                "responses": responses_to_store,
-                "feedback": feedback_list,
-                "score": score,
-                "evaluation": overall_evaluation,
-                "completed": True
-            })
-            logger.info(f"Updated in-memory session data")
+        # Keep the cached session in step; it may already have expired
+        session_manager.set_evaluation(user_id, session_id, overall_evaluation, score)
+
+        # Any follow-up still being prepared for this interview is no longer needed; the
+        # planner belongs to the event loop, and this runs in the threadpool
+        try:
+            followup_planner.discard_threadsafe(session_id)
+        except Exception as e:
+            logger.error(f"Failed to discard follow-ups for {session_id}: {str(e)}")
+
+        # Add the scores to the cohort distributions used for percentile ranks
+        if "error" not in overall_evaluation:
+            try:
+                record_completion(user_id, session_id, overall_evaluation, stored_interview_data.get("timestamp"))
+            except Exception as e:
+                logger.error(f"Failed to update cohort stats for {session_id}: {str(e)}")
+
+        # The user's score trends change with every completed interview
+        try:
+            cache_versions.bump(trends_namespace(user_id))
+        except Exception as e:
+            logger.error(f"Failed to invalidate score trends for {user_id}: {str(e)}")
+
+        # Move the bulky text out of the hot collection now that the interview is complete
+        if ARCHIVE_ON_COMPLETE:
+            try:
+                archive_interview(user_id, session_id)
+            except Exception as e:
+                logger.error(f"Failed to archive interview {session_id}: {str(e)}")
 
         logger.info(f"Successfully completed interview processing")
         return {
@@ -233,3 +302,34 @@ async def process_interview_responses(
     except Exception as e:
         logger.error(f"Unexpected error in process_interview_responses: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/followup/{user_id}/{session_id}/speculate", status_code=202)
+async def speculate_interview_followup(user_id: str, session_id: str, body: dict = Body(...)):
+    """Start preparing a follow-up from a partial answer while the candidate is still speaking."""
+    question_id, partial_answer = body.get("questionId"), body.get("partialAnswer", "")
+    if not question_id:
+        raise HTTPException(status_code=400, detail="questionId is required")
+    if API_WORKERS > 1:
+        # Speculation state is per worker and the final /followup request may land on another
+        # one, wasting the LLM call; only the websocket, pinned to one worker, speculates then
+        return {"status": "ignored"}
+    try:
+        await speculate_followup(user_id, session_id, question_id, partial_answer)
+    except Exception as e:
+        # Speculation is best effort; the final request generates the follow-up anyway
+        logger.error(f"Follow-up speculation failed: {str(e)}")
+    return {"status": "accepted"}
+
+@router.post("/followup/{user_id}/{session_id}", response_model=dict)
+async def get_interview_followup(user_id: str, session_id: str, body: dict = Body(...)):
+    """Return a follow-up to the final answer within the latency budget (or none) and add it to the interview."""
+    question_id, answer = body.get("questionId"), body.get("answer", "")
+    if not question_id:
+        raise HTTPException(status_code=400, detail="questionId is required")
+    try:
+        return await ask_followup(user_id, session_id, question_id, answer)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e).strip("'"))
+    except Exception as e:
+        logger.error(f"Follow-up generation failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to generate follow-up")
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from metrics import registry
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Expose stage latencies, LLM counters and fallbacks in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
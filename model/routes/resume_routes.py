@@ -1,28 +1,54 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from datetime import datetime
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Query
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+import asyncio
 import fitz
+import os
 import re
 import json
 import logging
 import uuid
-from agents import question_crew
+from admission import admission
+from crew_runner import run_crew
+from idempotency import fingerprint, forget_result, run_idempotent
+from interview_archive import rehydrate
+from metrics import fallbacks, timed
 from mongo_connect import collection, mongo_errors
 from models import Question
-from shared_state import user_sessions
+from question_bank import (question_bank, parse_question_texts,
+                           QUESTION_BANK_ENABLED, QUESTIONS_PER_INTERVIEW)
+from resume_condenser import condense_resume
+from request_context import bind_request_context
+from shared_state import session_manager
+from singleflight import single_flight
+from usage import usage_tracker
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Longest a /question request waits for questions still being generated
+QUESTION_POLL_SECONDS = float(os.getenv("QUESTION_POLL_SECONDS", "25"))
+# Generation not finished after this long is reported as failed (e.g. its worker died)
+QUESTION_GENERATION_TIMEOUT = float(os.getenv("QUESTION_GENERATION_TIMEOUT", "300"))
+# On shutdown, how long cancelled generations get to mark their sessions failed
+QUESTION_SHUTDOWN_GRACE_SECONDS = float(os.getenv("QUESTION_SHUTDOWN_GRACE_SECONDS", "5"))
+
+# Background generations running in this worker, and events waking their long-polls
+_generation_tasks: Set[asyncio.Task] = set()
+_generation_events: Dict[str, asyncio.Event] = {}
+
 def extract_resume_text(pdf_file: UploadFile) -> str:
-    """Extract and clean text from PDF resume."""
+    """Extract and clean text from PDF resume, keeping one line per text line."""
     try:
-        with fitz.open(stream=pdf_file.file.read(), filetype="pdf") as doc:
-            text = "".join(page.get_text() for page in doc)
+        with timed("pdf_extraction"), fitz.open(stream=pdf_file.file.read(), filetype="pdf") as doc:
+            text = "\n".join(page.get_text() for page in doc)
             cleaned_text = re.sub(r'[^\w\s,.|:/-]', '', text)
-            return re.sub(r'\s+', ' ', cleaned_text).strip()
+            lines = (re.sub(r'\s+', ' ', line).strip() for line in cleaned_text.splitlines())
+            return "\n".join(line for line in lines if line)
     except Exception as e:
         logger.error(f"Error extracting resume text: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid PDF file")
@@ -33,17 +59,10 @@ async def generate_questions(resume: str) -> List[dict]:
         raise HTTPException(status_code=400, detail="Resume text is required")
 
     try:
-        result = question_crew.kickoff(inputs={"data": resume})
-        if result.startswith("```json"):
-            result = result[7:-4].strip()
-        
-        questions_data = json.loads(result)
-        
-        if not isinstance(questions_data, list):
-            raise ValueError("Unexpected AI response format - expected list")
-            
-        return [{"id": str(uuid.uuid4()), "text": q.get("question", "No question generated")} 
-                for q in questions_data]
+        result = await run_in_threadpool(run_crew, "question", {"data": resume})
+        with timed("json_parse"):
+            texts = parse_question_texts(result)
+        return [{"id": str(uuid.uuid4()), "text": text} for text in texts]
         
     except json.JSONDecodeError as e:
         logger.error(f"JSON decode error: {str(e)}")
@@ -52,62 +71,96 @@ async def generate_questions(resume: str) -> List[dict]:
         logger.error(f"Question generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate questions")
 
+async def assemble_questions(resume: str) -> List[dict]:
+    """Pick questions from the question bank, generating only uncovered ones with the LLM."""
+    bank_questions, uncovered = [], []
+    if QUESTION_BANK_ENABLED:
+        with timed("question_bank_select"):
+            bank_questions, uncovered = question_bank.select_questions(resume)
+
+    questions = [{"id": str(uuid.uuid4()), "text": text} for text in bank_questions]
+    missing = QUESTIONS_PER_INTERVIEW - len(questions)
+
+    if missing > 0:
+        if QUESTION_BANK_ENABLED:
+            fallbacks.inc(reason="question_bank_miss")
+        prompt = resume
+        if uncovered:
+            prompt = f"{resume}\n\nFOCUS SKILLS: {', '.join(uncovered)}"
+        generated = await generate_questions(prompt)
+        questions.extend(generated[:missing] if questions else generated)
+
+    logger.info(f"Assembled {len(bank_questions)} questions from the bank, {max(missing, 0)} generated")
+    return questions
+
 @router.post("/upload_resume", response_model=dict)
-async def upload_resume(file: UploadFile = File(...), user_id: str = Form(...)):
-    """Process uploaded resume and generate interview questions."""
-    try:
-        if not file.filename.lower().endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are accepted")
+async def upload_resume(
+    file: UploadFile = File(...),
+    user_id: str = Form(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Process uploaded resume and start generating interview questions."""
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are accepted")
 
+    # Identical uploads share one run: concurrently via single-flight, on retry via the idempotency key
+    contents = await file.read()
+    await file.seek(0)
+    request_fingerprint = fingerprint(user_id, contents)
+    return await run_idempotent(
+        "upload_resume", user_id, idempotency_key, request_fingerprint,
+        lambda: single_flight.do(f"upload_resume:{user_id}:{request_fingerprint}", process_resume, file, user_id,
+                                 idempotency_key)
+    )
+
+async def process_resume(file: UploadFile, user_id: str, idempotency_key: Optional[str] = None) -> dict:
+    """Extract the resume, create the interview session and generate its questions in the background."""
+    try:
         session_id = str(uuid.uuid4())
+        bind_request_context(user_id=user_id, session_id=session_id)
+        # Question generation needs the LLM; refuse before creating a session that could not get questions
+        await run_in_threadpool(usage_tracker.check, user_id)
         resume_text = extract_resume_text(file)
 
-        try:
-            questions = await generate_questions(resume_text)
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Question generation failed: {str(e)}")
-            raise HTTPException(status_code=500, detail="Failed to generate questions")
-
-        # Initialize session
-        user_sessions.setdefault(user_id, {})[session_id] = {
-            "questions": questions,
-            "responses": [],
-            "feedback": [],
-            "completed": False
-        }
+        # Trim the resume to the token budget before it reaches the LLM
+        with timed("resume_condensation"):
+            condensed = condense_resume(resume_text)
+        logger.info(
+            f"Condensed resume from {condensed['original_tokens']} to "
+            f"{condensed['condensed_tokens']} tokens (saved {condensed['tokens_saved']})"
+        )
 
-        # Store in database
+        # Store in database; questions follow once generated
         interview_data = {
             "user_id": user_id,
             "session_id": session_id,  # Ensure session_id is explicitly set
-            "questions": questions,
+            "questions": [],
+            "questions_status": "pending",
             "responses": [],
             "feedback": [],
             "completed": False,
-            "timestamp": datetime.now()
+            "timestamp": datetime.now(),
+            "version": 0
         }
 
         try:
-            # Ensure the session_id is properly stored
             logger.info(f"Saving interview session with ID: {session_id}")
-            collection.insert_one(interview_data)
-            
-            # Verify the document was stored correctly
-            verification = collection.find_one({"session_id": session_id})
-            if not verification:
-                logger.error("Failed to verify stored session")
-                raise ValueError("Session data was not stored properly")
-                
-            logger.info(f"Session stored successfully with ID: {verification.get('session_id')}")
+            await run_in_threadpool(collection.insert_one, interview_data)
         except Exception as e:
             logger.error(f"Database insert failed: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to save interview data")
 
+        # Question generation overlaps with the candidate's setup time; /question waits for it
+        _generation_events[session_id] = asyncio.Event()
+        task = asyncio.create_task(
+            generate_session_questions(user_id, session_id, condensed["text"], idempotency_key))
+        _generation_tasks.add(task)
+        task.add_done_callback(_generation_tasks.discard)
+
         return {
             "message": "Resume processed successfully",
-            "session_id": session_id
+            "session_id": session_id,
+            "tokens_saved": condensed["tokens_saved"]
         }
 
     except HTTPException:
@@ -116,31 +169,147 @@ async def upload_resume(file: UploadFile = File(...), user_id: str = Form(...)):
         logger.error(f"Unexpected error in upload_resume: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def generate_session_questions(user_id: str, session_id: str, resume: str,
+                                     idempotency_key: Optional[str] = None) -> None:
+    """Generate a session's questions under admission control and publish them.
+
+    On failure or cancellation (e.g. shutdown) the session is marked failed
+    and the upload's idempotent response is dropped, so retrying the upload
+    with the same key creates a new session instead of replaying this one.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + QUESTION_GENERATION_TIMEOUT
+    try:
+        while True:
+            try:
+                with timed("question_generation"):
+                    questions = await admission.run("question_generation", user_id, assemble_questions, resume)
+                break
+            except HTTPException as e:
+                # Busy: defer until a slot is likely free rather than failing the session
+                retry_after = float((e.headers or {}).get("Retry-After", 0))
+                if e.status_code not in (429, 503) or loop.time() + retry_after > deadline:
+                    raise
+                await asyncio.sleep(retry_after)
+
+        await run_in_threadpool(
+            collection.update_one,
+            {"user_id": user_id, "session_id": session_id},
+            {"$set": {"questions": questions, "questions_status": "ready"}}
+        )
+        await run_in_threadpool(session_manager.set_session, user_id, session_id, {
+            "questions": questions,
+            "responses": [],
+            "feedback": [],
+            "completed": False
+        })
+        logger.info(f"Questions ready for session {session_id}")
+    except asyncio.CancelledError:
+        logger.warning(f"Question generation cancelled for session {session_id}")
+        await _record_generation_failure(user_id, session_id, idempotency_key,
+                                         "Question generation was interrupted, please upload the resume again")
+        raise
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else "Failed to generate questions"
+        logger.error(f"Question generation failed for session {session_id}: {str(e)}")
+        await _record_generation_failure(user_id, session_id, idempotency_key, detail)
+    finally:
+        event = _generation_events.pop(session_id, None)
+        if event:
+            event.set()
+
+async def _record_generation_failure(user_id: str, session_id: str, idempotency_key: Optional[str],
+                                     detail: str) -> None:
+    """Mark a session's questions failed and release the upload's idempotency key."""
+    try:
+        await run_in_threadpool(
+            collection.update_one,
+            {"user_id": user_id, "session_id": session_id},
+            {"$set": {"questions_status": "failed", "questions_error": detail}}
+        )
+    except Exception as store_error:
+        logger.error(f"Failed to record question generation failure: {str(store_error)}")
+    try:
+        await run_in_threadpool(forget_result, "upload_resume", user_id, idempotency_key)
+    except Exception as forget_error:
+        logger.error(f"Failed to release the upload's idempotency key: {str(forget_error)}")
+
+async def cancel_question_generations(grace: float = QUESTION_SHUTDOWN_GRACE_SECONDS) -> None:
+    """Cancel this worker's background generations and wait briefly while they mark their sessions failed."""
+    tasks = list(_generation_tasks)
+    if not tasks:
+        return
+    for task in tasks:
+        task.cancel()
+    _, still_running = await asyncio.wait(tasks, timeout=grace)
+    logger.info(f"Cancelled {len(tasks)} question generations on shutdown "
+                f"({len(still_running)} did not finish cleaning up)")
+
+def _load_questions(user_id: str, session_id: str) -> Optional[dict]:
+    data = collection.find_one(
+        {"user_id": user_id, "session_id": session_id},
+        {"questions": 1, "questions_status": 1, "questions_error": 1, "timestamp": 1,
+         "user_id": 1, "session_id": 1, "archived": 1}
+    )
+    return rehydrate([data])[0] if data else None
+
 @router.get("/question/{user_id}/{session_id}", response_model=dict)
-async def get_interview_questions(user_id: str, session_id: str):
-    """Retrieve generated questions for an interview session."""
+async def get_interview_questions(
+    user_id: str,
+    session_id: str,
+    wait: float = Query(QUESTION_POLL_SECONDS, ge=0, le=QUESTION_POLL_SECONDS)
+):
+    """Retrieve the questions for an interview session, waiting up to `wait` seconds while they are generated."""
     try:
-        # Check in-memory session first
-        if user_id in user_sessions and session_id in user_sessions[user_id]:
-            return {"questions": user_sessions[user_id][session_id]["questions"]}
+        # Check the session cache first
+        session = await run_in_threadpool(session_manager.get_session, user_id, session_id)
+        if session and session.get("questions"):
+            # Keep the session alive while the candidate is working through it
+            await run_in_threadpool(session_manager.touch_session, user_id, session_id)
+            return {"questions": session["questions"]}
 
-        # Fallback to database
-        try:
-            data = collection.find_one(
-                {"user_id": user_id, "session_id": session_id},
-                {"questions": 1}
-            )
-        except Exception as e:
-            logger.error(f"Database query failed: {str(e)}")
-            raise HTTPException(status_code=500, detail="Database error")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        delay = 0.25
+        while True:
+            try:
+                data = await run_in_threadpool(_load_questions, user_id, session_id)
+            except Exception as e:
+                logger.error(f"Database query failed: {str(e)}")
+                raise HTTPException(status_code=500, detail="Database error")
+
+            if not data:
+                raise HTTPException(status_code=404, detail="Interview session not found")
 
-        if not data:
-            raise HTTPException(status_code=404, detail="Interview session not found")
+            # Sessions created before background generation have no status
+            status = data.get("questions_status", "ready")
+            if status == "ready":
+                return {"questions": data["questions"]}
+            if status == "failed":
+                raise HTTPException(status_code=500, detail=data.get("questions_error") or "Failed to generate questions")
+            started = data.get("timestamp")
+            if (isinstance(started, datetime) and session_id not in _generation_events
+                    and datetime.now() - started > timedelta(seconds=QUESTION_GENERATION_TIMEOUT)):
+                raise HTTPException(status_code=500, detail="Question generation did not finish, please upload again")
 
-        return {"questions": data["questions"]}
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return JSONResponse({"status": "pending", "questions": []}, status_code=202,
+                                    headers={"Retry-After": "1"})
+
+            # Wake immediately if the generation runs in this worker, otherwise re-check MongoDB
+            event = _generation_events.get(session_id)
+            if event:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, 2.0)
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Unexpected error in get_interview_questions: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
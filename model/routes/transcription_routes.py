@@ -0,0 +1,99 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import logging
+
+from followups import ask_followup, followup_planner, speculate_followup
+from shared_state import session_manager
+from transcription import StreamingTranscriber, TranscriptStream
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Shared by all connections so windows from concurrent sessions are batched together
+transcriber = StreamingTranscriber()
+
+@router.websocket("/ws/transcribe/{user_id}/{session_id}")
+async def transcribe_stream(websocket: WebSocket, user_id: str, session_id: str, format: str = "pcm16",
+                            adaptive: bool = False):
+    """Stream audio chunks in, stream partial transcripts out.
+
+    Binary frames carry audio ("pcm16": 16kHz mono little-endian PCM, or "webm":
+    consecutive MediaRecorder chunks). Text frames carry control messages:
+    {"type": "end"} requests the final transcript, {"type": "reset"} clears
+    the buffer before the next question.
+
+    With adaptive=true, {"type": "question", "question_id": ...} names the
+    question being answered; partial transcripts then prefetch a follow-up and
+    the final transcript is followed by {"type": "followup", ...}.
+    """
+    if format not in ("pcm16", "webm"):
+        await websocket.close(code=1003, reason="Unsupported audio format")
+        return
+
+    await websocket.accept()
+    stream = TranscriptStream(transcriber, audio_format=format)
+    pending = None
+    question_id = None
+
+    async def send_partial():
+        try:
+            text = await stream.transcribe()
+            await websocket.send_json({"type": "partial", "text": text})
+            if adaptive and question_id:
+                await speculate_followup(user_id, session_id, question_id, text)
+        except Exception as e:
+            logger.error(f"Partial transcription failed for session {session_id}: {str(e)}")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes"):
+                stream.feed(message["bytes"])
+                # Only one partial in flight per connection; newer audio is picked up next time
+                if stream.partial_due() and (pending is None or pending.done()):
+                    pending = asyncio.create_task(send_partial())
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                await websocket.send_json({"type": "error", "detail": "Invalid control message"})
+                continue
+
+            if control.get("type") == "end":
+                if pending:
+                    await pending
+                text = await stream.transcribe(final=True)
+                await websocket.send_json({"type": "final", "text": text})
+                await run_in_threadpool(session_manager.touch_session, user_id, session_id)
+                if adaptive and question_id:
+                    try:
+                        result = await ask_followup(user_id, session_id, question_id, text)
+                    except Exception as e:
+                        logger.error(f"Follow-up failed for session {session_id}: {str(e)}")
+                        result = {"followup": None, "source": "error", "latency_ms": 0.0}
+                    await websocket.send_json({"type": "followup", "question_id": question_id, **result})
+            elif control.get("type") == "question":
+                question_id = control.get("question_id")
+            elif control.get("type") == "reset":
+                if pending:
+                    pending.cancel()
+                    pending = None
+                stream.reset()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Transcription stream failed for user {user_id}, session {session_id}: {str(e)}")
+        await websocket.close(code=1011)
+    finally:
+        if pending and not pending.done():
+            pending.cancel()
+        stream.close()
+        followup_planner.discard(session_id)
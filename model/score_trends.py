@@ -0,0 +1,138 @@
+# Score trend analytics computed with NumPy.
+#
+# A user's completed interviews are loaded once into a (interviews x categories)
+# array; moving averages, least-squares slopes, volatility and projections are
+# then computed for all categories at once. Results are cached per user until
+# the user's next completed interview bumps the "trends:<user_id>" version.
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from cache_invalidation import cache_versions
+from cohort_analytics import CATEGORIES, as_score
+from mongo_connect import collection
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+TRENDS_CACHE_SIZE = int(os.getenv("TRENDS_CACHE_SIZE", "1024"))
+
+
+def trends_namespace(user_id: str) -> str:
+    return f"trends:{user_id}"
+
+
+def score_row(evaluation: Dict[str, Any]) -> List[float]:
+    """One interview's scores in CATEGORIES order, breakdown keys normalised like cohort_analytics."""
+    row = dict.fromkeys(CATEGORIES, float("nan"))
+    row["overall"] = as_score(evaluation.get("score"))
+    for category, value in (evaluation.get("breakdown") or {}).items():
+        key = str(category).replace(" ", "_")
+        if key in row and key != "overall":
+            row[key] = as_score(value)
+    return list(row.values())
+
+
+def load_history(user_id: str) -> Tuple[List[Any], np.ndarray]:
+    """Load a user's completed interviews, oldest first, as timestamps and a score matrix.
+
+    Missing or unparseable scores count as 0, so one malformed evaluation
+    does not fail the whole history.
+    """
+    cursor = collection.find(
+        {"user_id": user_id, "completed": True, "evaluation.score": {"$exists": True}},
+        {"_id": 0, "timestamp": 1, "evaluation.score": 1, "evaluation.breakdown": 1}
+    ).sort("timestamp", 1)
+    timestamps, rows = [], []
+    for interview in cursor:
+        timestamps.append(interview.get("timestamp"))
+        rows.append(score_row(interview["evaluation"] or {}))
+    scores = np.asarray(rows, dtype=float).reshape(len(rows), len(CATEGORIES))
+    return timestamps, np.nan_to_num(scores)
+
+
+def moving_average(scores: np.ndarray, window: int) -> np.ndarray:
+    """Trailing moving average per column; the first rows average what is available."""
+    cumulative = np.cumsum(np.vstack([np.zeros((1, scores.shape[1])), scores]), axis=0)
+    counts = np.minimum(np.arange(1, len(scores) + 1), window)[:, None]
+    ends = np.arange(1, len(scores) + 1)
+    return (cumulative[ends] - cumulative[ends - counts[:, 0]]) / counts
+
+
+def compute_trends(scores: np.ndarray, window: int = 3, horizon: int = 3) -> Dict[str, Any]:
+    """Per-category moving averages, slopes, volatility and projected scores.
+
+    Args:
+        scores: (interviews x categories) score matrix, oldest first
+        window: Moving average window in interviews
+        horizon: How many interviews ahead to project
+
+    Returns:
+        Dict with "moving_average" (list of rows) and per-category statistics
+    """
+    count = len(scores)
+    x = np.arange(count, dtype=float)
+    x_centered = x - x.mean() if count else x
+    denominator = float(x_centered @ x_centered)
+    # Least-squares slope for every category in one matrix product
+    slopes = (x_centered @ (scores - scores.mean(axis=0))) / denominator if denominator else np.zeros(scores.shape[1])
+    intercepts = scores.mean(axis=0) - slopes * x.mean() if count else np.zeros(scores.shape[1])
+    volatility = np.diff(scores, axis=0).std(axis=0) if count > 1 else np.zeros(scores.shape[1])
+    projected = np.clip(intercepts + slopes * (count - 1 + horizon), 0, 10)
+
+    averages = moving_average(scores, window) if count else scores
+    return {
+        "moving_average": np.round(averages, 2).tolist(),
+        "categories": {
+            category: {
+                "latest": round(float(scores[-1, i]), 2) if count else 0,
+                "mean": round(float(scores[:, i].mean()), 2) if count else 0,
+                "slope_per_interview": round(float(slopes[i]), 3),
+                "volatility": round(float(volatility[i]), 3),
+                "projected": round(float(projected[i]), 2) if count > 1 else None,
+            }
+            for i, category in enumerate(CATEGORIES)
+        }
+    }
+
+
+class TrendsCache:
+    def __init__(self, max_size: int = TRENDS_CACHE_SIZE):
+        """LRU cache of computed trends, invalidated through cache_versions."""
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Tuple[int, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, window: int, horizon: int) -> Dict[str, Any]:
+        key = (user_id, window, horizon)
+        version = cache_versions.current(trends_namespace(user_id))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] == version:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        timestamps, scores = load_history(user_id)
+        result = compute_trends(scores, window, horizon)
+        result["interviews"] = len(timestamps)
+        result["timestamps"] = [ts.isoformat() if isinstance(ts, datetime) else ts for ts in timestamps]
+        result["categories_order"] = list(CATEGORIES)
+
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return result
+
+
+# Global instance used by the trends endpoint
+trends_cache = TrendsCache()
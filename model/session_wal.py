@@ -0,0 +1,313 @@
+# Durable session fallback: a local SQLite write-ahead log replayed into MongoDB.
+#
+# While MongoDB is unavailable every session write is appended to the ops
+# table and applied to a materialized copy in the sessions table, in one local
+# transaction, so reads keep working and nothing is lost on restart. Once
+# MongoDB answers again, replay() ships the log in order, in batches of
+# SESSION_WAL_REPLAY_BATCH, as one bulk write each. Until the log is empty,
+# MongoSessionManager keeps routing writes through the log so they cannot
+# overtake the ones still waiting to be replayed.
+#
+# SQLite in WAL mode is safe to share between API workers on one host; every
+# worker reads the same local state. Only the worker holding the replay lease
+# (a row in the same file) ships the log, so batches never reach MongoDB out of
+# order. The SQLite write lock is only held for local statements, never across
+# a MongoDB round trip.
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from bson import json_util
+import pymongo
+from dotenv import load_dotenv
+from pymongo import DeleteMany, UpdateOne
+
+from metrics import Counter, registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Local log file shared by all workers on this host
+SESSION_WAL_PATH = os.getenv("SESSION_WAL_PATH", "session_wal.db")
+# Logged operations shipped to MongoDB per bulk write
+SESSION_WAL_REPLAY_BATCH = int(os.getenv("SESSION_WAL_REPLAY_BATCH", "200"))
+# Lifetime of the replay lease; a bulk write is abandoned after half of it so it never outlives the lease
+SESSION_WAL_LEASE_SECONDS = float(os.getenv("SESSION_WAL_LEASE_SECONDS", "60"))
+
+wal_operations = registry.register(Counter(
+    "mockly_session_wal_operations_total", "Session writes logged or replayed by the local WAL", ("event",)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    session_id TEXT,
+    op TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    document TEXT NOT NULL,
+    PRIMARY KEY (user_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS replay_lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def _dumps(value: Any) -> str:
+    # Extended JSON keeps datetimes and ObjectIds intact for the replay
+    return json_util.dumps(value)
+
+
+def _loads(text: str) -> Any:
+    return json_util.loads(text)
+
+
+class WalSessionStore:
+    """Session fallback backed by a durable local log.
+
+    Sessions first written while MongoDB was down are served in full; for
+    sessions that already lived in MongoDB only the logged changes are known
+    locally, so reads of those miss until the log has been replayed.
+    """
+
+    def __init__(self, path: str = SESSION_WAL_PATH, batch_size: int = SESSION_WAL_REPLAY_BATCH,
+                 lease_seconds: float = SESSION_WAL_LEASE_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        # Identifies this store's replays in the lease shared with other processes
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Durable against process crashes; an OS crash may lose the last few commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if self.pending:
+            logger.warning(f"Session WAL {path} has operations waiting to be replayed")
+
+    @property
+    def pending(self) -> bool:
+        """Whether logged writes are still waiting to be replayed into MongoDB."""
+        with self._lock:
+            return self._conn.execute("SELECT EXISTS (SELECT 1 FROM ops)").fetchone()[0] == 1
+
+    def _load(self, user_id: str, session_id: str):
+        row = self._conn.execute(
+            "SELECT complete, document FROM sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+        ).fetchone()
+        return (bool(row[0]), _loads(row[1])) if row else (False, None)
+
+    def _write(self, user_id: str, session_id: Optional[str], op: str, payload: Dict[str, Any],
+               apply: Callable[[bool, Optional[Dict[str, Any]]], Any]) -> None:
+        """Log one operation and apply it to the materialized session in a single transaction.
+
+        Args:
+            apply: Called with (complete, document) of the current local copy; returns the
+                new (complete, document), or None to leave the local copy unchanged
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO ops (user_id, session_id, op, payload) VALUES (?, ?, ?, ?)",
+                    (user_id, session_id, op, _dumps(payload))
+                )
+                result = apply(*self._load(user_id, session_id)) if session_id else None
+                if result is not None:
+                    complete, document = result
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sessions (user_id, session_id, complete, document) VALUES (?, ?, ?, ?)",
+                        (user_id, session_id, int(complete), _dumps(document))
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        wal_operations.inc(event="logged")
+
+    def get(self, user_id: str, session_id: str = None) -> Optional[Dict[str, Any]]:
+        if not session_id:
+            return None
+        with self._lock:
+            complete, document = self._load(user_id, session_id)
+        return document if complete else None
+
+    def get_all(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id, document FROM sessions WHERE user_id = ? AND complete = 1", (user_id,)
+            ).fetchall()
+        return {session_id: _loads(document) for session_id, document in rows}
+
+    def set(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        document = {"user_id": user_id, "session_id": session_id, **data}
+        self._write(user_id, session_id, "set", data, lambda complete, current: (True, document))
+
+    def update(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        # Unknown sessions are kept as partial documents: the change is replayed,
+        # but reads do not mistake it for the whole session
+        self._write(user_id, session_id, "update", data,
+                    lambda complete, current: (complete, {**(current or {}), **data}))
+
+    def upsert_item(self, user_id: str, session_id: str, field: str, item: Dict[str, Any],
+                    key: str = "question_id") -> None:
+        def apply(complete, current):
+            current = current or {}
+            items = [existing for existing in current.get(field) or [] if existing.get(key) != item[key]]
+            # Keep the element's position when it is replaced
+            position = next((i for i, existing in enumerate(current.get(field) or [])
+                             if existing.get(key) == item[key]), len(items))
+            items.insert(position, item)
+            return complete, {**current, field: items}
+
+        self._write(user_id, session_id, "upsert_item", {"field": field, "item": item, "key": key}, apply)
+
+    def delete(self, user_id: str, session_id: str = None) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO ops (user_id, session_id, op, payload) VALUES (?, ?, 'delete', '{}')",
+                    (user_id, session_id)
+                )
+                if session_id:
+                    self._conn.execute("DELETE FROM sessions WHERE user_id = ? AND session_id = ?",
+                                       (user_id, session_id))
+                else:
+                    self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        wal_operations.inc(event="logged")
+
+    @staticmethod
+    def _requests(user_id: str, session_id: Optional[str], op: str, payload: Dict[str, Any],
+                  metadata: Dict[str, Any]) -> list:
+        """Translate one logged operation into the MongoDB writes that replay it."""
+        query = {"user_id": user_id, "session_id": session_id}
+        if op == "delete":
+            return [DeleteMany(query if session_id else {"user_id": user_id})]
+        if op == "set":
+            document = {**query, **metadata, **{k: v for k, v in payload.items() if k != "version"}}
+            return [UpdateOne(query, {"$set": document, "$inc": {"version": 1}}, upsert=True)]
+        if op == "update":
+            fields = {**metadata, **{k: v for k, v in payload.items() if k != "version"}}
+            return [UpdateOne(query, {"$set": fields, "$inc": {"version": 1}})]
+        if op == "upsert_item":
+            field, item, key = payload["field"], payload["item"], payload["key"]
+            # Positional replace, else append: the same outcome as MongoSessionManager.upsert_item
+            return [
+                UpdateOne({**query, f"{field}.{key}": item[key]},
+                          {"$set": {f"{field}.$": item, **metadata}, "$inc": {"version": 1}}),
+                UpdateOne({**query, f"{field}.{key}": {"$ne": item[key]}},
+                          {"$push": {field: item}, "$set": metadata, "$inc": {"version": 1}}),
+            ]
+        raise ValueError(f"Unknown session WAL operation: {op}")
+
+    def _claim_lease(self) -> bool:
+        """Take or renew the replay lease; False if another process holds it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT owner, expires_at FROM replay_lease WHERE id = 1").fetchone()
+                claimed = row is None or row[0] == self.owner or row[1] <= now
+                if claimed:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO replay_lease (id, owner, expires_at) VALUES (1, ?, ?)",
+                        (self.owner, now + self.lease_seconds)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def _release_lease(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM replay_lease WHERE id = 1 AND owner = ?", (self.owner,))
+
+    def replay(self, collection, metadata: Callable[[], Dict[str, Any]] = dict) -> int:
+        """Ship logged operations to MongoDB in order, one bulk write per batch.
+
+        Each batch is only removed from the log after MongoDB acknowledged it,
+        so a failure part-way leaves it to be retried; re-applying the
+        retried batch only adds an extra version increment. Only the process
+        holding the replay lease ships batches: two processes replaying at
+        once could let an older batch land after a newer one. Each bulk write
+        is bounded to half the lease, so it has finished or been abandoned
+        before another process can take over.
+
+        Args:
+            collection: MongoDB collection the sessions belong to
+            metadata: Returns the last_updated/expiry fields to stamp on replayed writes
+
+        Returns:
+            Number of operations replayed
+        """
+        replayed = 0
+        # One replay per process at a time; SQLite is only locked for the short local reads and deletes
+        with self._replay_lock:
+            try:
+                replayed = self._replay_batches(collection, metadata)
+            finally:
+                self._release_lease()
+        if replayed:
+            logger.info(f"Replayed {replayed} session operations from {self.path}")
+        return replayed
+
+    def _replay_batches(self, collection, metadata: Callable[[], Dict[str, Any]]) -> int:
+        replayed = 0
+        while True:
+            # Renewed per batch; another process holds it while its replay is running
+            if not self._claim_lease():
+                logger.info("Session WAL replay is running in another process")
+                return replayed
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, user_id, session_id, op, payload FROM ops ORDER BY seq LIMIT ?",
+                    (self.batch_size,)
+                ).fetchall()
+            if rows:
+                stamp = metadata()
+                requests = []
+                for _, user_id, session_id, op, payload in rows:
+                    requests.extend(self._requests(user_id, session_id, op, _loads(payload), stamp))
+                # Ordered, so later operations on a session apply after earlier ones; no lock is
+                # held meanwhile, so a slow MongoDB never blocks session writes to the log
+                with pymongo.timeout(self.lease_seconds / 2):
+                    collection.bulk_write(requests, ordered=True)
+
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if rows:
+                        self._conn.execute("DELETE FROM ops WHERE seq <= ?", (rows[-1][0],))
+                    drained = not self._conn.execute("SELECT EXISTS (SELECT 1 FROM ops)").fetchone()[0]
+                    if drained:
+                        # MongoDB holds everything now; serve reads from it again
+                        self._conn.execute("DELETE FROM sessions")
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            replayed += len(rows)
+            wal_operations.inc(len(rows), event="replayed")
+            if drained:
+                return replayed
@@ -1,60 +1,144 @@
 # Session management with MongoDB for production-ready state management
-from pymongo import MongoClient, errors
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 import logging
 import os
 from dotenv import load_dotenv
+from pymongo import ReturnDocument
+
+from metrics import fallbacks
+from write_behind import WriteBehindBuffer
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-# Connect to MongoDB (use the existing connection if possible)
-try:
-    from mongo_connect import client, db
-    # Create a separate collection for sessions
-    sessions_collection = db["sessions"]
-    
-    # Create TTL index to automatically expire old sessions (if it doesn't exist)
-    try:
-        existing_indexes = sessions_collection.list_indexes()
-        has_ttl_index = any(index.get('name') == 'expiry_ttl' for index in existing_indexes)
-        
-        if not has_ttl_index:
-            sessions_collection.create_index("expiry", expireAfterSeconds=0, name="expiry_ttl")
-            logger.info("Created TTL index for session expiration")
-    except Exception as e:
-        logger.error(f"Failed to create TTL index: {str(e)}")
-        
-except ImportError:
-    # Fallback if mongo_connect.py isn't properly set up
-    logger.warning("Could not import from mongo_connect, creating new MongoDB client")
-    MONGO_URI = os.getenv("MONGO_URI") or "mongodb://127.0.0.1:27017"
-    
-    try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-        db = client.ai_interview
-        sessions_collection = db["sessions"]
-        sessions_collection.create_index("expiry", expireAfterSeconds=0, name="expiry_ttl")
-    except errors.ServerSelectionTimeoutError as e:
-        logger.error(f"Could not connect to MongoDB: {str(e)}")
-        # Fallback to in-memory as last resort
-        logger.warning("Falling back to in-memory session storage - NOT RECOMMENDED FOR PRODUCTION")
+# Use the shared MongoDB connection; indexes (including the session TTL index)
+# are created at startup by mongo_connect.ensure_indexes()
+from mongo_connect import collection as interviews_collection, db
+sessions_collection = db["sessions"]
+
+# With several API workers an in-memory fallback silently diverges between
+# processes, so multi-worker deployments default to the shared-nothing store
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+SESSION_FALLBACK = os.getenv("SESSION_FALLBACK", "memory" if API_WORKERS <= 1 else "none")
+
+class SessionStoreUnavailable(RuntimeError):
+    pass
+
+
+class SessionVersionConflict(RuntimeError):
+    """The session changed since it was read; re-read and retry the write."""
+    pass
+
+
+class MemorySessionStore:
+    """Per-process in-memory session store. Each worker has its own copy, so it
+    is only a safe fallback when the API runs as a single process."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, user_id: str, session_id: str = None) -> Optional[Dict[str, Any]]:
+        return self.data.get(user_id, {}).get(session_id)
+
+    def get_all(self, user_id: str) -> Dict[str, Any]:
+        return self.data.get(user_id, {})
+
+    def set(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        self.data.setdefault(user_id, {})[session_id] = data
+
+    def update(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        if user_id in self.data and session_id in self.data[user_id]:
+            self.data[user_id][session_id].update(data)
+
+    def upsert_item(self, user_id: str, session_id: str, field: str, item: Dict[str, Any],
+                    key: str = "question_id") -> None:
+        session = self.get(user_id, session_id)
+        if session is None:
+            return
+        items = session.setdefault(field, [])
+        for i, existing in enumerate(items):
+            if existing.get(key) == item[key]:
+                items[i] = item
+                return
+        items.append(item)
+
+    def delete(self, user_id: str, session_id: str = None) -> None:
+        if session_id:
+            if user_id in self.data:
+                self.data[user_id].pop(session_id, None)
+        else:
+            self.data.pop(user_id, None)
+
+
+class NullSessionStore:
+    """Shared-nothing fallback: keeps no local state, so workers can never diverge.
+    Reads miss and writes fail loudly while MongoDB is unavailable."""
+
+    def get(self, user_id: str, session_id: str = None) -> Optional[Dict[str, Any]]:
+        return None
+
+    def get_all(self, user_id: str) -> Dict[str, Any]:
+        return {}
+
+    def set(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        raise SessionStoreUnavailable("Session store unavailable")
+
+    def update(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
+        raise SessionStoreUnavailable("Session store unavailable")
+
+    def upsert_item(self, user_id: str, session_id: str, field: str, item: Dict[str, Any],
+                    key: str = "question_id") -> None:
+        raise SessionStoreUnavailable("Session store unavailable")
+
+    def delete(self, user_id: str, session_id: str = None) -> None:
+        pass
+
+
+def create_fallback_store(name: str):
+    """Build the session fallback store configured by SESSION_FALLBACK."""
+    if name == "memory":
+        return MemorySessionStore()
+    if name == "none":
+        return NullSessionStore()
+    if name == "wal":
+        from session_wal import WalSessionStore
+        return WalSessionStore()
+    raise ValueError(f"Unknown SESSION_FALLBACK backend: {name}")
+
 
 class MongoSessionManager:
-    def __init__(self, collection=None, session_timeout: int = 3600):
+    def __init__(self, collection=None, session_timeout: int = 3600, fallback=None, write_behind=None):
         """Initialize the MongoDB session manager
         
         Args:
             collection: MongoDB collection to use for sessions
-            session_timeout: Session timeout in seconds (default: 1 hour)
+            session_timeout: Session timeout in seconds (default: 1 hour, 0 never expires)
+            fallback: Store used when MongoDB is unavailable (default: in-memory)
+            write_behind: Optional WriteBehindBuffer that batches session touches
         """
         self.collection = collection
         self.session_timeout = session_timeout
-        self.fallback_dict = {}  # Fallback in-memory storage if MongoDB is unavailable
-        
+        self.fallback = fallback or MemorySessionStore()
+        self.write_behind = write_behind
+
+    def _fallback_pending(self) -> bool:
+        """Whether a durable fallback holds writes that MongoDB has not seen yet."""
+        return getattr(self.fallback, "pending", False)
+
+    def _use_fallback(self) -> bool:
+        # Writes keep going through a durable fallback until it has been replayed,
+        # so they cannot overtake the logged ones
+        return self.collection is None or self._fallback_pending()
+
+    def replay_fallback(self) -> int:
+        """Replay a durable fallback's logged writes into MongoDB; returns how many were replayed."""
+        if self.collection is None or not self._fallback_pending():
+            return 0
+        return self.fallback.replay(self.collection, self._metadata)
+
     def get_session(self, user_id: str, session_id: str = None) -> Optional[Dict[str, Any]]:
         """Get a user session by user_id and optionally session_id
         
@@ -66,9 +150,12 @@ class MongoSessionManager:
             Session data dict or None if not found
         """
         try:
-            if not self.collection:
-                # Fallback to in-memory
-                return self.fallback_dict.get(user_id, {}).get(session_id)
+            if self.collection is None:
+                return self.fallback.get(user_id, session_id)
+            if self._fallback_pending():
+                local = self.fallback.get(user_id, session_id)
+                if local is not None:
+                    return local
                 
             query = {"user_id": user_id}
             if session_id:
@@ -82,9 +169,9 @@ class MongoSessionManager:
                 return session
             return None
         except Exception as e:
+            fallbacks.inc(reason="session_fallback")
             logger.error(f"Error retrieving session: {str(e)}")
-            # Fallback to in-memory
-            return self.fallback_dict.get(user_id, {}).get(session_id)
+            return self.fallback.get(user_id, session_id)
     
     def get_user_sessions(self, user_id: str) -> Dict[str, Any]:
         """Get all sessions for a user
@@ -96,9 +183,8 @@ class MongoSessionManager:
             Dictionary of session_id -> session_data
         """
         try:
-            if not self.collection:
-                # Fallback to in-memory
-                return self.fallback_dict.get(user_id, {})
+            if self.collection is None:
+                return self.fallback.get_all(user_id)
                 
             sessions = {}
             cursor = self.collection.find({"user_id": user_id})
@@ -109,12 +195,14 @@ class MongoSessionManager:
                     session.pop("_id", None)
                     session.pop("expiry", None)
                     sessions[session_id] = session
-                    
+
+            if self._fallback_pending():
+                sessions.update(self.fallback.get_all(user_id))
             return sessions
         except Exception as e:
+            fallbacks.inc(reason="session_fallback")
             logger.error(f"Error retrieving user sessions: {str(e)}")
-            # Fallback to in-memory
-            return self.fallback_dict.get(user_id, {})
+            return self.fallback.get_all(user_id)
     
     def set_session(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
         """Set session data for a user
@@ -125,69 +213,195 @@ class MongoSessionManager:
             data: Session data to store
         """
         try:
-            if not self.collection:
-                # Fallback to in-memory
-                if user_id not in self.fallback_dict:
-                    self.fallback_dict[user_id] = {}
-                self.fallback_dict[user_id][session_id] = data
+            if self._use_fallback():
+                self.fallback.set(user_id, session_id, data)
                 return
                 
-            # Calculate expiration time
-            expiry = datetime.utcnow() + timedelta(seconds=self.session_timeout)
-            
             # Prepare data with required fields
             data_with_metadata = {
                 "user_id": user_id,
                 "session_id": session_id,
-                "expiry": expiry,
-                "last_updated": datetime.utcnow(),
-                **data
+                **self._metadata(),
+                **{k: v for k, v in data.items() if k != "version"}
             }
             
             # Upsert to handle both insert and update cases
             self.collection.update_one(
                 {"user_id": user_id, "session_id": session_id},
-                {"$set": data_with_metadata},
+                {"$set": data_with_metadata, "$inc": {"version": 1}},
                 upsert=True
             )
         except Exception as e:
+            fallbacks.inc(reason="session_fallback")
             logger.error(f"Error setting session: {str(e)}")
-            # Fallback to in-memory
-            if user_id not in self.fallback_dict:
-                self.fallback_dict[user_id] = {}
-            self.fallback_dict[user_id][session_id] = data
+            self.fallback.set(user_id, session_id, data)
     
+    def touch_session(self, user_id: str, session_id: str) -> None:
+        """Refresh last_updated and expiry of an active session
+
+        Touches are low priority: with a write-behind buffer they are coalesced
+        and written in batches, and while MongoDB is unavailable they are skipped.
+        Checking for a pending fallback may query SQLite, so call this from the
+        threadpool like the other session methods.
+        """
+        if self._use_fallback():
+            return
+        if self.write_behind is None:
+            self.update_session(user_id, session_id, {})
+            return
+        self.write_behind.add((user_id, session_id), self._metadata())
+
     def update_session(self, user_id: str, session_id: str, data: Dict[str, Any]) -> None:
         """Update specific fields in an existing session
         
         Args:
             user_id: The user ID
             session_id: The session ID
-            data: Fields to update
+            data: Fields to update (empty to only extend the session)
         """
+        if not data and self.write_behind is not None:
+            self.touch_session(user_id, session_id)
+            return
         try:
-            if not self.collection:
-                # Fallback to in-memory
-                if user_id in self.fallback_dict and session_id in self.fallback_dict[user_id]:
-                    self.fallback_dict[user_id][session_id].update(data)
+            if self._use_fallback():
+                self.fallback.update(user_id, session_id, data)
                 return
                 
             # Add last_updated timestamp and extend expiry
             update_data = {
-                "last_updated": datetime.utcnow(),
-                "expiry": datetime.utcnow() + timedelta(seconds=self.session_timeout),
-                **data
+                **self._metadata(),
+                **{k: v for k, v in data.items() if k != "version"}
             }
             
             self.collection.update_one(
                 {"user_id": user_id, "session_id": session_id},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}}
             )
         except Exception as e:
+            fallbacks.inc(reason="session_fallback")
             logger.error(f"Error updating session: {str(e)}")
-            # Fallback to in-memory
-            if user_id in self.fallback_dict and session_id in self.fallback_dict[user_id]:
-                self.fallback_dict[user_id][session_id].update(data)
+            self.fallback.update(user_id, session_id, data)
+    
+    def _metadata(self) -> Dict[str, Any]:
+        """Fields refreshed by every write: last_updated and, for expiring sessions, expiry."""
+        # last_updated uses local time like the interview timestamps it is compared with;
+        # the TTL index needs expiry in UTC
+        metadata = {"last_updated": datetime.now()}
+        if self.session_timeout:
+            metadata["expiry"] = datetime.utcnow() + timedelta(seconds=self.session_timeout)
+        return metadata
+
+    def _mutate(self, user_id: str, session_id: str, update: Dict[str, Any],
+                extra_filter: Dict[str, Any] = None, expected_version: int = None) -> Optional[int]:
+        """Apply one atomic update to a session document and bump its version.
+
+        Returns:
+            The new version, or None if the filter did not match
+        """
+        query = {"user_id": user_id, "session_id": session_id, **(extra_filter or {})}
+        if expected_version is not None:
+            # Documents written before versioning have no version field
+            query["version"] = {"$in": [expected_version, None]} if expected_version == 0 else expected_version
+
+        update = dict(update)
+        update["$set"] = {**update.get("$set", {}), **self._metadata()}
+        update["$inc"] = {"version": 1}
+        document = self.collection.find_one_and_update(
+            query, update, projection={"version": 1}, return_document=ReturnDocument.AFTER
+        )
+        return document["version"] if document else None
+
+
+    def upsert_item(self, user_id: str, session_id: str, field: str, item: Dict[str, Any],
+                    key: str = "question_id") -> Optional[int]:
+        """Replace the array element with the same key in place, or append it
+
+        Only the one element is written: a positional $set when it exists, a
+        guarded $push otherwise, so concurrent writers of different elements
+        never overwrite each other.
+
+        Args:
+            user_id: The user ID
+            session_id: The session ID
+            field: Array field holding the elements (e.g. "responses")
+            item: Element to store; must contain key
+            key: Field identifying the element within the array
+
+        Returns:
+            The new session version, or None if the session does not exist
+        """
+        try:
+            if self._use_fallback():
+                self.fallback.upsert_item(user_id, session_id, field, item, key)
+                return None
+
+            # Two attempts cover a concurrent writer pushing the same key between them
+            for _ in range(2):
+                version = self._mutate(user_id, session_id, {"$set": {f"{field}.$": item}},
+                                       extra_filter={f"{field}.{key}": item[key]})
+                if version is not None:
+                    return version
+                version = self._mutate(user_id, session_id, {"$push": {field: item}},
+                                       extra_filter={f"{field}.{key}": {"$ne": item[key]}})
+                if version is not None:
+                    return version
+                if not self.collection.count_documents({"user_id": user_id, "session_id": session_id}, limit=1):
+                    logger.warning(f"Session not found for user {user_id}, session {session_id}")
+                    return None
+            raise SessionVersionConflict(f"Concurrent updates to {field} in session {session_id}")
+        except SessionVersionConflict:
+            raise
+        except Exception as e:
+            fallbacks.inc(reason="session_fallback")
+            logger.error(f"Error updating session {field}: {str(e)}")
+            self.fallback.upsert_item(user_id, session_id, field, item, key)
+            return None
+
+    def append_response(self, user_id: str, session_id: str, question_id: str, text: str) -> Optional[int]:
+        """Store the answer to one question (replacing an earlier answer to it)."""
+        return self.upsert_item(user_id, session_id, "responses", {"question_id": question_id, "text": text})
+
+    def attach_feedback(self, user_id: str, session_id: str, question_id: str, text: str) -> Optional[int]:
+        """Store the feedback for one question (replacing earlier feedback for it)."""
+        return self.upsert_item(user_id, session_id, "feedback", {"question_id": question_id, "text": text})
+
+    def set_evaluation(self, user_id: str, session_id: str, evaluation: Dict[str, Any], score: float,
+                       expected_version: int = None) -> Optional[int]:
+        """Store the overall evaluation and mark the session completed
+
+        Args:
+            user_id: The user ID
+            session_id: The session ID
+            evaluation: Overall evaluation document
+            score: Overall score
+            expected_version: Only write if the session is still at this version
+
+        Returns:
+            The new session version, or None if the session does not exist
+
+        Raises:
+            SessionVersionConflict: If expected_version no longer matches
+        """
+        fields = {"evaluation": evaluation, "score": score, "completed": True}
+        try:
+            if self._use_fallback():
+                self.fallback.update(user_id, session_id, fields)
+                return None
+
+            version = self._mutate(user_id, session_id, {"$set": fields}, expected_version=expected_version)
+            if version is None:
+                if expected_version is not None and self.collection.count_documents(
+                        {"user_id": user_id, "session_id": session_id}, limit=1):
+                    raise SessionVersionConflict(f"Session {session_id} changed since version {expected_version}")
+                logger.warning(f"Session not found for user {user_id}, session {session_id}")
+            return version
+        except SessionVersionConflict:
+            raise
+        except Exception as e:
+            fallbacks.inc(reason="session_fallback")
+            logger.error(f"Error setting session evaluation: {str(e)}")
+            self.fallback.update(user_id, session_id, fields)
+            return None
     
     def delete_session(self, user_id: str, session_id: str = None) -> None:
         """Delete a session or all sessions for a user
@@ -197,13 +411,8 @@ class MongoSessionManager:
             session_id: Optional session ID. If None, deletes all user sessions
         """
         try:
-            if not self.collection:
-                # Fallback to in-memory
-                if session_id:
-                    if user_id in self.fallback_dict:
-                        self.fallback_dict[user_id].pop(session_id, None)
-                else:
-                    self.fallback_dict.pop(user_id, None)
+            if self._use_fallback():
+                self.fallback.delete(user_id, session_id)
                 return
                 
             query = {"user_id": user_id}
@@ -212,16 +421,22 @@ class MongoSessionManager:
                 
             self.collection.delete_many(query)
         except Exception as e:
+            fallbacks.inc(reason="session_fallback")
             logger.error(f"Error deleting session: {str(e)}")
-            # Fallback to in-memory
-            if session_id:
-                if user_id in self.fallback_dict:
-                    self.fallback_dict[user_id].pop(session_id, None)
-            else:
-                self.fallback_dict.pop(user_id, None)
+            self.fallback.delete(user_id, session_id)
+
+# Session touches are batched; main starts the flusher and flushes it on shutdown
+session_touches = WriteBehindBuffer(sessions_collection)
 
 # Create global instance of the session manager
-session_manager = MongoSessionManager(collection=sessions_collection)
+session_manager = MongoSessionManager(collection=sessions_collection,
+                                      fallback=create_fallback_store(SESSION_FALLBACK),
+                                      write_behind=session_touches)
+
+# The durable interview records use the same mutation API; they never expire
+# and have no fallback, since a lost write there must surface as an error
+interview_store = MongoSessionManager(collection=interviews_collection, session_timeout=0,
+                                      fallback=NullSessionStore())
 
 # For backward compatibility - use this dictionary-like interface
 # This makes the transition seamless without breaking existing code
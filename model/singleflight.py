@@ -0,0 +1,76 @@
+# Request coalescing: concurrent identical calls share one in-flight computation
+import asyncio
+import functools
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from starlette.concurrency import run_in_threadpool
+
+from metrics import Counter, registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+coalesced_calls = registry.register(Counter(
+    "mockly_coalesced_calls_total", "Calls served by another identical in-flight call", ("name",)))
+
+
+class SingleFlight:
+    def __init__(self):
+        """Tracks in-flight computations by key within this process."""
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Run func once per key at a time; concurrent callers with the same key get its result.
+
+        Args:
+            key: Identity of the computation
+            func: Coroutine function to run if no identical call is in flight
+
+        Returns:
+            The result of the (possibly shared) computation
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            coalesced_calls.inc(name=key.split(":", 1)[0])
+            # Shield so a cancelled follower does not cancel the leader's computation
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved in case no follower is waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+# Global instance shared by all routes
+single_flight = SingleFlight()
+
+
+def coalesce(name: str):
+    """Decorate a route handler so concurrent calls with identical arguments share one run.
+
+    Synchronous handlers run in the threadpool, keeping blocking database work
+    off the event loop while identical calls wait on the same result.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = f"{name}:" + json.dumps([args, kwargs], sort_keys=True, default=str)
+            if asyncio.iscoroutinefunction(func):
+                return await single_flight.do(key, func, *args, **kwargs)
+            return await single_flight.do(key, run_in_threadpool, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+# Background warm-up of heavy components and readiness tracking.
+#
+# The API process binds immediately; MongoDB connectivity and indexes, the
+# LLM client and the question bank are prepared in parallel worker threads,
+# and /readyz reports ready only once all of them succeeded.
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict
+
+from dotenv import load_dotenv
+
+import agents
+from mongo_connect import check_connection, ensure_indexes
+from question_bank import question_bank, QUESTION_BANK_ENABLED
+from shared_state import session_manager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+STT_PREWARM = os.getenv("STT_PREWARM", "false").lower() == "true"
+# Maximum delay between MongoDB connection attempts while not ready
+MONGO_RETRY_MAX_SECONDS = float(os.getenv("MONGO_RETRY_MAX_SECONDS", "30"))
+# How often a worker checks the session WAL for writes to replay into MongoDB
+SESSION_WAL_REPLAY_SECONDS = float(os.getenv("SESSION_WAL_REPLAY_SECONDS", "5"))
+
+readiness: Dict[str, bool] = {
+    "mongo": False,
+    "llm": False,
+    "question_bank": not QUESTION_BANK_ENABLED,
+}
+startup_timings: Dict[str, float] = {}
+
+
+def is_ready() -> bool:
+    return all(readiness.values())
+
+
+async def _timed_step(name: str, func) -> None:
+    start = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(func):
+            await func()
+        else:
+            await asyncio.to_thread(func)
+        readiness[name] = True
+    except Exception as e:
+        logger.error(f"Startup step {name} failed: {str(e)}")
+    startup_timings[name] = round(time.perf_counter() - start, 3)
+
+
+async def _connect_mongo() -> None:
+    """Wait for MongoDB with capped exponential backoff, then create indexes.
+
+    Only the ping and the index creation run in a thread; the waits between
+    attempts are on the event loop, so cancelling warm-up at shutdown stops
+    the retries instead of leaving a thread sleeping until MongoDB is back.
+    """
+    delay = 1.0
+    while not await asyncio.to_thread(check_connection):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MONGO_RETRY_MAX_SECONDS)
+    await asyncio.to_thread(ensure_indexes)
+
+
+async def _prepare_storage() -> None:
+    await _timed_step("mongo", _connect_mongo)
+    # The question bank index is read from MongoDB, so it loads once Mongo is up
+    if QUESTION_BANK_ENABLED:
+        await _timed_step("question_bank", question_bank.load)
+
+
+async def _start_transcriber(transcriber) -> None:
+    try:
+        await transcriber.start()
+    except Exception as e:
+        logger.error(f"Failed to prewarm transcription workers: {str(e)}")
+
+
+async def warm_up(transcriber=None) -> None:
+    """Prepare all heavy components concurrently."""
+    start = time.perf_counter()
+    steps = [_prepare_storage(), _timed_step("llm", agents.warmup)]
+    if STT_PREWARM and transcriber is not None:
+        steps.append(_start_transcriber(transcriber))
+    await asyncio.gather(*steps)
+    startup_timings["total"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Warm-up finished in {startup_timings['total']}s: {readiness}")
+
+
+async def replay_session_log() -> None:
+    """Replay session writes logged while MongoDB was down, until cancelled.
+
+    Checks are jittered and failures back off, so workers do not all hit a
+    recovering MongoDB at the same moment.
+    """
+    delay = SESSION_WAL_REPLAY_SECONDS
+    while True:
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        try:
+            await asyncio.to_thread(session_manager.replay_fallback)
+            delay = SESSION_WAL_REPLAY_SECONDS
+        except Exception as e:
+            logger.warning(f"Session WAL replay failed, retrying later: {str(e)}")
+            delay = min(delay * 2, MONGO_RETRY_MAX_SECONDS)
@@ -0,0 +1,314 @@
+# Streaming speech-to-text with a warm pool of CPU Whisper worker processes.
+# Audio windows from concurrent interview sessions are batched into a single
+# Whisper decode call per worker.
+import asyncio
+import logging
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+STT_MODEL = os.getenv("STT_MODEL", "base.en")
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en")
+STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))
+STT_THREADS_PER_WORKER = int(os.getenv("STT_THREADS_PER_WORKER", "2"))
+STT_BATCH_SIZE = int(os.getenv("STT_BATCH_SIZE", "8"))
+STT_BATCH_WINDOW_MS = int(os.getenv("STT_BATCH_WINDOW_MS", "50"))
+# New audio (seconds) required before another partial transcript is produced
+STT_PARTIAL_INTERVAL = float(os.getenv("STT_PARTIAL_INTERVAL", "2.0"))
+
+SAMPLE_RATE = 16000
+# Whisper decodes 30 second windows; a window is committed once it is nearly full
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+COMMIT_SAMPLES = 25 * SAMPLE_RATE
+
+# Whisper model loaded once per worker process
+_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    """Load the Whisper model when a worker process starts."""
+    global _model
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name, device="cpu")
+
+
+def _warmup() -> bool:
+    """Run one decode so the first real request does not pay for lazy setup."""
+    _transcribe_batch([{"audio": np.zeros(SAMPLE_RATE, dtype=np.float32), "offset": 0}])
+    return True
+
+
+def _pcm16_to_float(data: bytes) -> np.ndarray:
+    return np.frombuffer(data[:len(data) - len(data) % 2], np.int16).astype(np.float32) / 32768.0
+
+
+class ContainerDecoder:
+    def __init__(self):
+        """Incremental decode of one compressed stream (e.g. webm/opus from MediaRecorder).
+
+        One ffmpeg process per stream is fed the chunks as they arrive, so every
+        byte is decoded once instead of re-decoding the whole container for
+        each partial transcript. Decoding happens in the session's own task,
+        so a broken stream or a missing ffmpeg only fails that session.
+        """
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.finished = False
+        self._reader: Optional[asyncio.Task] = None
+        self._pcm = bytearray()
+
+    async def write(self, data: bytes) -> None:
+        """Send container bytes to ffmpeg."""
+        if self.finished:
+            raise RuntimeError("Audio stream already ended")
+        if self.process is None:
+            self.process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+                "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            self._reader = asyncio.create_task(self._read())
+        self.process.stdin.write(data)
+        await self.process.stdin.drain()
+
+    async def _read(self) -> None:
+        while True:
+            chunk = await self.process.stdout.read(65536)
+            if not chunk:
+                return
+            self._pcm.extend(chunk)
+
+    def take(self) -> np.ndarray:
+        """Samples (16kHz mono float32) decoded since the last call."""
+        usable = len(self._pcm) - len(self._pcm) % 2
+        samples = _pcm16_to_float(bytes(self._pcm[:usable]))
+        del self._pcm[:usable]
+        return samples
+
+    async def finish(self) -> None:
+        """Close the input and wait until everything written has been decoded."""
+        if self.finished:
+            return
+        self.finished = True
+        if self.process is not None:
+            self.process.stdin.close()
+            await self._reader
+            await self.process.wait()
+
+    def close(self) -> None:
+        """Stop ffmpeg without waiting for the rest of its output."""
+        self.finished = True
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.process is not None and self.process.returncode is None:
+            self.process.kill()
+
+
+def _transcribe_batch(jobs: List[Dict]) -> List[Dict]:
+    """Transcribe a batch of audio windows in a single Whisper decode call.
+
+    Each job holds decoded "audio" (float32 at 16kHz) and the sample
+    "offset" where the window starts.
+    """
+    import torch
+    import whisper
+
+    windows = []
+    results = []
+    for job in jobs:
+        audio = job["audio"]
+        window = audio[job["offset"]:job["offset"] + WINDOW_SAMPLES]
+        windows.append(window)
+        results.append({
+            "text": "",
+            "samples": len(window),
+            "more": len(audio) > job["offset"] + len(window)
+        })
+
+    active = [i for i, window in enumerate(windows) if len(window)]
+    if active:
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(windows[i]), n_mels=_model.dims.n_mels)
+            for i in active
+        ])
+        options = whisper.DecodingOptions(language=STT_LANGUAGE, fp16=False, without_timestamps=True)
+        for i, decoded in zip(active, whisper.decode(_model, mel, options)):
+            results[i]["text"] = decoded.text.strip()
+    return results
+
+
+class StreamingTranscriber:
+    def __init__(self, workers: int = STT_WORKERS, batch_size: int = STT_BATCH_SIZE,
+                 batch_window_ms: int = STT_BATCH_WINDOW_MS, model_name: str = STT_MODEL):
+        """Initialize the transcriber
+
+        Args:
+            workers: Number of Whisper worker processes
+            batch_size: Maximum audio windows decoded together
+            batch_window_ms: How long to wait for more windows before dispatching a batch
+            model_name: Whisper model to load in each worker
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.model_name = model_name
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Start the worker pool, load the model in every worker and start batching."""
+        async with self._start_lock:
+            if self.executor is not None:
+                return
+            loop = asyncio.get_running_loop()
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, STT_THREADS_PER_WORKER)
+            )
+            await asyncio.gather(*[loop.run_in_executor(self.executor, _warmup) for _ in range(self.workers)])
+            self.queue = asyncio.Queue()
+            self._batcher_task = asyncio.create_task(self._run_batcher())
+            logger.info(f"Started {self.workers} Whisper workers with model {self.model_name}")
+
+    async def stop(self) -> None:
+        """Stop batching and shut the worker pool down."""
+        if self._batcher_task:
+            self._batcher_task.cancel()
+            self._batcher_task = None
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def transcribe(self, job: Dict) -> Dict:
+        """Queue an audio window for transcription and wait for its result."""
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job, future))
+        return await future
+
+    async def _run_batcher(self) -> None:
+        """Collect queued windows into batches, one batch per free worker."""
+        loop = asyncio.get_running_loop()
+        free_workers = asyncio.Semaphore(self.workers)
+        while True:
+            await free_workers.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._dispatch(batch, free_workers))
+
+    async def _dispatch(self, batch, free_workers: asyncio.Semaphore) -> None:
+        """Run one batch on the worker pool and resolve the waiting futures."""
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, _transcribe_batch, [job for job, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"Transcription batch failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            free_workers.release()
+
+
+class TranscriptStream:
+    def __init__(self, transcriber: StreamingTranscriber, audio_format: str = "pcm16"):
+        """Per-connection transcript state
+
+        Args:
+            transcriber: Shared transcriber used to decode audio windows
+            audio_format: "pcm16" for raw 16kHz mono little-endian PCM chunks, or
+                "webm" for MediaRecorder chunks of a single container stream
+        """
+        self.transcriber = transcriber
+        self.audio_format = audio_format
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard buffered audio and transcript, e.g. when moving to the next question."""
+        self.close()
+        self.decoder = ContainerDecoder() if self.audio_format != "pcm16" else None
+        self.pcm = np.zeros(0, dtype=np.float32)
+        # Container bytes not yet handed to the decoder
+        self.container = bytearray()
+        self.received_bytes = 0
+        self.last_partial_bytes = 0
+        self.committed: List[str] = []
+        self.current = ""
+
+    def feed(self, chunk: bytes) -> None:
+        """Append an audio chunk received from the client."""
+        if self.audio_format == "pcm16":
+            self.pcm = np.concatenate([self.pcm, _pcm16_to_float(chunk)])
+        else:
+            self.container.extend(chunk)
+        self.received_bytes += len(chunk)
+
+    def partial_due(self) -> bool:
+        """Whether enough new audio arrived to produce another partial transcript."""
+        # PCM16 at 16kHz is 32000 bytes per second; compressed streams are much smaller,
+        # so use a conservative 4kB/s (~32kbps opus) estimate for them
+        bytes_per_second = 2 * SAMPLE_RATE if self.audio_format == "pcm16" else 4000
+        return self.received_bytes - self.last_partial_bytes >= STT_PARTIAL_INTERVAL * bytes_per_second
+
+    @property
+    def text(self) -> str:
+        return " ".join(part for part in self.committed + [self.current] if part)
+
+    def close(self) -> None:
+        """Stop the stream's decoder, if any."""
+        if getattr(self, "decoder", None) is not None:
+            self.decoder.close()
+
+    async def transcribe(self, final: bool = False) -> str:
+        """Transcribe audio received since the last committed window.
+
+        Args:
+            final: The answer has ended; wait until all received audio is decoded
+        """
+        self.last_partial_bytes = self.received_bytes
+        if self.decoder is not None:
+            if self.container:
+                data, self.container = bytes(self.container), bytearray()
+                await self.decoder.write(data)
+            if final:
+                await self.decoder.finish()
+            # Partials use whatever ffmpeg has decoded so far; the rest is picked up next time
+            self.pcm = np.concatenate([self.pcm, self.decoder.take()])
+        while True:
+            result = await self.transcriber.transcribe({"audio": self.pcm, "offset": 0})
+
+            # Commit full windows so later partials only decode new audio
+            if result["samples"] >= COMMIT_SAMPLES and result["more"]:
+                self.committed.append(result["text"])
+                self.pcm = self.pcm[result["samples"]:]
+                self.current = ""
+                continue
+            self.current = result["text"]
+            return self.text
@@ -0,0 +1,190 @@
+# Per-user LLM usage accounting and quotas.
+#
+# Every crew kickoff made on behalf of a user is counted (calls, estimated
+# tokens, latency, errors) into one llm_usage document per user and UTC day.
+# Counts are $inc'ed through a write-behind buffer, so a kickoff costs no
+# extra round trip. Before a kickoff, check() enforces a daily call and token
+# quota (shared by all workers through those documents, re-read every
+# USAGE_REFRESH_SECONDS) and a per-worker burst limit, raising 429 with
+# Retry-After when exceeded.
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from metrics import Counter, registry
+from mongo_connect import db
+from write_behind import WriteBehindBuffer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# LLM calls and estimated tokens one user may consume per UTC day (0 = unlimited)
+USAGE_DAILY_CALLS = int(os.getenv("USAGE_DAILY_CALLS", "300"))
+USAGE_DAILY_TOKENS = int(os.getenv("USAGE_DAILY_TOKENS", "500000"))
+# LLM calls one user may start within USAGE_BURST_SECONDS, per worker (0 = unlimited)
+USAGE_BURST_CALLS = int(os.getenv("USAGE_BURST_CALLS", "30"))
+USAGE_BURST_SECONDS = float(os.getenv("USAGE_BURST_SECONDS", "60"))
+# How long a worker trusts its copy of a user's daily totals before re-reading MongoDB
+USAGE_REFRESH_SECONDS = float(os.getenv("USAGE_REFRESH_SECONDS", "15"))
+
+usage_collection = db["llm_usage"]
+
+usage_rejections = registry.register(Counter(
+    "mockly_usage_rejections_total", "LLM calls refused by per-user quotas", ("reason",)))
+
+
+def utc_day(now: datetime = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+
+
+def seconds_until_utc_midnight() -> float:
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+class UsageTracker:
+    def __init__(self, collection, daily_calls: int = USAGE_DAILY_CALLS, daily_tokens: int = USAGE_DAILY_TOKENS,
+                 burst_calls: int = USAGE_BURST_CALLS, burst_seconds: float = USAGE_BURST_SECONDS,
+                 refresh_seconds: float = USAGE_REFRESH_SECONDS):
+        """Count LLM usage per user and day and enforce quotas
+
+        Args:
+            collection: MongoDB collection of per-user daily usage documents
+            daily_calls: Calls per user per UTC day (0 = unlimited)
+            daily_tokens: Estimated tokens per user per UTC day (0 = unlimited)
+            burst_calls: Calls per user within burst_seconds, per worker (0 = unlimited)
+            burst_seconds: Burst window length
+            refresh_seconds: Reuse of the persisted daily totals before re-reading them
+        """
+        self.collection = collection
+        self.daily_calls = daily_calls
+        self.daily_tokens = daily_tokens
+        self.burst_calls = burst_calls
+        self.burst_seconds = burst_seconds
+        self.refresh_seconds = refresh_seconds
+        self.writes = WriteBehindBuffer(collection, operator="$inc", upsert=True, key_fields=("user_id", "day"))
+        # user_id -> {"day", "calls", "tokens", "refreshed"}: persisted totals plus usage recorded since
+        self._totals: Dict[str, Dict[str, Any]] = {}
+        self._recent: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _today(self, user_id: str) -> Dict[str, Any]:
+        """The user's totals for today, re-read from MongoDB when stale."""
+        day = utc_day()
+        now = time.monotonic()
+        with self._lock:
+            totals = self._totals.get(user_id)
+            if totals and totals["day"] == day and now - totals["refreshed"] < self.refresh_seconds:
+                return totals
+        try:
+            document = self.collection.find_one({"user_id": user_id, "day": day},
+                                                {"calls": 1, "input_tokens": 1, "output_tokens": 1}) or {}
+        except Exception as e:
+            # Keep enforcing from the local copy rather than failing the request
+            logger.error(f"Failed to read LLM usage for user {user_id}: {str(e)}")
+            with self._lock:
+                return self._totals.setdefault(
+                    user_id, {"day": day, "calls": 0, "tokens": 0, "refreshed": now})
+        totals = {
+            "day": day,
+            "calls": document.get("calls", 0),
+            "tokens": document.get("input_tokens", 0) + document.get("output_tokens", 0),
+            "refreshed": now,
+        }
+        with self._lock:
+            self._totals[user_id] = totals
+        return totals
+
+    def _reject(self, reason: str, retry_after: float, detail: str):
+        usage_rejections.inc(reason=reason)
+        retry_after = max(1, math.ceil(retry_after))
+        logger.warning(f"LLM usage rejected: {reason} (retry after {retry_after}s)")
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    def check(self, user_id: str, calls: int = 1) -> None:
+        """Refuse with 429 if user_id cannot start calls more LLM calls now.
+
+        Raises:
+            HTTPException: 429 with Retry-After when a quota is exhausted
+        """
+        totals = self._today(user_id)
+        if self.daily_calls and totals["calls"] + calls > self.daily_calls:
+            self._reject("daily_calls", seconds_until_utc_midnight(),
+                         f"Daily AI usage limit of {self.daily_calls} requests reached")
+        if self.daily_tokens and totals["tokens"] >= self.daily_tokens:
+            self._reject("daily_tokens", seconds_until_utc_midnight(),
+                         "Daily AI usage limit reached")
+
+        if self.burst_calls:
+            now = time.monotonic()
+            with self._lock:
+                recent = self._recent.setdefault(user_id, deque())
+                while recent and now - recent[0] >= self.burst_seconds:
+                    recent.popleft()
+                if len(recent) + calls > self.burst_calls:
+                    retry_after = recent[0] + self.burst_seconds - now if recent else self.burst_seconds
+                    waiting = True
+                else:
+                    waiting = False
+            if waiting:
+                self._reject("burst", retry_after, "Too many AI requests, please slow down")
+
+    def record(self, user_id: str, crew: str, input_tokens: int, output_tokens: int,
+               latency: float, ok: bool = True) -> None:
+        """Count one finished kickoff; written to MongoDB in the next batch."""
+        day = utc_day()
+        with self._lock:
+            totals = self._totals.get(user_id)
+            if totals and totals["day"] == day:
+                totals["calls"] += 1
+                totals["tokens"] += input_tokens + output_tokens
+            if self.burst_calls:
+                self._recent.setdefault(user_id, deque()).append(time.monotonic())
+        self.writes.add((user_id, day), {
+            "calls": 1,
+            "errors": 0 if ok else 1,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency_seconds": round(latency, 3),
+            f"crews.{crew}": 1,
+        })
+
+    def report(self, user_id: str, days: int = 7) -> Dict[str, Any]:
+        """Usage per day for the last days (most recent first) and what is left today."""
+        cursor = self.collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).sort("day", -1).limit(days)
+        history: List[Dict[str, Any]] = []
+        for document in cursor:
+            calls = document.get("calls", 0)
+            document["average_latency_seconds"] = round(document.get("latency_seconds", 0) / calls, 2) if calls else 0
+            history.append(document)
+        today = history[0] if history and history[0]["day"] == utc_day() else {}
+        used_tokens = today.get("input_tokens", 0) + today.get("output_tokens", 0)
+        return {
+            "user_id": user_id,
+            "limits": {
+                "daily_calls": self.daily_calls or None,
+                "daily_tokens": self.daily_tokens or None,
+                "burst_calls": self.burst_calls or None,
+                "burst_seconds": self.burst_seconds,
+            },
+            "remaining_today": {
+                "calls": max(self.daily_calls - today.get("calls", 0), 0) if self.daily_calls else None,
+                "tokens": max(self.daily_tokens - used_tokens, 0) if self.daily_tokens else None,
+            },
+            "days": history,
+        }
+
+
+# Global tracker used by crew_runner; main starts and stops its write buffer
+usage_tracker = UsageTracker(usage_collection)
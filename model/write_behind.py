@@ -0,0 +1,177 @@
+# Write-behind buffer for low-priority MongoDB updates.
+#
+# Session touches only move last_updated and expiry forward, and usage
+# counters only add up. Instead of one update_one per event, updates are
+# coalesced per document key and written by a background thread as unordered
+# bulk_write batches, every WRITE_BEHIND_INTERVAL_SECONDS or as soon as
+# WRITE_BEHIND_MAX_BATCH documents are waiting. Touches are applied with $max,
+# so one flushed after a critical write never moves timestamps backwards, and
+# they do not bump the session version. Whatever is buffered is flushed on
+# shutdown. A failed flush is retried only where that cannot double count:
+# $inc updates whose outcome is unknown are dropped rather than re-applied.
+import logging
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from metrics import Counter, Histogram, registry
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Longest a buffered update waits before it is written
+WRITE_BEHIND_INTERVAL_SECONDS = float(os.getenv("WRITE_BEHIND_INTERVAL_SECONDS", "2"))
+# Flush early once this many documents have buffered updates
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+
+write_behind_batch_size = registry.register(Histogram(
+    "mockly_write_behind_batch_size", "Documents per write-behind bulk write", ("collection",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)))
+write_behind_updates = registry.register(Counter(
+    "mockly_write_behind_updates_total", "Low-priority updates buffered, coalesced, written or dropped",
+    ("collection", "outcome")))
+
+
+class WriteBehindBuffer:
+    def __init__(self, collection, interval: float = WRITE_BEHIND_INTERVAL_SECONDS,
+                 max_batch: int = WRITE_BEHIND_MAX_BATCH, operator: str = "$max", upsert: bool = False,
+                 key_fields: Tuple[str, ...] = ("user_id", "session_id")):
+        """Coalesce commutative field updates per document and write them in batches
+
+        Args:
+            collection: MongoDB collection to update
+            interval: Seconds between background flushes
+            max_batch: Buffered documents that trigger an early flush
+            operator: "$max" (keep the largest value) or "$inc" (add up)
+            upsert: Create missing documents (the key fields become their identity)
+            key_fields: Fields identifying a document, in the order of the add() key
+        """
+        if operator not in ("$max", "$inc"):
+            raise ValueError(f"Unsupported write-behind operator: {operator}")
+        self.collection = collection
+        self.interval = interval
+        self.max_batch = max_batch
+        self.operator = operator
+        self.upsert = upsert
+        self.key_fields = key_fields
+        self._pending: Dict[Tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def name(self) -> str:
+        return getattr(self.collection, "name", "unknown")
+
+    def _combine(self, current: Dict[str, Any], fields: Dict[str, Any]) -> None:
+        for field, value in fields.items():
+            if field not in current:
+                current[field] = value
+            elif self.operator == "$inc":
+                current[field] += value
+            elif value > current[field]:
+                current[field] = value
+
+    def add(self, key: Tuple, fields: Dict[str, Any]) -> None:
+        """Buffer an update of the document identified by key; never blocks on MongoDB."""
+        with self._lock:
+            current = self._pending.get(key)
+            if current is None:
+                self._pending[key] = dict(fields)
+                waiting = len(self._pending)
+            else:
+                self._combine(current, fields)
+                waiting = 0
+        write_behind_updates.inc(collection=self.name, outcome="buffered" if waiting else "coalesced")
+        if waiting >= self.max_batch:
+            self._wake.set()
+
+    def _merge_back(self, batch: Dict[Tuple, Dict[str, Any]]) -> None:
+        """Return a failed batch to the buffer, combined with anything buffered since."""
+        with self._lock:
+            for key, fields in batch.items():
+                self._combine(self._pending.setdefault(key, {}), fields)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of documents updated."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        written = 0
+        items = list(batch.items())
+        for start in range(0, len(items), self.max_batch):
+            chunk = items[start:start + self.max_batch]
+            try:
+                # Session touches never upsert: they must not resurrect an expired or deleted session
+                self.collection.bulk_write([
+                    UpdateOne(dict(zip(self.key_fields, key)), {self.operator: fields}, upsert=self.upsert)
+                    for key, fields in chunk
+                ], ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported operations was applied
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                logger.warning(f"Write-behind flush to {self.name} failed for {len(failed)} documents, "
+                               f"keeping them for retry")
+                self._merge_back({key: fields for index, (key, fields) in enumerate(chunk) if index in failed})
+                written += len(chunk) - len(failed)
+                write_behind_updates.inc(len(chunk) - len(failed), collection=self.name, outcome="written")
+                continue
+            except ServerSelectionTimeoutError as e:
+                # Nothing was sent, so every remaining update can safely be retried
+                logger.warning(f"Write-behind flush to {self.name} failed, keeping updates for retry: {str(e)}")
+                self._merge_back(dict(items[start:]))
+                break
+            except Exception as e:
+                # The chunk may have been applied before the error (e.g. a timeout waiting for the
+                # reply). Re-applying $max is harmless; re-applying $inc would double count, so
+                # for $inc the chunk is dropped: losing a few counts beats inflating them.
+                if self.operator == "$inc":
+                    logger.warning(f"Write-behind flush to {self.name} failed, dropping {len(chunk)} "
+                                   f"possibly applied updates: {str(e)}")
+                    write_behind_updates.inc(len(chunk), collection=self.name, outcome="dropped")
+                    self._merge_back(dict(items[start + len(chunk):]))
+                else:
+                    logger.warning(f"Write-behind flush to {self.name} failed, keeping updates for retry: {str(e)}")
+                    self._merge_back(dict(items[start:]))
+                break
+            written += len(chunk)
+            write_behind_batch_size.observe(len(chunk), collection=self.name)
+            write_behind_updates.inc(len(chunk), collection=self.name, outcome="written")
+        return written
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self) -> None:
+        """Start the background flusher thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write what is still buffered."""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            dropped = len(self._pending)
+            self._pending = {}
+        if dropped:
+            write_behind_updates.inc(dropped, collection=self.name, outcome="dropped")
+            logger.warning(f"Dropped {dropped} buffered updates to {self.name} on shutdown")